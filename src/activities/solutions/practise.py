@@ -1,7 +1,17 @@
+from __future__ import annotations
+
 from pathlib import Path
-import pandas as pd
-from pandas import DataFrame
-import matplotlib.pyplot as plt
+from typing import TYPE_CHECKING
+
+from activities.starter.lazy_import import lazy_import
+from activities.starter.workbook_cache import read_workbook
+
+if TYPE_CHECKING:
+    from pandas import DataFrame, Series
+
+# pandas and pyplot are imported the first time they are used
+pd = lazy_import("pandas")
+plt = lazy_import("matplotlib.pyplot")
 
 
 def describe_dataframe(df: DataFrame, title: str = None) -> None:
@@ -20,7 +30,7 @@ def describe_dataframe(df: DataFrame, title: str = None) -> None:
     Example:
         >>> describe_dataframe(df0)
     """
-    if not isinstance(df, DataFrame):
+    if not isinstance(df, pd.DataFrame):
         print("Input is not a pandas DataFrame")
         return
 
@@ -47,6 +57,53 @@ def describe_dataframe(df: DataFrame, title: str = None) -> None:
         print("Could not run describe():", exc)
 
 
+# Columns converted to datetimes by parse_date_columns
+DATE_COLUMNS = ["start", "end"]
+
+
+def parse_date_column(df: DataFrame, col: str) -> Series:
+    """Return the column converted to datetimes.
+
+    Tries day-first parsing (the CSV uses dd/mm/YYYY), then the pandas
+    default, and returns the column unchanged if neither works. A column
+    that already holds datetimes is returned as it is, so parsing the date
+    columns once when the data is loaded (see ``parse_date_columns``) means
+    the plots do not parse them again.
+
+    Args:
+        df: Source DataFrame.
+        col: Name of the column to parse.
+
+    Returns:
+        Series: The parsed column, with the same index as ``df``.
+    """
+    if pd.api.types.is_datetime64_any_dtype(df[col]):
+        return df[col]
+    try:
+        return pd.to_datetime(df[col], dayfirst=True)
+    except Exception:
+        try:
+            return pd.to_datetime(df[col])
+        except Exception:
+            return df[col]
+
+
+def parse_date_columns(df: DataFrame, columns: list = None) -> DataFrame:
+    """Return the DataFrame with its date columns converted to datetimes.
+
+    Args:
+        df: Source DataFrame, which is not changed.
+        columns: Names of the date columns, defaults to ``DATE_COLUMNS``.
+            Columns that are not in ``df`` are ignored.
+
+    Returns:
+        DataFrame: A new DataFrame with the parsed columns.
+    """
+    if columns is None:
+        columns = DATE_COLUMNS
+    return df.assign(**{col: parse_date_column(df, col) for col in columns if col in df.columns})
+
+
 def plot_timeseries(
     df: DataFrame,
     x: str = "start",
@@ -58,6 +115,7 @@ def plot_timeseries(
 
     The function attempts to convert the `x` column to datetimes, groups by
     the x values and sums `y` (useful if there are multiple rows per date).
+    Only the `x` and `y` columns are used; the DataFrame is not copied.
 
     Args:
         df: Source DataFrame.
@@ -74,17 +132,9 @@ def plot_timeseries(
         print(f"Missing required columns for timeseries plot: {x!r} or {y!r}")
         return
 
-    data = df.copy()
     # Try parsing dates with dayfirst=True (CSV appears to use dd/mm/YYYY).
-    try:
-        data[x] = pd.to_datetime(data[x], dayfirst=True)
-    except Exception:
-        try:
-            data[x] = pd.to_datetime(data[x])
-        except Exception:
-            pass
-
-    grouped = data.groupby(data[x])[y].sum().sort_index()
+    dates = parse_date_column(df, x)
+    grouped = df[y].groupby(dates).sum().sort_index()
 
     fig, ax = plt.subplots(figsize=(10, 5))
     grouped.plot(ax=ax, marker="o")
@@ -122,7 +172,9 @@ def plot_timeseries_by_gender(
       those two series.
 
     This function is defensive: if it cannot find a sensible gender split it
-    prints a message and returns.
+    prints a message and returns. Only the columns needed for the plot are
+    used, and the dates are not parsed again if they are already datetimes,
+    see ``parse_date_columns``.
     """
     if gender_col_candidates is None:
         gender_col_candidates = ["gender", "sex"]
@@ -137,15 +189,8 @@ def plot_timeseries_by_gender(
     # Case 1: explicit male/female columns
     for mcol, fcol in pairs:
         if mcol in df.columns and fcol in df.columns:
-            data = df.copy()
-            try:
-                data[x] = pd.to_datetime(data[x], dayfirst=True)
-            except Exception:
-                try:
-                    data[x] = pd.to_datetime(data[x])
-                except Exception:
-                    pass
-            grouped = data.groupby(data[x])[[mcol, fcol]].sum().sort_index()
+            dates = parse_date_column(df, x)
+            grouped = df[[mcol, fcol]].groupby(dates).sum().sort_index()
             fig, ax = plt.subplots(figsize=(10, 5))
             grouped.plot(ax=ax, marker="o")
             ax.set_title(f"{y} by gender over {x}")
@@ -168,16 +213,9 @@ def plot_timeseries_by_gender(
             break
 
     if gender_col:
-        data = df.copy()
-        try:
-            data[x] = pd.to_datetime(data[x], dayfirst=True)
-        except Exception:
-            try:
-                data[x] = pd.to_datetime(data[x])
-            except Exception:
-                pass
+        dates = parse_date_column(df, x)
         grouped = (
-            data.groupby([data[x], data[gender_col]])[y]
+            df[y].groupby([dates, df[gender_col]])
             .sum()
             .unstack(fill_value=0)
         )
@@ -207,27 +245,23 @@ if __name__ == "__main__":
     csv_file = project_root.joinpath('data', 'paralympics_raw.csv')
 
     xlsx_file = project_root.joinpath('data', 'paralympics_all_raw.xlsx')
-    df0 = pd.read_csv(csv_file)
+    # Parse the dates once here rather than in every plot
+    df0 = parse_date_columns(pd.read_csv(csv_file))
+    # Read every sheet once; later runs load the parsed sheets from the cache
+    sheets = {name: parse_date_columns(df) for name, df in read_workbook(xlsx_file).items()}
     # Count how many sheets are in the xlsx file and show their names
-    xls = pd.ExcelFile(xlsx_file)
-    sheet_names = xls.sheet_names
+    sheet_names = list(sheets)
     # Keep the printed line under 79 characters for style checks
     print(
         f"{xlsx_file.name} contains {len(sheet_names)} sheet(s): "
         f"{sheet_names}"
     )
 
-    # Read and describe each sheet that actually exists in the workbook.
-    # This is safer than hard-coding sheet indices; it will skip sheets that
-    # cannot be read and print a warning instead of crashing.
+    # Describe each sheet that actually exists in the workbook.
+    # This is safer than hard-coding sheet indices.
     describe_dataframe(df0, title=csv_file.name)
 
-    for sheet in sheet_names:
-        try:
-            df_sheet = pd.read_excel(xlsx_file, sheet_name=sheet)
-        except Exception as exc:
-            print(f"Warning: could not read sheet {sheet!r}: {exc}")
-            continue
+    for sheet, df_sheet in sheets.items():
         # Use the sheet name in the title for clarity; it may be int or str
         describe_dataframe(
             df_sheet, title=f"{xlsx_file.name} [{sheet}]"
@@ -237,7 +271,7 @@ if __name__ == "__main__":
         plot_timeseries(df_sheet)
         plot_timeseries_by_gender(df_sheet)
     print('last')
-    dx2 = pd.read_excel(xlsx_file, sheet_name=2, )
+    dx2 = sheets[sheet_names[2]]
 
     print(dx2.isna().sum())
     print(dx2.isnull().sum())
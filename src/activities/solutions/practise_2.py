@@ -1,13 +1,51 @@
+from __future__ import annotations
+
+import logging
+import time
+import tracemalloc
+from datetime import datetime
+from functools import partial
 from pathlib import Path
-import pandas as pd
-from pandas import DataFrame
+from typing import TYPE_CHECKING
+
+from activities.starter.lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    from pandas import DataFrame, Series
 # import matplotlib.pyplot as plt
 
-pd.set_option("display.max_rows", None)
-pd.set_option("display.max_columns", None)
-pd.set_option("display.width", 0)
-pd.set_option("display.max_colwidth", None)
-pd.set_option("display.expand_frame_repr", False)
+# pandas is imported the first time it is used
+pd = lazy_import("pandas")
+
+# DataFrames are only converted to text for DEBUG messages, so at INFO level
+# and above the pipeline logs per-stage metrics without formatting any frames.
+logger = logging.getLogger(__name__)
+
+# Columns kept by useful_columns
+USEFUL_COLUMNS = [
+    'type', 'year', 'country', 'host', 'start', 'end',
+    'countries', 'events', 'sports',
+    'participants_m', 'participants_f', 'participants',
+]
+
+# Dtypes applied by change_types
+TYPE_SCHEMA = {
+    'countries': 'int64',
+    'events': 'int64',
+    'participants_m': 'int64',
+    'participants_f': 'int64',
+    'participants': 'int64',
+}
+
+# Columns converted to datetimes by change_types
+DATE_COLUMNS = ['start', 'end']
+
+# Formats tried, in order, to detect the format of a date column. Day-first
+# formats come first to match the CSV (dd/mm/YYYY).
+DATE_FORMATS = ['%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M']
+
+# Number of CSV rows read into memory at a time by the streaming pipeline
+DEFAULT_CHUNKSIZE = 10_000
 
 
 def useful_columns(csv_file):
@@ -19,23 +57,79 @@ def useful_columns(csv_file):
     Returns:
         pandas.DataFrame: DataFrame containing only the selected columns.
     """
-    cols = [
-        'type', 'year', 'country', 'host', 'start', 'end',
-        'countries', 'events', 'sports',
-        'participants_m', 'participants_f', 'participants',
-    ]
-
-    df_selected_cols = pd.read_csv(csv_file, usecols=cols)
+    df_selected_cols = pd.read_csv(csv_file, usecols=USEFUL_COLUMNS)
 
     return df_selected_cols
 
 
+def set_display_options() -> None:
+    """Set pandas display options so printed DataFrames are shown in full."""
+    pd.set_option("display.max_rows", None)
+    pd.set_option("display.max_columns", None)
+    pd.set_option("display.width", 0)
+    pd.set_option("display.max_colwidth", None)
+    pd.set_option("display.expand_frame_repr", False)
+
+
+def count_missing(df: DataFrame) -> int:
+    """Count the missing values in a DataFrame one column at a time.
+
+    Avoids ``df.isna()``, which creates a boolean copy of the whole frame.
+    """
+    return sum(int(df[col].isna().sum()) for col in df.columns)
+
+
+def run_stage(name: str, func, df: DataFrame, *args) -> DataFrame:
+    """Run one step of the cleaning pipeline and log metrics about it.
+
+    Logs a single INFO message with the stage name, rows in and out, the
+    number of missing values dropped and the elapsed time. The metrics are
+    also attached to the log record as ``record.stage_metrics`` for handlers
+    that want structured values.
+
+    Parameters:
+        name (str): Name of the stage used in the log message.
+        func (Callable): Function taking the DataFrame (and ``args``) and
+            returning the DataFrame.
+        df (pandas.DataFrame): Input DataFrame.
+        *args: Further arguments passed to ``func``.
+
+    Returns:
+        pandas.DataFrame: The DataFrame returned by ``func``.
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return func(df, *args)
+
+    rows_in = len(df)
+    nulls_in = count_missing(df)
+    start_time = time.perf_counter()
+    df_out = func(df, *args)
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+    metrics = {
+        'stage': name,
+        'rows_in': rows_in,
+        'rows_out': len(df_out),
+        'nulls_dropped': nulls_in - count_missing(df_out),
+        'elapsed_ms': round(elapsed_ms, 3),
+    }
+    logger.info("stage=%(stage)s rows_in=%(rows_in)d rows_out=%(rows_out)d "
+                "nulls_dropped=%(nulls_dropped)d elapsed_ms=%(elapsed_ms).3f",
+                metrics, extra={'stage_metrics': metrics})
+    return df_out
+
+
+def select_useful_columns(df: DataFrame) -> DataFrame:
+    """Return the columns in ``USEFUL_COLUMNS`` from a DataFrame read from the CSV."""
+    return df[USEFUL_COLUMNS]
+
+
 def clean_data(df: DataFrame) -> DataFrame:
-    """Run lightweight exploratory prints and simple queries on the DataFrame.
+    """Run lightweight exploratory output and simple queries on the DataFrame.
 
     This helper is intended for interactive exploration in the tutorial. It
-    prints selected column values, basic shape information and a filtered
-    subset for a specific event type. It does not modify the DataFrame.
+    logs selected column values, basic shape information and a filtered
+    subset for a specific event type at DEBUG level, and does nothing if
+    DEBUG messages are not enabled. It does not modify the DataFrame.
 
     Parameters:
         df (pandas.DataFrame): Input DataFrame to inspect.
@@ -43,20 +137,21 @@ def clean_data(df: DataFrame) -> DataFrame:
     Returns:
         pandas.DataFrame: The original DataFrame (unchanged).
     """
-    print(df['sports'])
-    print(df.loc[7:9]['sports'])
-    n1 = len(df.columns)
+    if not logger.isEnabledFor(logging.DEBUG):
+        return df
+    logger.debug("sports:\n%s", df['sports'])
+    logger.debug("sports rows 7 to 9:\n%s", df.loc[7:9]['sports'])
     list_columns = list(df.columns)
-    print(list_columns)
-    print(n1)
-    print(df.iat[1, 3])
+    logger.debug("%d columns: %s", len(list_columns), list_columns)
+    logger.debug("Value at row 1, column 3: %s", df.iat[1, 3])
     for name in list_columns:
-        print(df[name])
+        logger.debug("%s:\n%s", name, df[name])
     event_type = "summer"  # noqa: F841
 
     df_winter = df.query("type == @event_type")
-    print(df_winter)
-    print(df_winter['country'].unique())
+    logger.debug("summer rows:\n%s", df_winter)
+    logger.debug("summer countries: %s", df_winter['country'].unique())
+    return df
 
 
 def remove_columns(df: DataFrame, columns_to_remove: list) -> DataFrame:
@@ -66,10 +161,11 @@ def remove_columns(df: DataFrame, columns_to_remove: list) -> DataFrame:
 
 
 def remove_columns_after(df: DataFrame, columns_to_remove: list) -> DataFrame:
-    """Remove a fixed list of columns from the DataFrame and print result.
+    """Remove a fixed list of columns from the DataFrame and log the result.
 
     This wrapper removes a small set of columns commonly dropped in the
-    exercises and prints the resulting frame and its column labels.
+    exercises and logs the resulting frame and its column labels at DEBUG
+    level.
 
     Parameters:
         df (pandas.DataFrame): The input DataFrame.
@@ -81,8 +177,8 @@ def remove_columns_after(df: DataFrame, columns_to_remove: list) -> DataFrame:
     """
     columns_to_remove = ['host', 'end', 'countries', 'events', 'sports']
     df1 = remove_columns(df, columns_to_remove)
-    print(df1)
-    print(df1.columns)
+    logger.debug("After removing columns:\n%s", df1)
+    logger.debug("Columns: %s", list(df1.columns))
     return df1
 
 
@@ -119,7 +215,7 @@ def clean_types(df: DataFrame) -> DataFrame:
         pandas.DataFrame: The same DataFrame after modification.
     """
     if 'type' not in df.columns:
-        print("DataFrame has no 'type' column to clean")
+        logger.warning("DataFrame has no 'type' column to clean")
         return df
 
     # 1) Strip whitespace from the entire column to remove entries like
@@ -132,47 +228,109 @@ def clean_types(df: DataFrame) -> DataFrame:
     summer_mask = df['type'] == 'Summer'
     if summer_mask.any():
         df.loc[summer_mask, 'type'] = df.loc[summer_mask, 'type'].str.lower()
-        print(f"Converted {summer_mask.sum()} 'Summer' row(s) to lowercase")
+        logger.debug("Converted %d 'Summer' row(s) to lowercase", summer_mask.sum())
 
-    # Show the resulting unique values for verification
-    print("type column unique values:", df['type'].unique())
+    # Log the resulting unique values for verification
+    logger.debug("type column unique values: %s", df['type'].unique())
     return df
 
 
-def change_types(df: DataFrame) -> DataFrame:
+def detect_date_format(value: str) -> str | None:
+    """Return the first format in ``DATE_FORMATS`` that parses ``value``.
+
+    Parameters:
+        value (str): A date string, e.g. ``'18/09/1960'``.
+
+    Returns:
+        str | None: The matching format, or None if no format matches.
+    """
+    for date_format in DATE_FORMATS:
+        try:
+            datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+        return date_format
+    return None
+
+
+def parse_dates(series: Series, date_formats: dict | None = None) -> Series:
+    """Convert a column of date strings to pandas datetimes.
+
+    The format is detected from the first non-missing value and the whole
+    column is parsed with it, instead of inferring the format for every
+    value. If ``date_formats`` is given the format is remembered there by
+    column name, so later calls with the same dict (e.g. for each chunk of
+    one file) skip the detection. If the format does not fit the values,
+    the column is parsed with day-first inference instead.
+
+    Parameters:
+        series (pandas.Series): Column of date strings.
+        date_formats (dict | None): Column name to detected format, shared
+            by the calls for one file.
+
+    Returns:
+        pandas.Series: Column with a datetime64 dtype.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if date_formats is None:
+        date_formats = {}
+    date_format = date_formats.get(series.name)
+    if date_format is None:
+        values = series.dropna()
+        if values.empty:
+            return pd.to_datetime(series, dayfirst=True)
+        date_format = detect_date_format(str(values.iloc[0]))
+        date_formats[series.name] = date_format
+    if date_format is not None:
+        try:
+            return pd.to_datetime(series, format=date_format)
+        except (ValueError, TypeError):
+            del date_formats[series.name]
+    return pd.to_datetime(series, dayfirst=True)
+
+
+def change_types(df: DataFrame, schema: dict | None = None, downcast: bool = True,
+                 date_formats: dict | None = None) -> DataFrame:
     """Convert selected columns to appropriate numeric / datetime dtypes.
 
-    This helper casts a set of participant and event-count columns to
-    integer dtype and converts date-like columns (`start`, `end`) to
-    pandas datetimes (using day-first parsing to match the CSV format).
+    All the casts in ``schema`` are applied with a single ``astype`` call.
+    Integer columns are then optionally downcast to the smallest integer
+    dtype that holds their values, and date-like columns (``start``,
+    ``end``) are converted to pandas datetimes with ``parse_dates``. The
+    memory used by the DataFrame before and after is logged at INFO level.
 
     Parameters:
         df (pandas.DataFrame): Input DataFrame whose columns will be cast.
+        schema (dict | None): Column name to dtype, defaults to
+            ``TYPE_SCHEMA``. Columns not in ``df`` are ignored.
+        downcast (bool): If True, downcast the integer columns.
+        date_formats (dict | None): Detected date formats, see
+            ``parse_dates``.
 
     Returns:
         pandas.DataFrame: DataFrame after dtype conversions.
     """
-    columns_to_change = [
-        'countries',
-        'events',
-        'participants_m',
-        'participants_f',
-        'participants',
-    ]
-
-    for col in columns_to_change:
-        df[col] = df[col].astype('int64')
-
-    cols = df.columns
-    print(cols)
-
-    for col in cols:
-        print(f"Dtype of column '{col}': {df[col].dtype}")
-        if col == 'start' or col == 'end':
-            print(f"Converting column '{col}' to datetime")
-            print(df[col].dtype)
-            df[col] = pd.to_datetime(df[col], dayfirst=True)
-            print(df[col].dtype)
+    if schema is None:
+        schema = TYPE_SCHEMA
+    log_memory = logger.isEnabledFor(logging.INFO)
+    if log_memory:
+        memory_before = df.memory_usage(deep=True).sum()
+
+    casts = {col: dtype for col, dtype in schema.items() if col in df.columns}
+    df = df.astype(casts)
+
+    if downcast:
+        int_cols = [col for col in casts if pd.api.types.is_integer_dtype(df[col])]
+        df[int_cols] = df[int_cols].apply(pd.to_numeric, downcast='integer')
+
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = parse_dates(df[col], date_formats)
+
+    if log_memory:
+        memory_after = df.memory_usage(deep=True).sum()
+        logger.info("Memory usage: %d bytes before, %d bytes after change_types", memory_before, memory_after)
     return df
 
 
@@ -181,7 +339,10 @@ def deep_clean(df: DataFrame) -> DataFrame:
 
     This convenience function runs the helper functions used in the
     exercises: selects useful columns, drops missing rows, normalises the
-    `type` column and converts types for numeric and date columns.
+    `type` column and converts types for numeric and date columns. The
+    steps are run by a ``CleaningPipeline`` so each stage's metrics are
+    logged at INFO level and no intermediate copies of the frame are kept.
+    The input DataFrame is not modified.
 
     Parameters:
         df (pandas.DataFrame): Raw DataFrame read from CSV.
@@ -189,20 +350,9 @@ def deep_clean(df: DataFrame) -> DataFrame:
     Returns:
         pandas.DataFrame: The cleaned DataFrame ready for analysis.
     """
-    df = useful_columns(csv_file)
-    print(df)
-
     clean_data(df)
-    print(df)
-
-    print(df.isna())
-    df = remove_rows_with_missing_values(df)
-    print(df)
-    df = clean_types(df)
-
-    print("Dtypes:\n", df.dtypes)
-    df = change_types(df)
-    print("Dtypes after change:\n", df.dtypes)
+    df = CleaningPipeline(DEEP_CLEAN_STAGES).run(df)
+    logger.debug("Dtypes after change:\n%s", df.dtypes)
     return df
 
 
@@ -225,7 +375,159 @@ def new_columns(df: DataFrame) -> DataFrame:
     return df
 
 
+class CleaningPipeline:
+    """Runs a sequence of cleaning stages on a DataFrame.
+
+    The pipeline owns the frame it works on: if the caller keeps ownership
+    of the input, the pipeline copies it first, so the stages can change
+    the frame in place with or without pandas Copy-on-Write. Pass
+    ``owned=True`` to skip the copy. Only the current frame is referenced
+    between stages, so the previous frame can be freed as soon as a stage
+    returns and peak memory stays close to the size of one frame more
+    than the input.
+
+    Attributes:
+        stages (list[tuple[str, Callable]]): Stage names and functions, each
+            taking and returning a DataFrame.
+        track_memory (bool): If True, record the peak memory of each stage.
+        report (list[dict]): Memory report from the last run, one dict per
+            stage with the stage name, peak bytes allocated during the stage
+            and the size of the frame it returned.
+
+    Examples:
+        >>> pipeline = CleaningPipeline(DEEP_CLEAN_STAGES, track_memory=True)
+        >>> df_clean = pipeline.run(df_raw)
+        >>> pipeline.report
+    """
+
+    def __init__(self, stages, track_memory: bool = False):
+        self.stages = stages
+        self.track_memory = track_memory
+        self.report = []
+
+    def run(self, df: DataFrame, owned: bool = False) -> DataFrame:
+        """Run every stage and return the cleaned DataFrame.
+
+        Parameters:
+            df (pandas.DataFrame): Input DataFrame.
+            owned (bool): True if the caller hands the frame over to the
+                pipeline, which may then modify it in place. If False the
+                caller's frame is never modified.
+
+        Returns:
+            pandas.DataFrame: The DataFrame returned by the last stage.
+        """
+        self.report = []
+        started_tracing = self.track_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        try:
+            if not owned:
+                df = df.copy()
+            for name, func in self.stages:
+                df = self._run_stage(name, func, df)
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+        return df
+
+    def _run_stage(self, name: str, func, df: DataFrame) -> DataFrame:
+        """Run one stage, recording its peak memory if tracking is on."""
+        if not self.track_memory:
+            return run_stage(name, func, df)
+
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        df = run_stage(name, func, df)
+        _, peak = tracemalloc.get_traced_memory()
+        stage_report = {
+            'stage': name,
+            'peak_bytes': peak - baseline,
+            'frame_bytes': int(df.memory_usage(deep=True).sum()),
+        }
+        self.report.append(stage_report)
+        logger.info("stage=%(stage)s peak_bytes=%(peak_bytes)d frame_bytes=%(frame_bytes)d", stage_report)
+        return df
+
+
+# Stages run by deep_clean
+DEEP_CLEAN_STAGES = [
+    ("useful_columns", select_useful_columns),
+    ("remove_rows_with_missing_values", remove_rows_with_missing_values),
+    ("clean_types", clean_types),
+    ("change_types", change_types),
+]
+
+# Stages run on each chunk by clean_chunks
+CHUNK_STAGES = DEEP_CLEAN_STAGES[1:] + [("new_columns", new_columns)]
+
+
+def iter_useful_columns(csv_file, chunksize=DEFAULT_CHUNKSIZE):
+    """Read the useful subset of columns from the CSV a chunk of rows at a time.
+
+    Parameters:
+        csv_file (str | pathlib.Path): Path to the CSV file to read.
+        chunksize (int): Maximum number of rows in each chunk.
+
+    Returns:
+        Iterator[pandas.DataFrame]: DataFrames of at most ``chunksize`` rows.
+    """
+    return pd.read_csv(csv_file, usecols=USEFUL_COLUMNS, chunksize=chunksize)
+
+
+def clean_chunks(chunks):
+    """Apply the cleaning steps used by ``deep_clean`` to each chunk in turn.
+
+    Each step only needs the rows in the chunk, so the chunks can be
+    cleaned independently. This is a generator: a chunk is only read and
+    cleaned when the next cleaned chunk is requested.
+
+    Parameters:
+        chunks (Iterable[pandas.DataFrame]): Chunks of the raw data, e.g.
+            from ``iter_useful_columns``.
+
+    Yields:
+        pandas.DataFrame: Cleaned chunk with the ``duration`` column added.
+    """
+    # The date formats detected in the first chunk are used for the rest
+    date_formats = {}
+    stages = [(name, partial(func, date_formats=date_formats) if func is change_types else func)
+              for name, func in CHUNK_STAGES]
+    pipeline = CleaningPipeline(stages)
+    for chunk in chunks:
+        # Each chunk is a new frame that nothing else refers to
+        yield pipeline.run(chunk, owned=True)
+
+
+def deep_clean_streaming(csv_file, output_file, chunksize=DEFAULT_CHUNKSIZE) -> int:
+    """Clean the CSV chunk by chunk and write the result to ``output_file``.
+
+    Produces the same output as running ``deep_clean``, ``new_columns`` and
+    saving the result with ``type`` as the index, but only one chunk is held
+    in memory at a time so peak memory depends on ``chunksize`` rather than
+    the size of the input file.
+
+    Parameters:
+        csv_file (str | pathlib.Path): Path to the raw CSV file.
+        output_file (str | pathlib.Path): Path of the CSV file to write.
+        chunksize (int): Maximum number of rows read into memory at a time.
+
+    Returns:
+        int: Number of cleaned rows written.
+    """
+    rows_written = 0
+    # The file is opened once, so it is replaced even if there are no chunks to write
+    with open(output_file, 'w', newline='') as f:
+        for i, chunk in enumerate(clean_chunks(iter_useful_columns(csv_file, chunksize))):
+            # Write the header with the first chunk only
+            chunk.set_index('type').to_csv(f, header=(i == 0))
+            rows_written += len(chunk)
+    return rows_written
+
+
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    set_display_options()
     project_root = Path(__file__).parent.parent
 
     csv_file = project_root.joinpath('data', 'paralympics_raw.csv')
@@ -0,0 +1,36 @@
+""" Print and save the results of the benchmarks in the package, see query_benchmark and import_benchmark.
+
+Examples:
+
+    columns = [("module", "<42"), ("import ms", ">10.1f")]
+    print_table(columns, [("activities.starter.cq_docstring", 1.52)])
+    write_json(results, "benchmark.json")
+"""
+import json
+import re
+
+# The alignment and width of a format spec, e.g. '>10' of '>10.1f', used to format the column heading
+ALIGN_WIDTH = re.compile(r"^[<>^]?\d*")
+
+
+def print_table(columns, rows):
+    """ Print a heading line and a line for each row, with the values in fixed width columns.
+
+    Args:
+        columns: (heading, format spec) for each column, e.g. ("median", ">10.1f")
+        rows: Sequence of values for each row, in column order
+    """
+    print(" ".join(f"{heading:{ALIGN_WIDTH.match(spec).group()}}" for heading, spec in columns).rstrip())
+    for row in rows:
+        print(" ".join(f"{value:{spec}}" for value, (_, spec) in zip(row, columns)).rstrip())
+
+
+def write_json(results, json_path):
+    """ Save the results as JSON, e.g. to compare against the results from a later version of the code.
+
+    Args:
+        results: list of dicts, or of objects with a to_dict method
+        json_path: Path of the JSON file to write
+    """
+    with open(json_path, 'w') as f:
+        json.dump([result.to_dict() if hasattr(result, "to_dict") else result for result in results], f, indent=2)
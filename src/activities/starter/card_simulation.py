@@ -0,0 +1,201 @@
+""" Monte Carlo simulation of dealing hands of playing cards across several processes.
+
+The hands are dealt from CompactDeck. The work is split into a fixed number of tasks, and each task gets its own
+random number generator from numpy.random.SeedSequence.spawn, so the streams of random numbers are independent and
+the results only depend on the seed and the number of tasks, not on the number of processes or the order in which
+the tasks finish.
+
+Each task returns a HandStats of counts, which are added together to give the totals:
+
+    - suit_counts and rank_counts: the number of cards dealt of each suit and rank
+    - max_suit: the number of hands by the largest number of cards of one suit, e.g. max_suit[5] is flushes for
+      5 card hands
+    - max_rank: the number of hands by the largest number of cards of one rank, e.g. max_rank[2] is hands with a pair
+      but not three or four of a kind
+
+Examples:
+
+    stats = run_simulation(1_000_000, workers=4, seed=42)
+    print(stats.probabilities())
+    scaling_report(1_000_000)
+"""
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from activities.starter.lazy_import import lazy_import
+from activities.starter.playing_cards import RANKS, SUITS, CompactDeck
+
+np = lazy_import("numpy")
+
+# Number of tasks the hands are split into, fixed so the results do not depend on the number of workers
+DEFAULT_TASKS = 16
+
+
+@dataclass
+class HandStats:
+    """ Counts from dealing hands, see the module docstring.
+
+    Attributes:
+        hands: Number of hands dealt
+        suit_counts: Number of cards of each suit, in SUITS order
+        rank_counts: Number of cards of each rank, in RANKS order
+        max_suit: Number of hands by the largest number of cards of one suit, indexed 0 to hand size
+        max_rank: Number of hands by the largest number of cards of one rank, indexed 0 to hand size
+    """
+    hands: int
+    suit_counts: np.ndarray
+    rank_counts: np.ndarray
+    max_suit: np.ndarray
+    max_rank: np.ndarray
+
+    @classmethod
+    def empty(cls, hand_size, n_suits=None, n_ranks=None):
+        """ Return the stats for no hands of hand_size cards. n_suits and n_ranks default to len(SUITS), len(RANKS). """
+        n_suits = len(SUITS) if n_suits is None else n_suits
+        n_ranks = len(RANKS) if n_ranks is None else n_ranks
+        return cls(0, np.zeros(n_suits, dtype=np.int64), np.zeros(n_ranks, dtype=np.int64),
+                   np.zeros(hand_size + 1, dtype=np.int64), np.zeros(hand_size + 1, dtype=np.int64))
+
+    def __add__(self, other):
+        return HandStats(self.hands + other.hands, self.suit_counts + other.suit_counts,
+                         self.rank_counts + other.rank_counts, self.max_suit + other.max_suit,
+                         self.max_rank + other.max_rank)
+
+    def __eq__(self, other):
+        names = ('suit_counts', 'rank_counts', 'max_suit', 'max_rank')
+        return self.hands == other.hands and all(np.array_equal(getattr(self, name), getattr(other, name))
+                                                 for name in names)
+
+    def add_hands(self, suits, ranks):
+        """ Add the counts for a batch of hands.
+
+        Args:
+            suits: n_hands x hand_size array of suit indexes
+            ranks: n_hands x hand_size array of rank indexes
+        """
+        n_hands = suits.shape[0]
+        self.hands += n_hands
+        self.suit_counts += np.bincount(suits.ravel(), minlength=len(self.suit_counts))
+        self.rank_counts += np.bincount(ranks.ravel(), minlength=len(self.rank_counts))
+        self.max_suit += np.bincount(_max_per_row(suits, len(self.suit_counts)), minlength=len(self.max_suit))
+        self.max_rank += np.bincount(_max_per_row(ranks, len(self.rank_counts)), minlength=len(self.max_rank))
+
+    def probabilities(self):
+        """ Return the fraction of hands with each largest number of cards of one suit and of one rank. """
+        return {
+            'max_suit': (self.max_suit / self.hands).round(6).tolist(),
+            'max_rank': (self.max_rank / self.hands).round(6).tolist(),
+        }
+
+
+def _max_per_row(values, n_values):
+    """ Return the largest number of times any value appears in each row of a 2D array of indexes. """
+    n_rows = values.shape[0]
+    # Offset each row so one bincount counts every row separately
+    offsets = np.arange(n_rows)[:, None] * n_values
+    counts = np.bincount((values + offsets).ravel(), minlength=n_rows * n_values)
+    return counts.reshape(n_rows, n_values).max(axis=1)
+
+
+def simulate_hands(n_hands, seed_sequence, hand_size=5, decks=1):
+    """ Deal n_hands hands, shuffling the deck each time it runs out, and count them.
+
+    This runs in the worker processes, so it must be a module level function.
+
+    Args:
+        n_hands: Number of hands to deal
+        seed_sequence (np.random.SeedSequence): Seed for this task's random number generator
+        hand_size: Number of cards in a hand
+        decks: Number of decks shuffled together
+
+    Returns:
+        HandStats
+    """
+    deck = CompactDeck(decks=decks, rng=np.random.default_rng(seed_sequence))
+    hands_per_shuffle = len(deck) // hand_size
+    stats = HandStats.empty(hand_size, len(deck.suits), len(deck.ranks))
+    # Collect the hands from many shuffles, then count them with a few large array operations
+    shuffles_per_batch = max(1, 50_000 // hands_per_shuffle)
+    remaining = n_hands
+    while remaining > 0:
+        batch = []
+        for _ in range(shuffles_per_batch):
+            if remaining <= 0:
+                break
+            deck.reset()
+            deck.shuffle()
+            n = min(hands_per_shuffle, remaining)
+            batch.append(deck.deal_hands(n, hand_size))
+            remaining -= n
+        hands = np.concatenate(batch)
+        stats.add_hands(deck.suit_index(hands), deck.rank_index(hands))
+    return stats
+
+
+def split_hands(n_hands, n_tasks):
+    """ Split n_hands into n_tasks nearly equal parts. """
+    size, extra = divmod(n_hands, n_tasks)
+    return [size + (i < extra) for i in range(n_tasks)]
+
+
+def run_simulation(n_hands, workers=None, seed=None, hand_size=5, decks=1, tasks=DEFAULT_TASKS):
+    """ Deal n_hands hands across a pool of processes and return the combined counts.
+
+    Args:
+        n_hands: Total number of hands to deal
+        workers: Number of processes, defaults to the number of CPUs. With 1 the tasks run in this process.
+        seed: Seed for the SeedSequence the task seeds are spawned from, None for a random seed
+        hand_size: Number of cards in a hand
+        decks: Number of decks shuffled together
+        tasks: Number of tasks the hands are split into
+
+    Returns:
+        HandStats
+
+    Raises:
+        ValueError: If hand_size is not between 1 and the number of cards in the decks
+    """
+    deck_size = len(SUITS) * len(RANKS) * decks
+    if not 0 < hand_size <= deck_size:
+        raise ValueError(f"hand_size must be between 1 and {deck_size} for {decks} deck(s), not {hand_size}")
+    workers = workers or os.cpu_count()
+    seed_sequences = np.random.SeedSequence(seed).spawn(tasks)
+    counts = split_hands(n_hands, tasks)
+    args = (counts, seed_sequences, [hand_size] * tasks, [decks] * tasks)
+    if workers == 1:
+        results = map(simulate_hands, *args)
+        return sum(results, HandStats.empty(hand_size))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(simulate_hands, *args), HandStats.empty(hand_size))
+
+
+def scaling_report(n_hands=1_000_000, worker_counts=None, seed=0):
+    """ Print the hands dealt per second for different numbers of worker processes.
+
+    The counts are compared with those from one worker, which they should equal as the seed is the same.
+
+    Args:
+        n_hands: Number of hands dealt for each number of workers
+        worker_counts: Numbers of workers, defaults to 1, 2, 4, ... up to the number of CPUs
+        seed: Seed used for every run
+    """
+    cpus = os.cpu_count()
+    worker_counts = worker_counts or sorted({1, cpus} | {2 ** i for i in range(1, cpus.bit_length()) if 2 ** i <= cpus})
+    print(f"{'workers':>8} {'seconds':>10} {'hands/sec':>14} {'speedup':>8}  same counts")
+    baseline_time = baseline_stats = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        stats = run_simulation(n_hands, workers=workers, seed=seed)
+        duration = time.perf_counter() - start
+        if baseline_stats is None:
+            baseline_time, baseline_stats = duration, stats
+        print(f"{workers:>8} {duration:>10.3f} {n_hands / duration:>14,.0f} {baseline_time / duration:>7.2f}x"
+              f"  {stats == baseline_stats}")
+
+
+if __name__ == '__main__':
+    scaling_report()
@@ -1,54 +1,105 @@
 import sqlite3
-import time
 from importlib import resources
 
 from activities import data
+from activities.starter.benchmark_report import write_json
+from activities.starter.query_benchmark import benchmark_query, print_report, run_workload
 
+QUERY_UN = "SELECT * FROM Games WHERE type = 'summer' AND year = 2012;"
+QUERY_N = '''SELECT g.type,
+                    g.year,
+                    c.country,
+                    h.place_name AS host,
+                    g.start,
+                    g.end,
+                    GROUP_CONCAT(d.description, ', ') AS disabilities_included,
+                    g.countries,
+                    g.events,
+                    g.sports,
+                    g.participants_m,
+                    g.participants_f,
+                    g.participants,
+                    g.highlights,
+                    g.URL
+             FROM Games g
+                      JOIN GamesHost gh ON g.id = gh.games_id
+                      JOIN Host h ON gh.host_id = h.id
+                      JOIN Country c ON h.country_id = c.id
+                      LEFT JOIN GamesDisability gd ON g.id = gd.games_id
+                      LEFT JOIN Disability d ON gd.disability_id = d.id
+             WHERE h.place_name = 'London'
+               AND g.year = 2012
+             GROUP BY g.id, c.country, h.place_name
+;'''
 
-def execute_and_time_query(db_path, query, label):
+# Named queries to benchmark for each version of the database, the un-normalised and normalised queries return the
+# same data
+WORKLOADS = {
+    "un-normalised": {
+        "london_2012": QUERY_UN,
+        "summer_games": "SELECT * FROM Games WHERE type = 'summer' ORDER BY year;",
+    },
+    "normalised": {
+        "london_2012": QUERY_N,
+        "summer_games": '''SELECT g.*, GROUP_CONCAT(h.place_name, ', ') AS host
+                           FROM Games g
+                                    JOIN GamesHost gh ON g.id = gh.games_id
+                                    JOIN Host h ON gh.host_id = h.id
+                           WHERE g.type = 'summer'
+                           GROUP BY g.id
+                           ORDER BY g.year;''',
+    },
+}
+
+
+def execute_and_time_query(db_path, query, label, repeat=30, warmup=3):
+    """ Time a query with benchmark_query, then print the timings and the results.
+
+    Args:
+        db_path: Path to the database
+        query: SQL query to run
+        label: Name of the database used in the printed output
+        repeat: Number of timed runs
+        warmup: Number of untimed runs before the timed runs
+    """
+    stats = benchmark_query(db_path, query, label, repeat=repeat, warmup=warmup)
+    total = stats.summary()['total']
+    print(f"Query on {label} database executed in {total['median'] / 1e9:.6f} seconds "
+          f"(median of {stats.repeat} runs, min {total['min'] / 1e9:.6f}, p95 {total['p95'] / 1e9:.6f})")
+
+    # The results are fetched again outside the timed runs
     con = sqlite3.connect(db_path)
-    cur = con.cursor()
-    start_time = time.time()
-    cur.execute(query)
-    results = cur.fetchall()
-    end_time = time.time()
-    duration = end_time - start_time
-    print(f"Query on {label} database executed in {duration:.6f} seconds")
+    try:
+        results = con.execute(query).fetchall()
+    finally:
+        con.close()
     print("Query results:")
     for result in results:
         print(result)
-    con.close()
-
-
-def compare_paralympics_queries(db_un, db_n):
-    query_un = "SELECT * FROM Games WHERE type = 'summer' AND year = 2012;"
-    query_n = '''SELECT g.type,
-                        g.year,
-                        c.country,
-                        h.place_name AS host,
-                        g.start,
-                        g.end,
-                        GROUP_CONCAT(d.description, ', ') AS disabilities_included,
-                        g.countries,
-                        g.events,
-                        g.sports,
-                        g.participants_m,
-                        g.participants_f,
-                        g.participants,
-                        g.highlights,
-                        g.URL
-                 FROM Games g
-                          JOIN GamesHost gh ON g.id = gh.games_id
-                          JOIN Host h ON gh.host_id = h.id
-                          JOIN Country c ON h.country_id = c.id
-                          LEFT JOIN GamesDisability gd ON g.id = gd.games_id
-                          LEFT JOIN Disability d ON gd.disability_id = d.id
-                 WHERE h.place_name = 'London'
-                   AND g.year = 2012
-                 GROUP BY g.id, c.country, h.place_name
-    ;'''
-    execute_and_time_query(db_un, query_un, "un-normalised")
-    execute_and_time_query(db_n, query_n, "normalised")
+
+
+def compare_paralympics_queries(db_un, db_n, repeat=30, warmup=3, json_path=None, workloads=None):
+    """ Benchmark the WORKLOADS queries on the un-normalised and normalised databases and print a report.
+
+    Args:
+        db_un: Path to the un-normalised database
+        db_n: Path to the normalised database
+        repeat: Number of timed runs of each query
+        warmup: Number of untimed runs of each query
+        json_path: Optional path to save the results as JSON
+        workloads: dict with the queries for the "un-normalised" and "normalised" databases, defaults to WORKLOADS
+
+    Returns:
+        list[QueryStats]: the results for every query
+    """
+    workloads = workloads or WORKLOADS
+    results = []
+    for db_path, role in ((db_un, "un-normalised"), (db_n, "normalised")):
+        results.extend(run_workload(db_path, workloads[role], repeat=repeat, warmup=warmup))
+    print_report(results)
+    if json_path:
+        write_json(results, json_path)
+    return results
 
 
 def main():
@@ -1,8 +1,16 @@
 """ Examples of docstring styles and functions and class that are un-documented. """
-import sqlite3
+from __future__ import annotations
 
-import pandas as pd
-from matplotlib import pyplot as plt
+from typing import TYPE_CHECKING
+
+from activities.starter.lazy_import import lazy_import
+from activities.starter.schema_cache import get_column_names
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pyplot is only imported when generate_histogram is called
+plt = lazy_import("matplotlib.pyplot")
 
 
 # Google-style docstring specification: https://google.github.io/styleguide/pyguide.html#38-comments-and-docstrings
@@ -16,12 +24,7 @@ def get_column_names_g(db_path: str, table_name: str) -> list:
     Returns:
         col_names: List of column names
     """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(f"PRAGMA table_info({table_name});")
-    col_names = [row[1] for row in cursor.fetchall()]
-    cursor.close()
-    conn.close()
+    col_names = get_column_names(db_path, table_name)
     return col_names
 
 
@@ -42,12 +45,7 @@ def get_column_names_n(db_path: str, table_name: str) -> list:
         col_names: list
             List of column names.
         """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(f"PRAGMA table_info({table_name});")
-    col_names = [row[1] for row in cursor.fetchall()]
-    cursor.close()
-    conn.close()
+    col_names = get_column_names(db_path, table_name)
     return col_names
 
 
@@ -64,12 +62,7 @@ def get_column_names_s(db_path: str, table_name: str) -> list:
         :return: List of column names.
         :rtype: list
         """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(f"PRAGMA table_info({table_name});")
-    col_names = [row[1] for row in cursor.fetchall()]
-    cursor.close()
-    conn.close()
+    col_names = get_column_names(db_path, table_name)
     return col_names
 
 
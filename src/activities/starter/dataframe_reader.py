@@ -0,0 +1,235 @@
+""" Read the results of a SQL query into a pandas DataFrame with a dtype for each column.
+
+pd.read_sql gives int64 or float64 columns depending on whether a column has nulls, object columns for text, and
+leaves dates as strings. Here the dtype comes from the declared type of the column in the table (PRAGMA table_info,
+see schema_cache), using the same rules SQLite uses to decide a column's type affinity:
+
+    declared type                   dtype
+    DATE, DATETIME, TIMESTAMP       datetime64[ns]
+    contains INT                    Int64
+    contains CHAR, CLOB or TEXT     string
+    BOOL, BOOLEAN                   boolean
+    contains REAL, FLOA or DOUB     Float64
+    NUMERIC, DECIMAL(10,2), ...     Float64
+    BLOB or no type                 object
+
+Int64, Float64, boolean and string are the pandas nullable dtypes, so NULL is <NA> and an integer column with nulls
+stays an integer column. SQLite does not check the values against the declared type, so a column with a value that
+does not fit its dtype, e.g. 'n/a' in an INTEGER or DATE column, is read as object instead.
+
+The rows are fetched with fetchmany into arrays allocated for chunk_size rows per column, and each full chunk is
+converted to a DataFrame with one array operation per column. read_query_chunks yields each chunk, so memory use
+depends on chunk_size rather than the number of rows; read_query concatenates them.
+
+Examples:
+
+    conn = connect("chinook.db")
+    df = read_table(conn, "invoices")
+    df = read_query(conn, "SELECT t.Name, t.Milliseconds FROM tracks t", table_name="tracks")
+    for df in read_query_chunks(conn, "SELECT * FROM playlist_track", table_name="playlist_track", chunk_size=1000):
+        print(df.dtypes)
+"""
+import time
+from importlib import resources
+from typing import ClassVar
+
+from activities import data
+from activities.starter.lazy_import import lazy_import
+from activities.starter.query_log import connect
+from activities.starter.schema_cache import get_table_info
+from activities.starter.streaming_query import quote
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+
+def dtype_for(declared_type):
+    """ Return the pandas dtype for a column's declared type, see the module docstring. """
+    declared_type = (declared_type or "").upper()
+    if declared_type.startswith(("DATE", "TIMESTAMP")):
+        return "datetime64[ns]"
+    if "INT" in declared_type:
+        return "Int64"
+    if any(name in declared_type for name in ("CHAR", "CLOB", "TEXT")):
+        return "string"
+    if declared_type.startswith("BOOL"):
+        return "boolean"
+    if not declared_type or "BLOB" in declared_type:
+        return "object"
+    return "Float64"
+
+
+def table_dtypes(conn, table_name):
+    """ Return {column name: dtype} for each column of a table. """
+    return {column: dtype_for(declared_type)
+            for column, declared_type in get_table_info(conn, table_name).types.items()}
+
+
+class ColumnBuffer:
+    """ An array for the values of one column in a chunk, and a mask of the nulls.
+
+    Args:
+        dtype: pandas dtype name, see dtype_for
+        size: Number of rows in a chunk
+    """
+
+    # numpy dtype of the values array, the numpy kinds of value it accepts, and the value stored in place of NULL
+    ARRAY_TYPES: ClassVar[dict] = {
+        'Int64': ("int64", "iu", 0),
+        'Float64': ("float64", "iuf", 0.0),
+        'boolean': ("bool", "iub", False),
+    }
+
+    def __init__(self, dtype, size):
+        self.dtype = dtype
+        array_type, self.kinds, self.fill = self.ARRAY_TYPES.get(dtype, ("object", None, None))
+        self.values = np.empty(size, dtype=array_type)
+        self.mask = np.zeros(size, dtype=np.bool_)
+
+    def put(self, start, values):
+        """ Store the values of one column from a batch of rows, starting at row start.
+
+        Raises:
+            TypeError: If a value does not fit the dtype, e.g. text or a float in an Int64 column
+        """
+        end = start + len(values)
+        if self.kinds is None:
+            self.values[start:end] = values
+            self.mask[start:end] = False
+            return
+        # numpy picks int64, float64 or bool if every value is one, and object if any is None
+        array = np.asarray(values)
+        if array.dtype.kind in self.kinds:
+            self.values[start:end] = array
+            self.mask[start:end] = False
+            return
+        mask = np.equal(array.astype(object), None)
+        not_null = np.asarray(array[~mask].tolist())
+        if not_null.size and not_null.dtype.kind not in self.kinds:
+            raise TypeError(f"{not_null.dtype} values in a {self.dtype} column")
+        chunk = self.values[start:end]
+        chunk[mask] = self.fill
+        chunk[~mask] = not_null
+        self.mask[start:end] = mask
+
+    def to_array(self, n_rows):
+        """ Return the first n_rows values as a pandas array of the buffer's dtype. """
+        values = self.values[:n_rows]
+        mask = self.mask[:n_rows]
+        if self.dtype == 'Int64':
+            return pd.arrays.IntegerArray(values.copy(), mask.copy())
+        if self.dtype == 'Float64':
+            return pd.arrays.FloatingArray(values.copy(), mask.copy())
+        if self.dtype == 'boolean':
+            return pd.arrays.BooleanArray(values.copy(), mask.copy())
+        if self.dtype == 'string':
+            return pd.array(values.copy(), dtype="string")
+        if self.dtype == 'datetime64[ns]':
+            try:
+                return pd.to_datetime(values, format="ISO8601").as_unit("ns").array
+            except (ValueError, TypeError, OverflowError):
+                # A value that is not a date is kept rather than being changed to NaT, the column is object
+                pass
+        return values.copy()
+
+
+def _new_buffers(dtypes, size):
+    return [ColumnBuffer(dtype, size) for dtype in dtypes]
+
+
+def _put_rows(buffers, start, rows):
+    """ Store a batch of rows in the buffers. A column that does not fit its dtype is changed to object. """
+    for i, values in enumerate(zip(*rows)):
+        buffer = buffers[i]
+        try:
+            buffer.put(start, values)
+        except (TypeError, ValueError, OverflowError):
+            # SQLite does not enforce column types, e.g. 'n/a' can be stored in an INTEGER column
+            fallback = ColumnBuffer("object", len(buffer.values))
+            fallback.values[:start] = buffer.values[:start].astype(object)
+            fallback.values[:start][buffer.mask[:start]] = None
+            fallback.put(start, values)
+            buffers[i] = fallback
+
+
+def _to_frame(columns, buffers, n_rows):
+    return pd.DataFrame({column: buffer.to_array(n_rows) for column, buffer in zip(columns, buffers)})
+
+
+def read_query_chunks(conn, sql, params=(), table_name=None, dtypes=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Run a query and yield the results as DataFrames of up to chunk_size rows.
+
+    Args:
+        conn: sqlite3 connection
+        sql: SELECT statement
+        params: Query parameters
+        table_name: Table the dtypes of the result columns are read from, matched by column name
+        dtypes: {column name: dtype}, overrides the dtypes from table_name
+        chunk_size: Number of rows in each DataFrame, and fetched at a time
+
+    Yields:
+        pd.DataFrame: each chunk, columns not found in table_name or dtypes are object
+    """
+    column_dtypes = table_dtypes(conn, table_name) if table_name else {}
+    column_dtypes.update(dtypes or {})
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        columns = [description[0] for description in cursor.description]
+        dtypes = [column_dtypes.get(column, "object") for column in columns]
+        buffers = _new_buffers(dtypes, chunk_size)
+        n_rows = 0
+        chunks = 0
+        while rows := cursor.fetchmany(chunk_size - n_rows):
+            _put_rows(buffers, n_rows, rows)
+            n_rows += len(rows)
+            if n_rows == chunk_size:
+                yield _to_frame(columns, buffers, n_rows)
+                chunks += 1
+                n_rows = 0
+        # An empty result is an empty DataFrame with the columns
+        if n_rows or not chunks:
+            yield _to_frame(columns, buffers, n_rows)
+    finally:
+        cursor.close()
+
+
+def read_query(conn, sql, params=(), table_name=None, dtypes=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Run a query and return all the results as one DataFrame. See read_query_chunks for the arguments. """
+    chunks = list(read_query_chunks(conn, sql, params, table_name, dtypes, chunk_size))
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_table(conn, table_name, columns=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Return the rows of a table as a DataFrame, typed from the table's declared column types. """
+    columns = columns or get_table_info(conn, table_name).columns
+    sql = f"SELECT {', '.join(quote(column) for column in columns)} FROM {quote(table_name)}"
+    return read_query(conn, sql, table_name=table_name, chunk_size=chunk_size)
+
+
+def benchmark(table_names=("tracks", "playlist_track", "invoice_items", "invoices"), repeat=5):
+    """ Compare the time to read tables from chinook.db with read_table and pd.read_sql. """
+    conn = connect(resources.files(data).joinpath("chinook.db"))
+    print(f"{'table':<16} {'rows':>6} {'read_sql ms':>12} {'read_table ms':>14}  dtypes")
+    for table_name in table_names:
+        sql = f"SELECT * FROM {table_name}"
+        timings = {}
+        # The loop variables are bound as defaults, so each function uses this table even if it is called later
+        for name, function in (('read_sql', lambda sql=sql: pd.read_sql(sql, conn)),
+                               ('read_table', lambda table_name=table_name: read_table(conn, table_name))):
+            function()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                df = function()
+            timings[name] = (time.perf_counter() - start) / repeat * 1000
+        dtypes = ", ".join(sorted({str(dtype) for dtype in df.dtypes}))
+        print(f"{table_name:<16} {len(df):>6} {timings['read_sql']:>12.2f} {timings['read_table']:>14.2f}  {dtypes}")
+    conn.close()
+
+
+if __name__ == '__main__':
+    benchmark()
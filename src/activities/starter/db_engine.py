@@ -0,0 +1,185 @@
+""" Create SQLModel engines for SQLite databases with the same settings everywhere.
+
+create_engine() on its own does not turn on foreign key support in SQLite. Running PRAGMA foreign_keys=ON on one
+connection, e.g. in create_db_and_tables, only affects that connection and not the other connections in the pool.
+The engines created here run the PRAGMAs in a 'connect' event, so every connection the pool opens has them:
+
+    - foreign_keys=ON for every database
+    - journal_mode=WAL and synchronous=NORMAL for database files, only if the engine is created with wal=True, so
+      reads do not wait for writes and a commit does not wait for the data to be written to disk (it is still written
+      before the next checkpoint). WAL mode is stored in the database file, and synchronous=NORMAL means a commit can
+      be lost if the computer loses power, so it is left to the code that needs concurrent reads and writes.
+
+Pooling:
+
+    - ':memory:' uses a StaticPool, i.e. a single connection. Each connection to ':memory:' would otherwise be a new,
+      empty database.
+    - Database files use a QueuePool so connections are reused rather than opened for each session.
+
+echo is off by default; logging every statement slows the code down a lot. Pass echo=True to see the SQL.
+
+get_async_engine creates the asyncio version of an engine, using the aiosqlite driver, with the same PRAGMAs.
+
+Examples:
+
+    engine = get_engine("students.sqlite")
+    with Session(engine) as session:
+        ...
+"""
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+from sqlmodel import create_engine
+
+MEMORY_DB = ":memory:"
+
+# Applied to every connection
+SQLITE_PRAGMAS = {
+    'foreign_keys': 'ON',
+}
+
+# Applied to every connection to a database file created with wal=True, in addition to SQLITE_PRAGMAS
+WAL_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+}
+
+
+def is_memory_db(db_path):
+    return str(db_path) in (MEMORY_DB, "")
+
+
+def sqlite_url(db_path, driver=None):
+    """ Return the SQLAlchemy URL for a database file, or for an in-memory database if db_path is ':memory:'.
+
+    Args:
+        db_path: Path to the database file, or ':memory:'
+        driver: Name of the DBAPI driver, e.g. 'aiosqlite', defaults to the sqlite3 module
+    """
+    scheme = f"sqlite+{driver}" if driver else "sqlite"
+    if is_memory_db(db_path):
+        return f"{scheme}://"
+    return f"{scheme}:///{db_path}"
+
+
+def set_sqlite_pragmas(dbapi_connection, pragmas):
+    """ Run the PRAGMAs on a new DBAPI (sqlite3) connection. """
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value};")
+    cursor.close()
+
+
+def create_sqlite_engine(db_path, echo=False, pool_size=5, max_overflow=10, pragmas=None, wal=False):
+    """ Create an engine with the pooling and PRAGMAs described in the module docstring.
+
+    Args:
+        db_path: Path to the database file, or ':memory:'
+        echo: If True, log the SQL of every statement
+        pool_size: Number of connections kept open by the pool, ignored for ':memory:'
+        max_overflow: Number of extra connections the pool can open when all pool_size connections are in use
+        pragmas: PRAGMAs to run on each connection, defaults to SQLITE_PRAGMAS, plus WAL_PRAGMAS if wal is True
+        wal: If True, use WAL mode and synchronous=NORMAL for a database file, ignored for ':memory:'
+
+    Returns:
+        sqlalchemy.engine.Engine
+    """
+    pool_args, pragmas = _pool_args(db_path, QueuePool, pool_size, max_overflow, pragmas, wal)
+    engine = create_engine(sqlite_url(db_path), echo=echo, **pool_args)
+    _listen_for_connect(engine, pragmas)
+    return engine
+
+
+def _pool_args(db_path, queue_pool_class, pool_size, max_overflow, pragmas, wal):
+    """ Return the pool arguments for create_engine and the PRAGMAs to run, see the module docstring. """
+    if is_memory_db(db_path):
+        pool_args = {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}}
+        default_pragmas = SQLITE_PRAGMAS
+    else:
+        pool_args = {'poolclass': queue_pool_class, 'pool_size': pool_size, 'max_overflow': max_overflow}
+        default_pragmas = SQLITE_PRAGMAS | WAL_PRAGMAS if wal else SQLITE_PRAGMAS
+    return pool_args, default_pragmas if pragmas is None else pragmas
+
+
+def _listen_for_connect(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        set_sqlite_pragmas(dbapi_connection, pragmas)
+
+
+def create_async_sqlite_engine(db_path, echo=False, pool_size=5, max_overflow=10, pragmas=None, wal=False):
+    """ Create an asyncio engine using the aiosqlite driver, with the same pooling and PRAGMAs as
+    create_sqlite_engine.
+
+    aiosqlite is only needed, and imported, when an async engine is created.
+
+    Returns:
+        sqlalchemy.ext.asyncio.AsyncEngine
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    pool_args, pragmas = _pool_args(db_path, AsyncAdaptedQueuePool, pool_size, max_overflow, pragmas, wal)
+    engine = create_async_engine(sqlite_url(db_path, driver="aiosqlite"), echo=echo, **pool_args)
+    # Events are registered on the synchronous engine that the async engine wraps
+    _listen_for_connect(engine.sync_engine, pragmas)
+    return engine
+
+
+# Engines created by get_engine and get_async_engine, keyed by (resolved file path, async, echo, wal)
+_engines = {}
+
+
+def _get_cached_engine(create, db_path, is_async, echo, wal):
+    """ Return the engine from _engines for the file and settings, calling create to make it the first time. """
+    key = (str(Path(db_path).resolve()), is_async, echo, wal)
+    if key not in _engines:
+        _engines[key] = create(key[0], echo=echo, wal=wal)
+    return _engines[key]
+
+
+def get_engine(db_path, echo=False, wal=False):
+    """ Return the engine for a database file, creating it the first time it is needed.
+
+    The same engine, and so the same connection pool, is returned for every call with the same file and settings. A
+    call with a different echo or wal gets its own engine, so changing a setting does not change the engine that
+    other callers are using. WAL mode is stored in the database file though, so once a wal=True engine has connected
+    every connection to the file uses it. An in-memory database gets a new engine on every call, as each one is a
+    separate database.
+
+    Args:
+        db_path: Path to the database file, or ':memory:'
+        echo: If True, log the SQL of every statement
+        wal: If True, use WAL mode, see the module docstring
+
+    Returns:
+        sqlalchemy.engine.Engine
+    """
+    if is_memory_db(db_path):
+        return create_sqlite_engine(db_path, echo=echo)
+    return _get_cached_engine(create_sqlite_engine, db_path, False, echo, wal)
+
+
+def get_async_engine(db_path, echo=False, wal=False):
+    """ Return the async engine for a database file, see get_engine.
+
+    Returns:
+        sqlalchemy.ext.asyncio.AsyncEngine
+    """
+    if is_memory_db(db_path):
+        return create_async_sqlite_engine(db_path, echo=echo)
+    return _get_cached_engine(create_async_sqlite_engine, db_path, True, echo, wal)
+
+
+def dispose_engines():
+    """ Close the pooled connections of every engine created by get_engine and forget the engines.
+
+    The connections of async engines are closed without awaiting, call 'await engine.dispose()' first to close
+    them cleanly.
+    """
+    for key, engine in _engines.items():
+        if key[1]:
+            engine.sync_engine.dispose(close=False)
+        else:
+            engine.dispose()
+    _engines.clear()
@@ -0,0 +1,46 @@
+""" Asyncio version of database.py for the students database, using the aiosqlite driver.
+
+Examples:
+
+    import asyncio
+
+    async def main():
+        await create_db_and_tables_async()
+        repository = AsyncRepository(get_async_session_factory())
+        print(await repository.enrollments_for_student(1))
+
+    asyncio.run(main())
+"""
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from activities.starter.db_engine import get_async_engine as get_async_sqlite_engine
+from activities.starter.db_wk8.database import student_db
+
+
+def get_async_engine(db_path=student_db, echo=False):
+    """ Return the async engine for the students database, created the first time it is needed. """
+    return get_async_sqlite_engine(db_path, echo=echo)
+
+
+def get_async_session_factory(engine=None):
+    """ Return a factory for AsyncSession objects, e.g. 'async with session_factory() as session:'.
+
+    expire_on_commit is False so objects can still be read after the session commits, in async code reading an
+    expired attribute would need to await a query.
+
+    Args:
+        engine: AsyncEngine, defaults to the students database engine
+    """
+    return async_sessionmaker(engine or get_async_engine(), class_=AsyncSession, expire_on_commit=False)
+
+
+async def create_db_and_tables_async(engine=None):
+    """ Create the tables for the models, if they do not exist.
+
+    The models are in SQLModel.metadata because database, imported above, imports them.
+    """
+    engine = engine or get_async_engine()
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
@@ -8,23 +8,36 @@ Note:
     """
 from importlib import resources
 
-from sqlmodel import SQLModel, create_engine, text
+from sqlmodel import SQLModel
 
 from activities.starter import db_wk8
+from activities.starter.db_engine import get_engine as get_sqlite_engine
 from activities.starter.db_wk8 import models
 
 student_db = resources.files(db_wk8).joinpath("students.sqlite")
-sqlite_url = f"sqlite:///{str(student_db)}"
-# echo=True means the SQL executed by SQLModel will be output to the terminal when the code is run.
-# This can be useful for debugging.
-engine = create_engine(sqlite_url, echo=True)
+
+
+def get_engine(echo=False):
+    """ Return the engine for the students database, it is created the first time this is called, not on import.
+
+    PRAGMA foreign_keys=ON is applied to every connection by the engine, see activities.starter.db_engine.
+
+    Args:
+        echo: If True, the SQL executed by SQLModel will be output to the terminal, useful for debugging.
+    """
+    return get_sqlite_engine(student_db, echo=echo)
+
+
+def __getattr__(name):
+    # Lets existing code keep using database.engine, without creating the engine when the module is imported
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def create_db_and_tables():
-    with engine.connect() as connection:
-        connection.execute(text("PRAGMA foreign_keys=ON"))  # for SQLite foreign key support
-        SQLModel.metadata.create_all(engine)
+    SQLModel.metadata.create_all(get_engine())
 
 
 def drop_db_and_tables():
-    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.drop_all(get_engine())
@@ -1,7 +1,9 @@
 from datetime import datetime
 from typing import List
 
-from sqlmodel import Field, Relationship, SQLModel, Session, create_engine, text, select
+from sqlmodel import Field, Relationship, SQLModel, Session, select
+
+from activities.starter.db_engine import create_sqlite_engine, get_engine
 
 
 class Error(SQLModel, table=True):
@@ -21,8 +23,7 @@ class Occurrence(SQLModel, table=True):
 
 
 def create_db(engine):
-    with engine.connect() as connection:
-        connection.execute(text("PRAGMA foreign_keys=ON"))
+    # The engine turns on foreign key support for every connection, see activities.starter.db_engine
     SQLModel.metadata.drop_all(engine)
     SQLModel.metadata.create_all(engine)
     add_sample_data(engine)
@@ -48,7 +49,7 @@ def add_sample_data(engine):
 
 
 def database_location_incorrect():
-    engine = create_engine("sqlite:///data/errordbsqlite", echo=True)
+    engine = get_engine("data/errordbsqlite", echo=True)
     create_db(engine)
 
 
@@ -78,7 +79,7 @@ if __name__ == '__main__':
     # Uncomment and run each of these in turn to see the exceptions; then add try/except to the functions
 
     # Creates an in-memory database, ie not on file
-    engine = create_engine("sqlite:///:memory:", echo=True)
+    engine = create_sqlite_engine(":memory:", echo=True)
     create_db(engine)
 
     # database_location_incorrect()
@@ -0,0 +1,106 @@
+""" Compare the requests per second of the sync and async repositories with concurrent clients.
+
+A temporary copy of the students database is filled with generated students, teachers, courses and enrollments.
+Each client then makes a number of enrollment lookups (Repository.enrollments_for_student) for random students:
+
+    - sync: each client is a thread using Repository
+    - async: each client is a coroutine using AsyncRepository, all running on one event loop
+
+Examples:
+
+    python -m activities.starter.db_wk8.load_test
+"""
+import asyncio
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from sqlmodel import SQLModel
+
+from activities.starter.db_engine import dispose_engines, get_async_engine, get_engine
+from activities.starter.db_wk8.async_database import get_async_session_factory
+from activities.starter.db_wk8.models import Course, Enrollment, Location, Student, Teacher
+from activities.starter.db_wk8.repository import AsyncRepository, Repository
+
+
+def seed_database(repository, students=500, teachers=20, courses=40, courses_per_student=4, seed=0):
+    """ Add generated rows to an empty database.
+
+    Returns:
+        list[int]: the student ids
+    """
+    rng = random.Random(seed)
+    locations = [Location(id=i, room=f"Room {i}") for i in range(1, 11)]
+    teacher_rows = [Teacher(id=i, teacher_name=f"Teacher {i}", teacher_email=f"teacher{i}@school.com")
+                    for i in range(1, teachers + 1)]
+    course_rows = [Course(id=i, course_name=f"Course {i}", course_code=1000 + i, location_id=rng.randint(1, 10))
+                   for i in range(1, courses + 1)]
+    student_rows = [Student(id=i, student_name=f"Student {i}", student_email=f"student{i}@school.com")
+                    for i in range(1, students + 1)]
+    enrollments = [Enrollment(student_id=student.id, course_id=course_id, teacher_id=rng.randint(1, teachers))
+                   for student in student_rows
+                   for course_id in rng.sample(range(1, courses + 1), courses_per_student)]
+    repository.add_all(locations + teacher_rows + course_rows + student_rows)
+    repository.add_all(enrollments)
+    return [student.id for student in student_rows]
+
+
+def run_sync_load(repository, student_ids, clients, requests_per_client, seed=0):
+    """ Run the lookups on client threads.
+
+    Returns:
+        float: requests per second
+    """
+    def client(client_id):
+        rng = random.Random(seed + client_id)
+        for _ in range(requests_per_client):
+            repository.enrollments_for_student(rng.choice(student_ids))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(client, range(clients)))
+    return clients * requests_per_client / (time.perf_counter() - start)
+
+
+async def run_async_load(repository, student_ids, clients, requests_per_client, seed=0):
+    """ Run the lookups as concurrent coroutines.
+
+    Returns:
+        float: requests per second
+    """
+    async def client(client_id):
+        rng = random.Random(seed + client_id)
+        for _ in range(requests_per_client):
+            await repository.enrollments_for_student(rng.choice(student_ids))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(client_id) for client_id in range(clients)))
+    return clients * requests_per_client / (time.perf_counter() - start)
+
+
+def main(client_counts=(1, 4, 16, 64), requests_per_client=200):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir).joinpath("students_load.sqlite")
+        # WAL, as a web app would use, so the reads do not wait for the writes
+        engine = get_engine(db_path, wal=True)
+        SQLModel.metadata.create_all(engine)
+        sync_repository = Repository(engine)
+        student_ids = seed_database(sync_repository)
+
+        async_engine = get_async_engine(db_path, wal=True)
+        async_repository = AsyncRepository(get_async_session_factory(async_engine))
+
+        print(f"{'clients':>8} {'sync req/s':>12} {'async req/s':>12}")
+        for clients in client_counts:
+            sync_rps = run_sync_load(sync_repository, student_ids, clients, requests_per_client)
+            async_rps = asyncio.run(run_async_load(async_repository, student_ids, clients, requests_per_client))
+            print(f"{clients:>8} {sync_rps:>12,.0f} {async_rps:>12,.0f}")
+            # Each asyncio.run has a new event loop, the pooled aiosqlite connections belong to the old one
+            asyncio.run(async_engine.dispose())
+        dispose_engines()
+
+
+if __name__ == '__main__':
+    main()
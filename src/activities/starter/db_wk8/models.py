@@ -1,6 +1,14 @@
-""" SQLModel classes for the students database. """
+""" SQLModel classes for the students database.
+
+Enrollment links a student, a course and a teacher, so an enrollment has to be added as an Enrollment row. The
+many-to-many relationships that go through Enrollment, e.g. Student.courses, only link two of the three and so are
+read only (viewonly), they cannot create or delete Enrollment rows.
+"""
 from sqlmodel import Field, Relationship, SQLModel
 
+# Options for the relationships that go through the Enrollment link table, see the module docstring
+VIEW_ONLY = {"viewonly": True}
+
 
 class Location(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
@@ -20,7 +28,10 @@ class Student(SQLModel, table=True):
     student_name: str
     student_email: str
 
-    courses: list["Course"] = Relationship(back_populates="students", link_model=Enrollment)
+    courses: list["Course"] = Relationship(back_populates="students", link_model=Enrollment,
+                                           sa_relationship_kwargs=VIEW_ONLY)
+    teachers: list["Teacher"] = Relationship(back_populates="students", link_model=Enrollment,
+                                             sa_relationship_kwargs=VIEW_ONLY)
 
 
 class Teacher(SQLModel, table=True):
@@ -28,8 +39,10 @@ class Teacher(SQLModel, table=True):
     teacher_name: str
     teacher_email: str
 
-    courses: list["Course"] = Relationship(back_populates="teachers", link_model=Enrollment)
-    students: list["Student"] = Relationship(back_populates="teachers", link_model=Enrollment)
+    courses: list["Course"] = Relationship(back_populates="teachers", link_model=Enrollment,
+                                           sa_relationship_kwargs=VIEW_ONLY)
+    students: list["Student"] = Relationship(back_populates="teachers", link_model=Enrollment,
+                                             sa_relationship_kwargs=VIEW_ONLY)
 
 
 class Course(SQLModel, table=True):
@@ -39,6 +52,8 @@ class Course(SQLModel, table=True):
     course_schedule: str | None = None
     location_id: int | None = Field(foreign_key="location.id")
 
-    students: list["Student"] = Relationship(back_populates="courses", link_model=Enrollment)
-    teachers: list["Teacher"] = Relationship(back_populates="courses", link_model=Enrollment)
+    students: list["Student"] = Relationship(back_populates="courses", link_model=Enrollment,
+                                             sa_relationship_kwargs=VIEW_ONLY)
+    teachers: list["Teacher"] = Relationship(back_populates="courses", link_model=Enrollment,
+                                             sa_relationship_kwargs=VIEW_ONLY)
     location: "Location" = Relationship(back_populates="courses")
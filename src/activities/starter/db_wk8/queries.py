@@ -0,0 +1,60 @@
+""" Queries that load a model together with the related objects a use case needs.
+
+By default a relationship, e.g. Course.students, is loaded by its own query the first time it is used. Listing every
+course with its students and teachers would run 1 query for the courses then 2 more for each course (the N+1
+problem). These queries say how each relationship is loaded up front:
+
+    - selectinload for lists (Course.students): one more query for all the objects, WHERE id IN (...). A join would
+      repeat each course for every student times every teacher.
+    - joinedload for a single object (Course.location): added to the same query with a LEFT OUTER JOIN, it does not
+      add rows.
+    - raiseload for everything else, so using a relationship the query did not load raises an error rather than
+      quietly running a query per object.
+
+Examples:
+
+    with Session(engine) as session:
+        for course in session.exec(select_courses_with_people()):
+            print(course.course_name, course.location.room, len(course.students), len(course.teachers))
+"""
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+from sqlmodel import select
+
+from activities.starter.db_wk8.models import Course, Location, Student, Teacher
+
+
+def select_courses_with_people():
+    """ Courses with their location, students and teachers, e.g. for a list of all the courses. """
+    return (select(Course)
+            .options(joinedload(Course.location),
+                     selectinload(Course.students),
+                     selectinload(Course.teachers),
+                     raiseload("*"))
+            .order_by(Course.id))
+
+
+def select_student_timetable(student_id):
+    """ A student with their courses, the location of each course, and their teachers. """
+    return (select(Student)
+            .where(Student.id == student_id)
+            .options(selectinload(Student.courses).joinedload(Course.location),
+                     selectinload(Student.teachers),
+                     raiseload("*")))
+
+
+def select_teacher_classes(teacher_id):
+    """ A teacher with their courses and the students on each course.
+
+    Course.students lists every student on the course, including those taught by another teacher.
+    """
+    return (select(Teacher)
+            .where(Teacher.id == teacher_id)
+            .options(selectinload(Teacher.courses).selectinload(Course.students),
+                     raiseload("*")))
+
+
+def select_locations_with_courses():
+    """ Locations with the courses held in each, e.g. for a room booking list. """
+    return (select(Location)
+            .options(selectinload(Location.courses), raiseload("*"))
+            .order_by(Location.id))
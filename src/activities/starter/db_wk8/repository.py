@@ -0,0 +1,194 @@
+""" Data access for the students database, with the same methods for sync and asyncio code.
+
+The statements are built by the select_* functions and run by Repository, with a Session, or AsyncRepository, with
+an AsyncSession. Each method uses its own session, so the repositories can be shared by concurrent requests.
+
+Relationships are not loaded until they are used. In async code that would need an await, so it raises an error
+instead. Pass the names of the relationships to load with the objects, e.g. load=("courses",), and they are loaded
+with selectinload: one extra query per relationship for all the objects, rather than one per object. For the common
+use cases, e.g. courses_with_people, the loading is set for the whole graph in queries.py.
+
+Examples:
+
+    repository = Repository(get_engine())
+    student = repository.get_student(1, load=("courses",))
+    print(student.courses)
+
+    repository = AsyncRepository(get_async_session_factory())
+    courses = await repository.enrollments_for_student(1)
+"""
+from sqlalchemy.orm import selectinload, sessionmaker
+from sqlmodel import Session, select
+
+from activities.starter.db_wk8.models import Course, Enrollment, Location, Student, Teacher
+from activities.starter.db_wk8.queries import (
+    select_courses_with_people,
+    select_locations_with_courses,
+    select_student_timetable,
+    select_teacher_classes,
+)
+
+
+def load_options(model, load):
+    """ Return a selectinload option for each relationship name in load, e.g. ("courses", "teachers"). """
+    return [selectinload(getattr(model, name)) for name in load]
+
+
+def select_by_id(model, row_id, load=()):
+    return select(model).where(model.id == row_id).options(*load_options(model, load))
+
+
+def select_all(model, load=(), limit=None, offset=0):
+    return select(model).order_by(model.id).offset(offset).limit(limit).options(*load_options(model, load))
+
+
+def select_enrollments_for_student(student_id):
+    """ Select (Course, Teacher) for each course the student is enrolled on. """
+    return (select(Course, Teacher)
+            .join(Enrollment, Enrollment.course_id == Course.id)
+            .join(Teacher, Teacher.id == Enrollment.teacher_id)
+            .where(Enrollment.student_id == student_id)
+            .order_by(Course.id, Teacher.id))
+
+
+def select_students_for_course(course_id):
+    """ Select the students enrolled on a course, once each even if they have more than one teacher. """
+    return (select(Student)
+            .join(Enrollment, Enrollment.student_id == Student.id)
+            .where(Enrollment.course_id == course_id)
+            .distinct()
+            .order_by(Student.id))
+
+
+class Repository:
+    """ Runs the students database queries with a Session.
+
+    Args:
+        engine: Engine for the students database, see database.get_engine
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.session_factory = sessionmaker(engine, class_=Session, expire_on_commit=False)
+
+    def _one(self, statement):
+        with self.session_factory() as session:
+            return session.exec(statement).first()
+
+    def _all(self, statement):
+        with self.session_factory() as session:
+            return list(session.exec(statement).all())
+
+    def get_student(self, student_id, load=()):
+        return self._one(select_by_id(Student, student_id, load))
+
+    def get_teacher(self, teacher_id, load=()):
+        return self._one(select_by_id(Teacher, teacher_id, load))
+
+    def get_course(self, course_id, load=()):
+        return self._one(select_by_id(Course, course_id, load))
+
+    def list_students(self, load=(), limit=None, offset=0):
+        return self._all(select_all(Student, load, limit, offset))
+
+    def list_courses(self, load=(), limit=None, offset=0):
+        return self._all(select_all(Course, load, limit, offset))
+
+    def list_locations(self, load=()):
+        return self._all(select_all(Location, load))
+
+    def enrollments_for_student(self, student_id):
+        """ Return (Course, Teacher) for each course the student is enrolled on. """
+        return [tuple(row) for row in self._all(select_enrollments_for_student(student_id))]
+
+    def students_for_course(self, course_id):
+        return self._all(select_students_for_course(course_id))
+
+    def courses_with_people(self):
+        """ Return every course with its location, students and teachers loaded, see queries.py. """
+        return self._all(select_courses_with_people())
+
+    def student_timetable(self, student_id):
+        return self._one(select_student_timetable(student_id))
+
+    def teacher_classes(self, teacher_id):
+        return self._one(select_teacher_classes(teacher_id))
+
+    def locations_with_courses(self):
+        return self._all(select_locations_with_courses())
+
+    def add_all(self, objects):
+        """ Add new objects, e.g. Student or Enrollment, in one transaction. """
+        with self.session_factory() as session:
+            session.add_all(objects)
+            session.commit()
+        return objects
+
+    def enroll(self, student_id, course_id, teacher_id):
+        """ Enroll a student on a course with a teacher. """
+        return self.add_all([Enrollment(student_id=student_id, course_id=course_id, teacher_id=teacher_id)])[0]
+
+
+class AsyncRepository:
+    """ Runs the students database queries with an AsyncSession, the methods are the same as Repository.
+
+    Args:
+        session_factory: async_sessionmaker, see async_database.get_async_session_factory
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    async def _one(self, statement):
+        async with self.session_factory() as session:
+            return (await session.exec(statement)).first()
+
+    async def _all(self, statement):
+        async with self.session_factory() as session:
+            return list((await session.exec(statement)).all())
+
+    async def get_student(self, student_id, load=()):
+        return await self._one(select_by_id(Student, student_id, load))
+
+    async def get_teacher(self, teacher_id, load=()):
+        return await self._one(select_by_id(Teacher, teacher_id, load))
+
+    async def get_course(self, course_id, load=()):
+        return await self._one(select_by_id(Course, course_id, load))
+
+    async def list_students(self, load=(), limit=None, offset=0):
+        return await self._all(select_all(Student, load, limit, offset))
+
+    async def list_courses(self, load=(), limit=None, offset=0):
+        return await self._all(select_all(Course, load, limit, offset))
+
+    async def list_locations(self, load=()):
+        return await self._all(select_all(Location, load))
+
+    async def enrollments_for_student(self, student_id):
+        return [tuple(row) for row in await self._all(select_enrollments_for_student(student_id))]
+
+    async def students_for_course(self, course_id):
+        return await self._all(select_students_for_course(course_id))
+
+    async def courses_with_people(self):
+        return await self._all(select_courses_with_people())
+
+    async def student_timetable(self, student_id):
+        return await self._one(select_student_timetable(student_id))
+
+    async def teacher_classes(self, teacher_id):
+        return await self._one(select_teacher_classes(teacher_id))
+
+    async def locations_with_courses(self):
+        return await self._all(select_locations_with_courses())
+
+    async def add_all(self, objects):
+        async with self.session_factory() as session:
+            session.add_all(objects)
+            await session.commit()
+        return objects
+
+    async def enroll(self, student_id, course_id, teacher_id):
+        enrollment = Enrollment(student_id=student_id, course_id=course_id, teacher_id=teacher_id)
+        return (await self.add_all([enrollment]))[0]
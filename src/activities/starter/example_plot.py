@@ -1,6 +1,8 @@
 # Activity 2.5
-import matplotlib.pyplot as plt
-import pandas as pd
+from activities.starter.lazy_import import lazy_import
+
+plt = lazy_import("matplotlib.pyplot")
+pd = lazy_import("pandas")
 
 if __name__ == '__main__':
     # Sample DataFrame
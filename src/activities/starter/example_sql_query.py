@@ -1,11 +1,12 @@
-import sqlite3
 from importlib import resources
 
 from activities import data
+from activities.starter.query_cache import QUERY_CACHE, cached_query
+from activities.starter.query_log import QUERY_LOG, connect
 
 
 def sample_select_queries(db_path):
-    con = sqlite3.connect(db_path)
+    con = connect(db_path, query_log=QUERY_LOG)
     cur = con.cursor()
 
     # Select all rows and columns from the student table
@@ -29,9 +30,28 @@ def sample_select_queries(db_path):
     con.close()
 
 
+def sample_cached_queries(db_path):
+    # Total sales for each genre, the second time the result comes from the cache as the database is unchanged
+    query = """SELECT g.Name, ROUND(SUM(ii.UnitPrice * ii.Quantity), 2) AS sales
+               FROM invoice_items ii
+                        JOIN tracks t ON ii.TrackId = t.TrackId
+                        JOIN genres g ON t.GenreId = g.GenreId
+               GROUP BY g.GenreId
+               ORDER BY sales DESC
+               LIMIT ?"""
+    for _ in range(2):
+        rows = cached_query(db_path, query, (5,))
+    print("\nTop 5 genres by sales\n")
+    for row in rows:
+        print(row)
+
+
 def main():
     db_path = resources.files(data).joinpath("sample.db")
     sample_select_queries(db_path)
+    sample_cached_queries(resources.files(data).joinpath("chinook.db"))
+    QUERY_LOG.print_report()
+    QUERY_CACHE.print_report()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,226 @@
+""" Maintain a flat games_flat table in the normalised paralympics database for fast reads.
+
+The normalised database needs five joins and GROUP_CONCAT to return the same row as a single table in the
+un-normalised database. games_flat stores one row per games with the same columns as the un-normalised Games table,
+so reads are a single table lookup while writes still go to the normalised tables.
+
+games_flat is kept up to date by triggers on Games, GamesHost, GamesDisability, Host, Country and Disability. Each
+trigger deletes the games_flat rows for the games that are affected by the change and inserts them again from the
+normalised tables. refresh() rebuilds the whole table, e.g. after a bulk load with the triggers dropped.
+
+Examples:
+
+    import sqlite3
+
+    conn = sqlite3.connect("para-normalised.db")
+    create_flat_table(conn)
+    rows = query_games(conn, {"type": "summer", "year": 2012}, columns=["year", "host"])
+"""
+import shutil
+import sqlite3
+import tempfile
+from importlib import resources
+from pathlib import Path
+
+from activities import data
+from activities.starter.compare_queries import QUERY_N
+from activities.starter.query_benchmark import print_report, run_workload
+from activities.starter.streaming_query import quote
+
+FLAT_TABLE = "games_flat"
+
+# Same columns as the Games table in para-not-normalised.sqlite, with the Games id in place of the pandas index
+CREATE_FLAT_TABLE = f'''CREATE TABLE IF NOT EXISTS {FLAT_TABLE}
+(
+    games_id              INTEGER PRIMARY KEY,
+    type                  TEXT,
+    year                  INTEGER,
+    country               TEXT,
+    host                  TEXT,
+    start                 TEXT,
+    end                   TEXT,
+    disabilities_included TEXT,
+    countries             INTEGER,
+    events                INTEGER,
+    sports                INTEGER,
+    participants_m        INTEGER,
+    participants_f        INTEGER,
+    participants          INTEGER,
+    highlights            TEXT,
+    URL                   TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_{FLAT_TABLE}_type_year ON {FLAT_TABLE} (type, year);'''
+
+# Columns of games_flat, the only names query_games accepts
+FLAT_COLUMNS = ['games_id', 'type', 'year', 'country', 'host', 'start', 'end', 'disabilities_included', 'countries',
+                'events', 'sports', 'participants_m', 'participants_f', 'participants', 'highlights', 'URL']
+
+# One row per games. The hosts and disabilities are subqueries rather than joins so that a games with two hosts does
+# not repeat its disabilities
+FLAT_SELECT = '''SELECT g.id,
+                        g.type,
+                        g.year,
+                        (SELECT GROUP_CONCAT(c.country, ', ')
+                         FROM GamesHost gh
+                                  JOIN Host h ON gh.host_id = h.id
+                                  JOIN Country c ON h.country_id = c.id
+                         WHERE gh.games_id = g.id) AS country,
+                        (SELECT GROUP_CONCAT(h.place_name, ', ')
+                         FROM GamesHost gh
+                                  JOIN Host h ON gh.host_id = h.id
+                         WHERE gh.games_id = g.id) AS host,
+                        g.start,
+                        g.end,
+                        (SELECT GROUP_CONCAT(d.description, ', ')
+                         FROM GamesDisability gd
+                                  JOIN Disability d ON gd.disability_id = d.id
+                         WHERE gd.games_id = g.id) AS disabilities_included,
+                        g.countries,
+                        g.events,
+                        g.sports,
+                        g.participants_m,
+                        g.participants_f,
+                        g.participants,
+                        g.highlights,
+                        g.URL
+                 FROM Games g'''
+
+# For each trigger: table, event, and SQL selecting the ids of the games affected by the change
+TRIGGERS = [
+    ("Games", "INSERT", "NEW.id"),
+    ("Games", "UPDATE", "OLD.id, NEW.id"),
+    ("Games", "DELETE", "OLD.id"),
+    ("GamesHost", "INSERT", "NEW.games_id"),
+    ("GamesHost", "UPDATE", "OLD.games_id, NEW.games_id"),
+    ("GamesHost", "DELETE", "OLD.games_id"),
+    ("GamesDisability", "INSERT", "NEW.games_id"),
+    ("GamesDisability", "UPDATE", "OLD.games_id, NEW.games_id"),
+    ("GamesDisability", "DELETE", "OLD.games_id"),
+    ("Host", "UPDATE", "SELECT games_id FROM GamesHost WHERE host_id IN (OLD.id, NEW.id)"),
+    ("Host", "DELETE", "SELECT games_id FROM GamesHost WHERE host_id = OLD.id"),
+    ("Country", "UPDATE", ("SELECT gh.games_id FROM GamesHost gh JOIN Host h ON gh.host_id = h.id "
+                           "WHERE h.country_id IN (OLD.id, NEW.id)")),
+    ("Country", "DELETE", ("SELECT gh.games_id FROM GamesHost gh JOIN Host h ON gh.host_id = h.id "
+                           "WHERE h.country_id = OLD.id")),
+    ("Disability", "UPDATE", "SELECT games_id FROM GamesDisability WHERE disability_id IN (OLD.id, NEW.id)"),
+    ("Disability", "DELETE", "SELECT games_id FROM GamesDisability WHERE disability_id = OLD.id"),
+]
+
+
+def refresh_sql(games_ids_sql):
+    """ Return the SQL that replaces the games_flat rows for the games ids selected by games_ids_sql.
+
+    Args:
+        games_ids_sql: A list of ids or a SELECT returning ids, used in an IN (...) clause
+
+    Returns:
+        str: DELETE and INSERT statements separated by semicolons
+    """
+    return (f"DELETE FROM {FLAT_TABLE} WHERE games_id IN ({games_ids_sql});\n"
+            f"INSERT INTO {FLAT_TABLE} {FLAT_SELECT} WHERE g.id IN ({games_ids_sql});")
+
+
+def trigger_name(table_name, event):
+    return f"trg_{FLAT_TABLE}_{table_name}_{event}".lower()
+
+
+def create_triggers(conn):
+    """ Create the triggers that keep games_flat up to date. """
+    for table_name, event, games_ids_sql in TRIGGERS:
+        conn.executescript(f'''CREATE TRIGGER IF NOT EXISTS {trigger_name(table_name, event)}
+                               AFTER {event} ON {table_name}
+                               BEGIN
+                                   {refresh_sql(games_ids_sql)}
+                               END;''')
+
+
+def drop_triggers(conn):
+    """ Drop the triggers, e.g. before a bulk load that is followed by refresh(). """
+    for table_name, event, _ in TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger_name(table_name, event)};")
+
+
+def refresh(conn):
+    """ Rebuild games_flat from the normalised tables in a single transaction. """
+    with conn:
+        conn.execute(f"DELETE FROM {FLAT_TABLE};")
+        conn.execute(f"INSERT INTO {FLAT_TABLE} {FLAT_SELECT};")
+
+
+def create_flat_table(conn, triggers=True):
+    """ Create and populate games_flat and, optionally, the triggers that keep it up to date.
+
+    Args:
+        conn: sqlite3 connection to the normalised database
+        triggers: If False the table is only updated by calling refresh()
+    """
+    conn.executescript(CREATE_FLAT_TABLE)
+    if triggers:
+        create_triggers(conn)
+    refresh(conn)
+
+
+def drop_flat_table(conn):
+    """ Drop games_flat and its triggers. """
+    drop_triggers(conn)
+    conn.execute(f"DROP TABLE IF EXISTS {FLAT_TABLE};")
+
+
+def has_flat_table(conn):
+    """ Return True if the database has a games_flat table. """
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?;", (FLAT_TABLE,)).fetchone()
+    return row is not None
+
+
+def query_games(conn, filters=None, columns=None):
+    """ Read games from games_flat, or from the normalised tables if the database does not have games_flat.
+
+    Both sources have the same columns, so callers get the same rows whichever is used. The column names are checked
+    against FLAT_COLUMNS and the values are bound as parameters, so no SQL is taken from the caller.
+
+    Args:
+        conn: sqlite3 connection to the normalised database
+        filters: Optional dict of column name to value, the rows must match every one, e.g. {"type": "summer"}
+        columns: Names of the columns to return, defaults to all of FLAT_COLUMNS
+
+    Returns:
+        list[tuple]: the rows, ordered by games id
+
+    Raises:
+        ValueError: If a column name is not one of FLAT_COLUMNS
+    """
+    filters = filters or {}
+    columns = columns or FLAT_COLUMNS
+    unknown = [name for name in [*columns, *filters] if name not in FLAT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown games_flat column(s): {', '.join(unknown)}")
+    if has_flat_table(conn):
+        source = FLAT_TABLE
+    else:
+        source = f"({FLAT_SELECT.replace('SELECT g.id,', 'SELECT g.id AS games_id,', 1)})"
+    query = f"SELECT {', '.join(quote(name) for name in columns)} FROM {source}"
+    if filters:
+        query += " WHERE " + " AND ".join(f"{quote(name)} = ?" for name in filters)
+    return conn.execute(f"{query} ORDER BY games_id;", tuple(filters.values())).fetchall()
+
+
+def main():
+    """ Compare the normalised query with the same read from games_flat, using a copy of para-normalised.db. """
+    db_name = "para-normalised.db"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir).joinpath(db_name)
+        shutil.copyfile(resources.files(data).joinpath(db_name), db_path)
+        conn = sqlite3.connect(db_path)
+        create_flat_table(conn)
+        print(query_games(conn, {"type": "summer", "year": 2012}))
+        conn.close()
+
+        workload = {
+            "london_2012": QUERY_N,
+            "london_2012_flat": f"SELECT * FROM {FLAT_TABLE} WHERE type = 'summer' AND year = 2012;",
+        }
+        print_report(run_workload(db_path, workload))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+""" Measure the start up time of the modules in the package with python -X importtime.
+
+Each module is imported in a new Python process, so nothing is already imported, and the process is run a number of
+times. -X importtime prints the time taken to import each module to stderr as:
+
+    import time: self [us] | cumulative | imported package
+    import time:       504 |     388792 | pandas
+
+The cumulative time of the module itself is recorded, along with the wall clock time of the whole process (which
+includes starting Python). The slowest modules imported directly by the module are listed so it is clear what to
+make lazy, see lazy_import.
+
+Examples:
+
+    results = benchmark_imports(["activities.starter.cq_docstring"])
+    print_report(results)
+    benchmark_report.write_json(results, "import_times.json")
+"""
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from activities.starter.benchmark_report import print_table
+
+# Modules that are run as scripts or imported by the activities
+ENTRY_POINTS = [
+    "activities.starter.compare_queries",
+    "activities.starter.cq_docstring",
+    "activities.starter.example_sql_query",
+    "activities.starter.playing_cards",
+    "activities.starter.starter_db",
+    "activities.starter.starter_exceptions",
+    "activities.starter.workbook_cache",
+    "activities.solutions.practise",
+    "activities.solutions.practise_2",
+]
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+
+def parse_import_times(stderr):
+    """ Parse the -X importtime output.
+
+    Returns:
+        list[tuple]: (module name, nesting level, self us, cumulative us) for each imported module, in output order
+    """
+    times = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            # The names are indented by two spaces for each level of nesting after the first space
+            times.append((name, (len(indent) - 1) // 2, int(self_us), int(cumulative_us)))
+    return times
+
+
+def direct_imports(times, module_name):
+    """ Return (name, cumulative ms) for each module imported directly by module_name, slowest first. """
+    # A module's imports are listed before it, one level deeper
+    end = max(i for i, (name, level, _, _) in enumerate(times) if name == module_name and level == 0)
+    imports = []
+    for name, level, _, cumulative in reversed(times[:end]):
+        if level == 0:
+            break
+        if level == 1:
+            imports.append((name, cumulative / 1000))
+    return sorted(imports, key=lambda item: item[1], reverse=True)
+
+
+def measure_import(module_name):
+    """ Import a module in a new Python process.
+
+    Returns:
+        wall_ms, import_ms, times (tuple [float, float, list]): process time, cumulative import time of the module
+            and the parsed -X importtime output
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+                            capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    times = parse_import_times(result.stderr)
+    import_ms = next(cumulative for name, _, _, cumulative in reversed(times) if name == module_name) / 1000
+    return wall_ms, import_ms, times
+
+
+def benchmark_imports(modules=None, repeat=5, top=5):
+    """ Measure the import time of each module.
+
+    Args:
+        modules: Names of the modules, defaults to ENTRY_POINTS
+        repeat: Number of processes run for each module
+        top: Number of the slowest direct imports to list for each module
+
+    Returns:
+        list[dict]: median wall and import times in ms, and the slowest direct imports, for each module
+    """
+    results = []
+    for module_name in modules or ENTRY_POINTS:
+        runs = [measure_import(module_name) for _ in range(repeat)]
+        results.append({
+            'module': module_name,
+            'repeat': repeat,
+            'wall_ms': statistics.median(run[0] for run in runs),
+            'import_ms': statistics.median(run[1] for run in runs),
+            'slowest': direct_imports(runs[-1][2], module_name)[:top],
+        })
+    return results
+
+
+def print_report(results):
+    """ Print the wall and import time of each module and its three slowest direct imports. """
+    columns = [("module", "<42"), ("wall ms", ">10.1f"), ("import ms", ">10.1f"), ("slowest imports", "")]
+    print_table(columns, [(result['module'], result['wall_ms'], result['import_ms'],
+                           ", ".join(f"{name} {ms:.0f}" for name, ms in result['slowest'][:3]))
+                          for result in results])
+
+
+def main():
+    print_report(benchmark_imports())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+""" Recommend indexes for the foreign keys of a SQLite database.
+
+SQLite does not create indexes for foreign key columns. Without them a join on a foreign key has to scan the whole
+child table, or build a temporary 'automatic' index every time the query runs.
+
+The advisor:
+    1. Finds the foreign keys and the existing indexes of each table, read from the schema cache (see schema_cache).
+    2. Runs EXPLAIN QUERY PLAN on each query in a workload to find the tables that are scanned or need an
+       automatic index.
+    3. Recommends an index for each foreign key that is not the first column of an existing index. For association
+       tables, where every column apart from the id is a foreign key, two covering indexes are recommended, one
+       starting with each foreign key, so a join in either direction can be answered from the index alone.
+    4. Optionally creates the indexes, runs ANALYZE, and reports the query timings before and after.
+
+Examples:
+
+    import sqlite3
+
+    conn = sqlite3.connect("para-normalised.db")
+    for recommendation in recommend_indexes(conn, {"london_2012": QUERY_N}):
+        print(recommendation.sql, recommendation.reason)
+"""
+import re
+import shutil
+import sqlite3
+import tempfile
+from dataclasses import dataclass
+from importlib import resources
+from pathlib import Path
+
+from activities import data
+from activities.starter.compare_queries import WORKLOADS
+from activities.starter.query_benchmark import print_report, run_workload
+from activities.starter.schema_cache import SCHEMA_CACHE, get_table_info
+
+# Matches 'FROM Games g', 'JOIN Host AS h' etc. to find the table name for an alias used in a query plan
+TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+
+# Query plan details that show a table is read without a suitable index, e.g. 'SCAN gh' or
+# 'SEARCH gd USING AUTOMATIC COVERING INDEX (games_id=?)'
+UNINDEXED_ACCESS = re.compile(r"^(?:SCAN (\w+)|SEARCH (\w+) USING AUTOMATIC)")
+
+SQL_KEYWORDS = {'ON', 'WHERE', 'GROUP', 'ORDER', 'LEFT', 'INNER', 'JOIN', 'LIMIT', 'USING', 'CROSS', 'NATURAL'}
+
+
+@dataclass
+class IndexRecommendation:
+    """ An index recommended by the advisor.
+
+    Attributes:
+        table: Name of the table
+        columns: Columns of the index, in order
+        reason: Why the index is recommended
+    """
+    table: str
+    columns: tuple
+    reason: str
+
+    @property
+    def name(self):
+        return f"ix_{self.table}_{'_'.join(self.columns)}".lower()
+
+    @property
+    def sql(self):
+        return f"CREATE INDEX IF NOT EXISTS {self.name} ON {self.table} ({', '.join(self.columns)});"
+
+
+def get_table_names(conn):
+    """ Return the names of the tables in the database, excluding views and SQLite's internal tables. """
+    return [table.name for table in SCHEMA_CACHE.tables(conn).values() if not table.is_view]
+
+
+def get_foreign_keys(conn, table_name):
+    """ Return the foreign keys of a table.
+
+    Returns:
+        list[tuple]: (columns, referenced table) for each foreign key, columns is a tuple to allow composite keys
+    """
+    return [(columns, ref_table) for columns, ref_table, _ in get_table_info(conn, table_name).foreign_keys]
+
+
+def get_indexed_columns(conn, table_name):
+    """ Return the columns of each index on a table, including an INTEGER PRIMARY KEY which is the rowid.
+
+    Returns:
+        list[tuple]: the columns of each index, in index order
+    """
+    table = get_table_info(conn, table_name)
+    indexes = list(table.indexes)
+    if len(table.primary_key) == 1 and table.types[table.primary_key[0]].upper() == 'INTEGER':
+        indexes.append(table.primary_key)
+    return indexes
+
+
+def explain_query_plan(conn, query, params=()):
+    """ Return the detail text of each step of the query plan, e.g. ['SCAN gh', 'SEARCH g USING ...']. """
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+def find_unindexed_tables(conn, query):
+    """ Return the names of the tables the query reads without an index, using EXPLAIN QUERY PLAN. """
+    aliases = {}
+    for table, alias in TABLE_ALIAS.findall(query):
+        aliases[table.lower()] = table
+        if alias and alias.upper() not in SQL_KEYWORDS:
+            aliases[alias.lower()] = table
+    tables = set()
+    for detail in explain_query_plan(conn, query):
+        match = UNINDEXED_ACCESS.match(detail)
+        if match:
+            name = match.group(1) or match.group(2)
+            tables.add(aliases.get(name.lower(), name).lower())
+    return tables
+
+
+def recommend_indexes(conn, workload=None):
+    """ Recommend an index for each foreign key that does not have one.
+
+    Args:
+        conn: sqlite3 connection to the database
+        workload: Optional dict of query name to SQL, used to note which recommended indexes the queries need
+
+    Returns:
+        list[IndexRecommendation]
+    """
+    unindexed = {}
+    for label, query in (workload or {}).items():
+        for table in find_unindexed_tables(conn, query):
+            unindexed.setdefault(table, []).append(label)
+
+    recommendations = []
+    for table_name in get_table_names(conn):
+        foreign_keys = get_foreign_keys(conn, table_name)
+        if not foreign_keys:
+            continue
+        indexes = get_indexed_columns(conn, table_name)
+        fk_columns = [columns for columns, _ in foreign_keys]
+        # Association table: every column apart from the primary key is part of a foreign key
+        table = get_table_info(conn, table_name)
+        non_pk_cols = [column for column in table.columns if column not in table.primary_key]
+        is_association = len(fk_columns) > 1 and set(non_pk_cols) == {col for cols in fk_columns for col in cols}
+
+        for columns, ref_table in foreign_keys:
+            if any(index[:len(columns)] == columns for index in indexes):
+                continue
+            if is_association:
+                # Put this foreign key first, then the other foreign key columns so the index is covering
+                others = tuple(col for cols in fk_columns if cols != columns for col in cols)
+                columns = columns + others
+                reason = f"covering index for joins from {table_name} to {ref_table}"
+            else:
+                reason = f"foreign key to {ref_table}"
+            queries = unindexed.get(table_name.lower())
+            if queries:
+                reason += f"; scanned or auto-indexed by {', '.join(queries)}"
+            recommendations.append(IndexRecommendation(table_name, columns, reason))
+    return recommendations
+
+
+def create_indexes(conn, recommendations):
+    """ Create the recommended indexes and run ANALYZE so the query planner has statistics for them. """
+    with conn:
+        for recommendation in recommendations:
+            conn.execute(recommendation.sql)
+    conn.execute("ANALYZE;")
+
+
+def advise(db_path, workload, apply=False, repeat=30, warmup=3):
+    """ Print the recommended indexes for a database and, if apply is True, create them and compare timings.
+
+    Args:
+        db_path: Path to the database, which is changed if apply is True
+        workload: dict of query name to SQL
+        apply: If True, create the recommended indexes and run ANALYZE
+        repeat: Number of timed runs of each query
+        warmup: Number of untimed runs of each query
+
+    Returns:
+        list[IndexRecommendation]: the recommended indexes
+    """
+    conn = sqlite3.connect(db_path)
+    recommendations = recommend_indexes(conn, workload)
+    print("Recommended indexes:")
+    for recommendation in recommendations:
+        print(f"  {recommendation.sql}  -- {recommendation.reason}")
+    if not apply or not recommendations:
+        conn.close()
+        return recommendations
+
+    before = run_workload(db_path, workload, repeat=repeat, warmup=warmup)
+    plans_before = {label: explain_query_plan(conn, query) for label, query in workload.items()}
+    create_indexes(conn, recommendations)
+    plans_after = {label: explain_query_plan(conn, query) for label, query in workload.items()}
+    conn.close()
+    after = run_workload(db_path, workload, repeat=repeat, warmup=warmup)
+
+    for label in workload:
+        print(f"\n{label} query plan before:\n  " + "\n  ".join(plans_before[label]))
+        print(f"{label} query plan after:\n  " + "\n  ".join(plans_after[label]))
+    print("\nBefore:")
+    print_report(before)
+    print("After:")
+    print_report(after)
+    return recommendations
+
+
+def main():
+    """ Run the advisor on a copy of para-normalised.db using the compare_queries workload. """
+    db_name = "para-normalised.db"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir).joinpath(db_name)
+        shutil.copyfile(resources.files(data).joinpath(db_name), db_path)
+        advise(db_path, WORKLOADS["normalised"], apply=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+""" Import heavy dependencies, e.g. pandas and matplotlib, only when they are first used.
+
+Importing pandas takes around 0.4 seconds and matplotlib.pyplot around 0.6 seconds, which is most of the start up time
+of the scripts in this package. Many functions in a module do not need them, e.g. cq_docstring.get_column_names_g
+does not use pyplot, but a top level 'import matplotlib.pyplot as plt' imports it when the module is imported.
+
+lazy_import returns the module with the standard library's importlib.util.LazyLoader, which runs the module's code
+the first time an attribute is used, e.g. plt.subplots(), so the cost is only paid by code that uses it:
+
+    from activities.starter.lazy_import import lazy_import
+
+    pd = lazy_import("pandas")
+    plt = lazy_import("matplotlib.pyplot")
+
+The parent packages of a dotted name are imported straight away, as finding a submodule needs the package's
+__path__, so lazy_import("matplotlib.pyplot") imports matplotlib but not pyplot, which is the slow part.
+
+Names used only in type hints should be imported in an 'if TYPE_CHECKING:' block, with
+'from __future__ import annotations' so the hints are not evaluated when the module is imported.
+
+Use import_benchmark to measure the import time of the modules.
+"""
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """ Return the module if it is already imported, otherwise a module that is loaded when first used.
+
+    The module is added to sys.modules, so a later 'import name' returns the same module rather than loading it.
+
+    Args:
+        name: Full name of the module, e.g. "matplotlib.pyplot"
+
+    Returns:
+        types.ModuleType
+
+    Raises:
+        ModuleNotFoundError: If the module is not installed
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    parent_name, _, child_name = name.rpartition(".")
+    if parent_name:
+        # As the import statement does, so 'import matplotlib.pyplot' then matplotlib.pyplot finds it
+        setattr(sys.modules[parent_name], child_name, module)
+    return module
@@ -2,32 +2,66 @@
 This can only be used once you have completed activities 3.1 to 3.11
 This is far more complex than you would be expected to create, or even need to use, for the coursework.
 """
+import argparse
+import logging
 import sqlite3
+import time
+from contextlib import contextmanager
 from importlib import resources
+from itertools import islice
 
-import pandas as pd
+from activities.starter import schema_cache
+from activities.starter.lazy_import import lazy_import
+from activities.starter.query_log import QUERY_LOG, connect
+from activities.starter.workbook_cache import read_workbook
 
-from activities.database_wk3 import data_solutions
-from activities.database_wk3.solutions_db import create_db
+pd = lazy_import("pandas")
 
+logger = logging.getLogger(__name__)
 
-def insert_data(db_path, df, table_name):
-    """ Insert data into the tables that don't have primary keys """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+# Number of rows sent to the database in each executemany call when using the bulk loader
+DEFAULT_BATCH_SIZE = 1000
 
-    # Check if table is empty
-    cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-    row_count = cursor.fetchone()[0]
-    if row_count > 0:
-        cursor.close()
-        conn.close()
-        print(f"Table {table_name} already has data. Skipping insert.")
-        return
+# SQLite settings that trade durability during the load for speed. cache_size is negative so it is in KiB (64MB).
+# journal_mode is saved in the database file, so LoaderSession puts the original mode back when it is closed.
+BULK_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+}
+
+# Columns that identify a row in the source data, used to match source rows to database rows for incremental loads
+NATURAL_KEYS = {
+    'games': ['year', 'type'],
+    'disability': ['description'],
+    'country': ['country'],
+    'team': ['code'],
+}
+
+# Team names in the team codes sheet that differ from the country names used in the games sheet
+REPLACEMENT_NAMES = {
+    'Great Britain': 'UK',
+    'United States of America': 'USA',
+    'Republic of Korea': 'Korea',
+    'Russian Federation': 'Russia',
+    "People's Republic of China": 'China'
+}
+
+
+def get_insert_sql(cursor, table_name):
+    """ Generate the parameterised INSERT statement for a table.
+
+    The 'id' column is dropped for every table except team, where the last column (country_id) is dropped instead.
+
+    Args:
+        cursor: sqlite3 cursor for the database, used to look up the columns in the schema cache
+        table_name: Name of the table to insert into
 
+    Returns:
+        cols, sql (tuple [list, str]): Column names used in the statement and the INSERT statement
+    """
     # Get the column names from the tables, drop the 'id' column except for the team table
-    cursor.execute(f"PRAGMA table_info({table_name});")
-    cols_with_id = [row[1] for row in cursor.fetchall()]
+    cols_with_id = schema_cache.get_column_names(cursor, table_name)
     if table_name != "team":
         cols = cols_with_id[1:]
     else:
@@ -39,6 +73,167 @@ def insert_data(db_path, df, table_name):
     # Generate the list of column names
     columns = ', '.join(cols)
     sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+    return cols, sql
+
+
+def apply_pragmas(conn, pragmas=None):
+    """ Apply SQLite PRAGMA settings to a connection.
+
+    Must be called outside a transaction as journal_mode cannot be changed inside one.
+
+    Args:
+        conn: sqlite3 connection
+        pragmas: dict of PRAGMA name to value, defaults to BULK_PRAGMAS
+    """
+    if pragmas is None:
+        pragmas = BULK_PRAGMAS
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value};")
+
+
+def dataframe_to_rows(df, cols):
+    """ Convert the DataFrame columns to a list of tuples ready for executemany.
+
+    The conversion is done column-wise in one step: values become Python objects and NaN/NA become None,
+    rather than checking each cell with pd.isna.
+
+    Args:
+        df: DataFrame with the data
+        cols: Column names, in the order used in the INSERT statement
+
+    Returns:
+        list of tuples, one per row
+    """
+    values = df[cols].astype(object)
+    values = values.where(values.notna(), None)
+    return list(values.itertuples(index=False, name=None))
+
+
+def split_values(series):
+    """ Split comma separated values so there is one row per value.
+
+    Args:
+        series: pd.Series of strings such as 'Stoke Mandeville, New York'
+
+    Returns:
+        pd.Series of the stripped values indexed by 'row', the index label of the value's original row
+    """
+    values = series.dropna().str.split(',').explode().str.strip()
+    return values[values != ''].rename_axis('row')
+
+
+def normalise_values(df):
+    """ Convert values to strings so rows read from the source and from the database compare equal.
+
+    For example Int64 1960 and the int 1960 read back from SQLite are both converted to '1960', NaN/NA and None
+    are both converted to 'None'.
+    """
+    values = df.astype(object)
+    return values.where(values.notna(), None).astype(str)
+
+
+def fingerprint_rows(df):
+    """ Calculate a hash of each row's values, used to detect rows that have changed.
+
+    Args:
+        df: DataFrame of the rows
+
+    Returns:
+        pd.Series of the hash of each row as a string, in the same order as df
+    """
+    hashes = pd.util.hash_pandas_object(normalise_values(df), index=False)
+    return hashes.astype(str).to_numpy()
+
+
+def diff_rows(source, existing, key_cols):
+    """ Compare the source rows with the rows already in the database.
+
+    Rows are matched using the key columns and compared using a fingerprint of all the columns.
+
+    Args:
+        source: DataFrame of the rows from the source data
+        existing: DataFrame of the rows in the database table, with the same columns as source
+        key_cols: List of the column names that identify a row, e.g. ['year', 'type']
+
+    Returns:
+        new, changed, deleted (tuple [pd.DataFrame, pd.DataFrame, pd.DataFrame]): rows of source that are not in
+        the database, rows of source whose values differ from the database, and rows of existing that are no
+        longer in the source
+    """
+    source_keys = normalise_values(source[key_cols])
+    source_keys['fingerprint'] = fingerprint_rows(source)
+    source_keys['position'] = range(len(source))
+
+    existing_keys = normalise_values(existing[key_cols])
+    existing_keys['fingerprint'] = fingerprint_rows(existing)
+    existing_keys['position'] = range(len(existing))
+
+    merged = source_keys.merge(existing_keys, on=key_cols, how='outer', suffixes=('', '_db'), indicator=True)
+    is_new = merged['_merge'] == 'left_only'
+    is_changed = (merged['_merge'] == 'both') & (merged['fingerprint'] != merged['fingerprint_db'])
+    is_deleted = merged['_merge'] == 'right_only'
+
+    new = source.iloc[merged.loc[is_new, 'position'].astype(int)]
+    changed = source.iloc[merged.loc[is_changed, 'position'].astype(int)]
+    deleted = existing.iloc[merged.loc[is_deleted, 'position_db'].astype(int)]
+    return new, changed, deleted
+
+
+def get_disability_df(df_games):
+    """ Return a DataFrame of the unique values from the disabilities_included column. """
+    disability_values = pd.unique(split_values(df_games['disabilities_included']))
+    return pd.DataFrame({'description': disability_values})
+
+
+def get_country_df(df_games):
+    """ Return a DataFrame of the unique countries, splitting the values in the row that has both UK and USA in. """
+    country_values = pd.unique(split_values(df_games['country']))
+    return pd.DataFrame({'country': country_values})
+
+
+def batched(rows, batch_size):
+    """ Yield successive lists of at most batch_size rows. """
+    iterator = iter(rows)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def insert_data_bulk(db, df, table_name, batch_size=DEFAULT_BATCH_SIZE, pragmas=None):
+    """ Insert data using executemany in batches inside a single transaction.
+
+    Faster alternative to insert_data for large DataFrames. As with insert_data, a table that already has data
+    is skipped.
+
+    Args:
+        db: Path to the database, or a LoaderSession to use its connection and transaction, see loader_session
+        df: DataFrame with the data, columns must match the table column names
+        table_name: Name of the table to insert into
+        batch_size: Number of rows passed to each executemany call, not used if db is a LoaderSession
+        pragmas: dict of PRAGMA settings applied before the load, defaults to BULK_PRAGMAS. Not used if db is a
+            LoaderSession.
+
+    Returns:
+        int: Number of rows inserted
+    """
+    with loader_session(db, pragmas=pragmas, batch_size=batch_size) as session:
+        return session.insert_data(df, table_name)
+
+
+def insert_data(db_path, df, table_name):
+    """ Insert data into the tables that don't have primary keys """
+    conn = connect(db_path)
+    cursor = conn.cursor()
+
+    # Check if table is empty
+    cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+    row_count = cursor.fetchone()[0]
+    if row_count > 0:
+        cursor.close()
+        conn.close()
+        print(f"Table {table_name} already has data. Skipping insert.")
+        return
+
+    cols, sql = get_insert_sql(cursor, table_name)
 
     for _, row in df.iterrows():
         # Replace NaNs with None
@@ -53,120 +248,488 @@ def insert_data(db_path, df, table_name):
     conn.close()
 
 
-def insert_team_data(db_path, df):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    team_cols = get_column_names(db_path, "team")
-    cols_to_use = team_cols[0:-1]  # drop the last column, country_id
-    df.columns = cols_to_use  # reset the df columns to the revised names for the table
-    insert_data(db_path, df, "team")
-    replacement_names = {
-        'Great Britain': 'UK',
-        'United States of America': 'USA',
-        'Republic of Korea': 'Korea',
-        'Russian Federation': 'Russia',
-        "People's Republic of China": 'China'
-    }
-    # For each row in the team table, if the value in team.name matches a value in country.country
-    # then insert the country.id as team.country_id
-    cursor.execute(f"SELECT * FROM team")
-    rows = cursor.fetchall()
-    for row in rows:
-        # Find the country id where country.country matches team.name
-        country_name = replacement_names.get(row[1], row[1])
-        cursor.execute("SELECT id FROM country WHERE country = ?", (country_name,))
-        result = cursor.fetchone()
-        if result is not None:
-            cursor.execute(f"UPDATE team SET country_id = ? WHERE code = ?", (result[0], row[0]))
-    conn.commit()
-    conn.close()
+class LoaderSession:
+    """ Loads the paralympics data using a single database connection.
 
+    The session owns one sqlite3 connection for its lifetime. Transactions are managed explicitly so the whole
+    games -> disability -> country -> team -> host -> association pipeline can run as one atomic transaction,
+    with a savepoint around each stage and the time taken by each stage recorded.
 
-def insert_host_data(db_path, df):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    Attributes:
+        db_path: Path to the database
+        conn: sqlite3 connection owned by the session
+        batch_size: Number of rows passed to each executemany call
+        timings (dict[str, float]): Seconds taken by each completed stage
 
-    # Get the unique values for host
-    host_values = pd.unique(df.host.dropna().str.split(',').explode().str.strip())
-
-    # Iterate the rows in the games dataframe
-    for host in host_values:
-        # find the first row in the dataframe df where the host is contained in the string df['host']
-        # df['host'] can have two values separated by a string
-        row = df[df['host'].str.contains(rf'\b{host}\b', na=False)].iloc[0]
-        country_names = [c.strip() for c in row.country.split(',')]
-        for country_name in country_names:
-            cursor.execute("SELECT id FROM country WHERE country = ?", (country_name,))
-            result = cursor.fetchone()
-            if result is not None:
-                cursor.execute(f"INSERT INTO host (place_name, country_id) VALUES (?, ?)", (host, result[0]))
-            else:
-                print(f"Country '{country_name}' not found in country table. Skipping host '{host}'.")
-    conn.commit()
-    conn.close()
+    Examples:
 
+        with LoaderSession(db_path) as session:
+            session.load(df_games, df_codes)
+        session.print_timings()
+    """
 
-def insert_association_table_data(db_path, df):
-    """ Insert data into the association tables: GamesTeam, GamesDisability and GamesHost """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    for _, row in df.iterrows():
-        # Find games.id where games.year + games.type matches the row['year'] + row['type']
-        cursor.execute("SELECT id FROM games WHERE year = ? AND type = ?", (row['year'], row['type']))
-        games_id_result = cursor.fetchone()
-        if not games_id_result:
-            continue
-        games_id = games_id_result[0]
+    def __init__(self, db_path, pragmas=None, batch_size=DEFAULT_BATCH_SIZE, query_log=None):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.timings = {}
+        # isolation_level=None stops sqlite3 opening transactions implicitly, the session issues BEGIN itself
+        self.conn = connect(db_path, query_log=query_log, isolation_level=None)
+        self.journal_mode = self.conn.execute("PRAGMA journal_mode;").fetchone()[0]
+        apply_pragmas(self.conn, pragmas)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """ Roll back any unfinished transaction, put back the original journal mode and close the connection. """
+        if self.conn.in_transaction:
+            self.conn.rollback()
+        if self.conn.execute("PRAGMA journal_mode;").fetchone()[0] != self.journal_mode:
+            try:
+                self.conn.execute(f"PRAGMA journal_mode = {self.journal_mode};")
+            except sqlite3.OperationalError as error:
+                # Leaving WAL mode needs the only connection to the database
+                logger.warning("Could not set journal_mode back to %s: %s", self.journal_mode, error)
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """ Run the enclosed statements in a single transaction, rolled back if an exception is raised. """
+        self.conn.execute("BEGIN")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    @contextmanager
+    def stage(self, name):
+        """ Run a stage of the load inside a savepoint and record how long it took.
+
+        If the stage raises an exception its changes are rolled back to the savepoint and the exception is
+        re-raised.
+
+        Args:
+            name: Name of the stage, must be a valid SQL identifier
+        """
+        self.conn.execute(f"SAVEPOINT {name}")
+        start_time = time.perf_counter()
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute(f"ROLLBACK TO {name}")
+            self.conn.execute(f"RELEASE {name}")
+            raise
+        self.conn.execute(f"RELEASE {name}")
+        self.timings[name] = time.perf_counter() - start_time
+
+    def print_timings(self):
+        """ Print the time taken by each stage and the total. """
+        for name, duration in self.timings.items():
+            print(f"{name:<12} {duration:.4f} seconds")
+        print(f"{'total':<12} {sum(self.timings.values()):.4f} seconds")
+
+    def get_column_names(self, table_name):
+        """Return a list of column names for the specified table."""
+        return schema_cache.get_column_names(self.conn, table_name)
+
+    def delete_rows(self, table_names=None):
+        """ Delete all rows from the tables if specified, or all tables if not.
+
+        Args:
+            table_names: List of table names to delete
+        """
+        if not table_names:
+            cur = self.conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
+            table_names = [row[0] for row in cur.fetchall()]
+        for table_name in table_names:
+            self.conn.execute(f"DELETE FROM {table_name}")  # Delete every row
+
+    def insert_data(self, df, table_name):
+        """ Insert a DataFrame into a table using executemany in batches.
+
+        A table that already has data is skipped.
+
+        Args:
+            df: DataFrame with the data, columns must match the table column names
+            table_name: Name of the table to insert into
+
+        Returns:
+            int: Number of rows inserted
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        if cursor.fetchone()[0] > 0:
+            cursor.close()
+            logger.info("Table %s already has data. Skipping insert.", table_name)
+            return 0
+
+        cols, sql = get_insert_sql(cursor, table_name)
+        rows = dataframe_to_rows(df, cols)
+
+        start_time = time.perf_counter()
+        for batch in batched(rows, self.batch_size):
+            cursor.executemany(sql, batch)
+        cursor.close()
+        duration = time.perf_counter() - start_time
+
+        rate = len(rows) / duration if duration > 0 else float('inf')
+        logger.info("Inserted %d rows into %s in %.4f seconds (%s rows/sec)", len(rows), table_name, duration,
+                    f"{rate:,.0f}")
+        return len(rows)
+
+    def read_lookup(self, table_name, key_cols, id_col='id'):
+        """ Read a dimension table once into a DataFrame used to resolve foreign keys with a merge.
+
+        Where a key appears more than once the lowest id is kept, matching what a 'SELECT id ... WHERE' lookup
+        using fetchone would return.
+
+        Args:
+            table_name: Name of the table, e.g. games, host, disability or country
+            key_cols: List of the column names that identify a row, e.g. ['year', 'type']
+            id_col: Name of the id column
+
+        Returns:
+            pd.DataFrame with the key columns and the id column
+        """
+        cols = [*key_cols, id_col]
+        rows = self.conn.execute(f"SELECT {', '.join(cols)} FROM {table_name} ORDER BY {id_col}").fetchall()
+        lookup = pd.DataFrame(rows, columns=cols)
+        return lookup.drop_duplicates(subset=key_cols, keep='first')
+
+    def get_team_df(self, df):
+        """ Rename the team codes sheet columns to the team table column names, without changing df. """
+        team_cols = self.get_column_names("team")
+        cols_to_use = team_cols[0:-1]  # drop the last column, country_id
+        return df.set_axis(cols_to_use, axis=1)
+
+    def insert_team_data(self, df):
+        """ Insert the team codes and set team.country_id where the team name matches a country. """
+        self.insert_data(self.get_team_df(df), "team")
+        self.update_team_country_ids()
+
+    def update_team_country_ids(self, codes=None):
+        """ Set team.country_id where the team name matches a country.
+
+        Args:
+            codes: List of the team codes to update, all teams if not specified
+        """
+        # For each row in the team table, if the value in team.name matches a value in country.country
+        # then set team.country_id to the country.id
+        rows = self.conn.execute("SELECT code, name FROM team").fetchall()
+        df_team = pd.DataFrame(rows, columns=['code', 'name'])
+        if codes is not None:
+            df_team = df_team[df_team['code'].isin(codes)]
+        df_team['country'] = df_team['name'].replace(REPLACEMENT_NAMES)
+        df_team = df_team.merge(self.read_lookup("country", ['country']), on='country')
+        self.conn.executemany("UPDATE team SET country_id = ? WHERE code = ?",
+                              dataframe_to_rows(df_team, ['id', 'code']))
+
+    def insert_host_data(self, df, skip_existing=False):
+        """ Insert the unique host place names with the id of the host country.
+
+        Args:
+            df: DataFrame of the games sheet
+            skip_existing: If True, place names that are already in the host table are not inserted again
+        """
+        # One row per host place name, taken from the first games row that it appears in
+        df_host = split_values(df['host']).rename('place_name').reset_index()
+        df_host = df_host.drop_duplicates(subset='place_name', keep='first')
+        if skip_existing:
+            existing = self.read_lookup("host", ['place_name'])
+            df_host = df_host[~df_host['place_name'].isin(existing['place_name'])]
+
+        # The country column of that games row can have two values separated by a comma, e.g. 'UK, USA'
+        df_host['country'] = df.loc[df_host['row'], 'country'].to_numpy()
+        df_host['country'] = df_host['country'].str.split(',')
+        df_host = df_host.explode('country')
+        df_host['country'] = df_host['country'].str.strip()
+
+        df_host = df_host.merge(self.read_lookup("country", ['country']), on='country', how='left')
+        df_missing = df_host.loc[df_host['id'].isna(), ['place_name', 'country']]
+        for host, country_name in df_missing.itertuples(index=False):
+            logger.warning("Country '%s' not found in country table. Skipping host '%s'.", country_name, host)
+        df_host = df_host.dropna(subset=['id'])
+        self.conn.executemany("INSERT INTO host (place_name, country_id) VALUES (?, ?)",
+                              dataframe_to_rows(df_host.astype({'id': 'int64'}), ['place_name', 'id']))
+
+    def insert_association_table_data(self, df):
+        """ Insert data into the association tables: GamesTeam, GamesDisability and GamesHost
+
+        The games, host and disability tables are each read once and the ids are resolved by merging them with
+        the exploded host and disability values, rather than running a query per value.
+        """
+        # games.id for each row of df, where games.year + games.type matches the row['year'] + row['type']
+        df_games_id = df[['year', 'type']].rename_axis('row').reset_index()
+        df_games_id = df_games_id.merge(self.read_lookup("games", ['year', 'type']), on=['year', 'type'])
+        df_games_id = df_games_id[['row', 'id']].rename(columns={'id': 'games_id'})
 
         # GamesHost: handle multiple hosts
-        hosts = [h.strip() for h in str(row['host']).split(',') if h.strip()]
-        for host in hosts:
-            cursor.execute("SELECT id FROM host WHERE place_name = ?", (host,))
-            host_id_result = cursor.fetchone()
-            if host_id_result:
-                host_id = host_id_result[0]
-                cursor.execute("INSERT INTO gameshost (games_id, host_id) VALUES (?, ?)", (games_id, host_id))
+        df_games_host = split_values(df['host']).rename('place_name').reset_index()
+        df_games_host = df_games_host.merge(df_games_id, on='row')
+        df_games_host = df_games_host.merge(self.read_lookup("host", ['place_name']), on='place_name')
+        self.conn.executemany("INSERT INTO gameshost (games_id, host_id) VALUES (?, ?)",
+                              dataframe_to_rows(df_games_host, ['games_id', 'id']))
 
         # GamesDisability: handle multiple disabilities
-        disabilities = [d.strip() for d in str(row['disabilities_included']).split(',') if d.strip()]
-        for disability in disabilities:
-            cursor.execute("SELECT id FROM disability WHERE description = ?", (disability,))
-            disability_id_result = cursor.fetchone()
-            if disability_id_result:
-                disability_id = disability_id_result[0]
-                cursor.execute("INSERT INTO gamesdisability (games_id, disability_id) VALUES (?, ?)",
-                               (games_id, disability_id))
-    conn.commit()
-    conn.close()
+        df_games_disability = split_values(df['disabilities_included']).rename('description').reset_index()
+        df_games_disability = df_games_disability.merge(df_games_id, on='row')
+        df_games_disability = df_games_disability.merge(self.read_lookup("disability", ['description']),
+                                                        on='description')
+        self.conn.executemany("INSERT INTO gamesdisability (games_id, disability_id) VALUES (?, ?)",
+                              dataframe_to_rows(df_games_disability, ['games_id', 'id']))
+
+    def load(self, df_games, df_codes):
+        """ Run the full load in one transaction with a savepoint per stage.
+
+        If any stage fails the whole transaction is rolled back, so the database is either fully loaded or
+        left unchanged.
+
+        Args:
+            df_games: DataFrame of the games sheet
+            df_codes: DataFrame of the team codes sheet
+        """
+        with self.transaction():
+            with self.stage("games"):
+                self.insert_data(df_games, "games")
+            with self.stage("disability"):
+                self.insert_data(get_disability_df(df_games), "disability")
+            with self.stage("country"):
+                self.insert_data(get_country_df(df_games), "country")
+            with self.stage("team"):
+                self.insert_team_data(df_codes)
+            with self.stage("host"):
+                self.delete_rows(["host", ])
+                self.insert_host_data(df_games)
+            with self.stage("association"):
+                # gameshost, gamesdisability
+                self.insert_association_table_data(df_games)
+
+    def ensure_unique_index(self, table_name, key_cols):
+        """ Create a unique index on the key columns, needed for INSERT ... ON CONFLICT on those columns.
+
+        No index is created if the key columns are the table's primary key.
+        """
+        if schema_cache.get_table_info(self.conn, table_name).primary_key == tuple(key_cols):
+            return
+        index_name = f"ux_{table_name}_{'_'.join(key_cols)}"
+        self.conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(key_cols)})")
+
+    def diff_table(self, df, table_name, key_cols=None):
+        """ Compare the DataFrame with the rows already in the table.
+
+        Args:
+            df: DataFrame with the data, columns must match the table column names
+            table_name: Name of the table
+            key_cols: List of the column names that identify a row, defaults to NATURAL_KEYS[table_name]
+
+        Returns:
+            new, changed, deleted (tuple [pd.DataFrame, pd.DataFrame, pd.DataFrame]): see diff_rows
+        """
+        if key_cols is None:
+            key_cols = NATURAL_KEYS[table_name]
+        cols, _ = get_insert_sql(self.conn.cursor(), table_name)
+        rows = self.conn.execute(f"SELECT {', '.join(cols)} FROM {table_name}").fetchall()
+        # dtype=object stops integer columns containing NULL being read as floats
+        return diff_rows(df[cols], pd.DataFrame(rows, columns=cols, dtype=object), key_cols)
+
+    def apply_delta(self, table_name, delta, key_cols=None, delete_missing=False):
+        """ Write the new and changed rows with INSERT ... ON CONFLICT DO UPDATE and optionally delete rows.
+
+        Args:
+            table_name: Name of the table
+            delta: tuple of the new, changed and deleted rows returned by diff_table
+            key_cols: List of the column names that identify a row, defaults to NATURAL_KEYS[table_name]
+            delete_missing: If True, the deleted rows are deleted from the table
+        """
+        if key_cols is None:
+            key_cols = NATURAL_KEYS[table_name]
+        new, changed, deleted = delta
+        self.ensure_unique_index(table_name, key_cols)
+
+        cursor = self.conn.cursor()
+        cols, sql = get_insert_sql(cursor, table_name)
+        update_cols = [col for col in cols if col not in key_cols]
+        if update_cols:
+            updates = ', '.join(f"{col} = excluded.{col}" for col in update_cols)
+            sql = f"{sql} ON CONFLICT ({', '.join(key_cols)}) DO UPDATE SET {updates}"
+        else:
+            sql = f"{sql} ON CONFLICT ({', '.join(key_cols)}) DO NOTHING"
+        for batch in batched(dataframe_to_rows(pd.concat([new, changed]), cols), self.batch_size):
+            cursor.executemany(sql, batch)
+
+        if delete_missing and not deleted.empty:
+            where = ' AND '.join(f"{col} = ?" for col in key_cols)
+            cursor.executemany(f"DELETE FROM {table_name} WHERE {where}", dataframe_to_rows(deleted, key_cols))
+        cursor.close()
+        logger.info("%s: %d new, %d changed, %d deleted", table_name, len(new), len(changed),
+                    len(deleted) if delete_missing else 0)
+
+    def upsert_data(self, df, table_name, key_cols=None, delete_missing=False):
+        """ Apply only the differences between the DataFrame and the table, unchanged rows are not written.
+
+        Args:
+            df: DataFrame with the data, columns must match the table column names
+            table_name: Name of the table
+            key_cols: List of the column names that identify a row, defaults to NATURAL_KEYS[table_name]
+            delete_missing: If True, rows in the table that are not in df are deleted
+
+        Returns:
+            new, changed, deleted (tuple [pd.DataFrame, pd.DataFrame, pd.DataFrame]): see diff_rows
+        """
+        delta = self.diff_table(df, table_name, key_cols)
+        self.apply_delta(table_name, delta, key_cols, delete_missing)
+        return delta
+
+    def delete_association_rows(self, df_games_keys):
+        """ Delete the gameshost and gamesdisability rows for the games with the given year and type. """
+        df_games_id = df_games_keys[['year', 'type']].merge(self.read_lookup("games", ['year', 'type']),
+                                                            on=['year', 'type'])
+        games_ids = dataframe_to_rows(df_games_id, ['id'])
+        self.conn.executemany("DELETE FROM gameshost WHERE games_id = ?", games_ids)
+        self.conn.executemany("DELETE FROM gamesdisability WHERE games_id = ?", games_ids)
+
+    def diff_association_keys(self, df_games):
+        """ Find the games whose host or disability values differ from the rows in the association tables.
+
+        Args:
+            df_games: DataFrame of the games sheet
+
+        Returns:
+            pd.DataFrame of the year and type of the games whose gameshost or gamesdisability rows need rewriting
+        """
+        cols = ['year', 'type', 'link', 'value']
+        df_links = pd.concat([
+            split_values(df_games['host']).rename('value').reset_index().assign(link='host'),
+            split_values(df_games['disabilities_included']).rename('value').reset_index().assign(link='disability'),
+        ])
+        df_links = df_links.merge(df_games[['year', 'type']], left_on='row', right_index=True)[cols]
+
+        rows = self.conn.execute("""
+            SELECT g.year, g.type, 'host', h.place_name
+            FROM gameshost gh JOIN games g ON g.id = gh.games_id JOIN host h ON h.id = gh.host_id
+            UNION ALL
+            SELECT g.year, g.type, 'disability', d.description
+            FROM gamesdisability gd JOIN games g ON g.id = gd.games_id JOIN disability d ON d.id = gd.disability_id
+            """).fetchall()
+        df_existing = pd.DataFrame(rows, columns=cols, dtype=object)
+
+        merged = normalise_values(df_links).merge(normalise_values(df_existing).drop_duplicates(), on=cols,
+                                                  how='outer', indicator=True)
+        return merged.loc[merged['_merge'] != 'both', ['year', 'type']].drop_duplicates()
+
+    def load_incremental(self, df_games, df_codes):
+        """ Update an existing database with only the rows that are new, changed or deleted in the source data.
+
+        Games are matched on year and type and teams on code. Games and teams that are no longer in the source
+        are deleted. Host, disability and country values that are new are added, existing ones are left in
+        place. Team country ids are set for new and changed teams, or for every team if a country was added.
+        Hosts whose country was missing are added once the country exists. The association rows are rewritten
+        only for the games that are new, changed, or whose host or disability values have changed.
+
+        Args:
+            df_games: DataFrame of the games sheet
+            df_codes: DataFrame of the team codes sheet
+        """
+        with self.transaction():
+            with self.stage("games"):
+                new, changed, deleted = self.diff_table(df_games, "games")
+                # Games to relink: changed games plus those whose host or disability values have changed
+                games_keys = pd.MultiIndex.from_frame(normalise_values(df_games[['year', 'type']]))
+                relink_keys = pd.MultiIndex.from_frame(self.diff_association_keys(df_games))
+                relink = df_games.index[games_keys.isin(relink_keys)].union(changed.index)
+                # Remove association rows before the games rows they refer to
+                self.delete_association_rows(pd.concat([df_games.loc[relink], deleted]))
+                self.apply_delta("games", (new, changed, deleted), delete_missing=True)
+            with self.stage("disability"):
+                self.upsert_data(get_disability_df(df_games), "disability")
+            with self.stage("country"):
+                country_new, _, _ = self.upsert_data(get_country_df(df_games), "country")
+            with self.stage("team"):
+                team_new, team_changed, _ = self.upsert_data(self.get_team_df(df_codes), "team",
+                                                             delete_missing=True)
+                # A new country can match the name of a team that has not changed, so then every team is relinked
+                codes = None if not country_new.empty else pd.concat([team_new, team_changed])['code']
+                self.update_team_country_ids(codes)
+            with self.stage("host"):
+                self.insert_host_data(df_games, skip_existing=True)
+            with self.stage("association"):
+                # new keeps the index labels of df_games
+                self.insert_association_table_data(df_games.loc[new.index.union(relink)])
+
+
+@contextmanager
+def loader_session(db, **kwargs):
+    """ Yield a LoaderSession in a transaction, for the module level functions.
+
+    If db is a LoaderSession it is used as it is, so functions called with the same session share its connection
+    and its transaction, and the caller decides when to commit. A transaction is started if the session is not
+    already in one. If db is a path, a new session is opened and its transaction committed at the end.
+
+    Args:
+        db: Path to the database, or a LoaderSession
+        **kwargs: Arguments for LoaderSession if a new session is opened, e.g. pragmas
+
+    Examples:
+
+        with LoaderSession(db_path) as session:
+            with session.transaction():
+                insert_team_data(session, df_codes)
+                insert_host_data(session, df_games)
+    """
+    if isinstance(db, LoaderSession):
+        if db.conn.in_transaction:
+            yield db
+        else:
+            with db.transaction():
+                yield db
+        return
+    with LoaderSession(db, **kwargs) as session:
+        with session.transaction():
+            yield session
+
+
+def insert_team_data(db, df):
+    """ Insert the team codes, see LoaderSession.insert_team_data. db is a path or a LoaderSession. """
+    with loader_session(db) as session:
+        session.insert_team_data(df)
+
+
+def insert_host_data(db, df):
+    """ Insert the host place names, see LoaderSession.insert_host_data. db is a path or a LoaderSession. """
+    with loader_session(db) as session:
+        session.insert_host_data(df)
+
+
+def insert_association_table_data(db, df):
+    """ Insert data into the association tables: GamesTeam, GamesDisability and GamesHost
+
+    Args:
+        db: Path to the database, or a LoaderSession
+        df: DataFrame of the games sheet
+    """
+    with loader_session(db) as session:
+        session.insert_association_table_data(df)
 
 
-def delete_rows(db_path, table_names=None):
+def delete_rows(db, table_names=None):
     """ Delete all rows from a table if specified, or all tables if not.
 
     Args:
-        db_path: Path to the database
+        db: Path to the database, or a LoaderSession
         table_names: List of table names to delete
     """
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    if not table_names:
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
-        table_names = [row[0] for row in cur.fetchall()]
-    for table_name in table_names:
-        cur.execute(f"DELETE FROM {table_name}")  # Delete every row
-    conn.commit()
-    conn.close()
+    with loader_session(db, pragmas={}) as session:
+        session.delete_rows(table_names)
 
 
 def get_column_names(db_path, table_name):
     """Return a list of column names for the specified table."""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute(f"PRAGMA table_info({table_name});")
-    cols = [row[1] for row in cursor.fetchall()]
-    cursor.close()
-    conn.close()
-    return cols
+    return schema_cache.get_column_names(db_path, table_name)
 
 
 def create_dataframes(data_path):
@@ -196,10 +759,6 @@ def create_dataframes(data_path):
         'highlights': 'string',
         'URL': 'string'
     }
-    df_games = pd.read_excel(data_path, sheet_name="games", dtype=dict_event_dtypes)
-    # Clean the 'type' column
-    df_games['type'] = df_games['type'].str.strip().str.lower()
-    df_games = df_games[df_games['type'].isin(['winter', 'summer'])]
     # Country code sheet
     dict_code_dtypes = {
         'Code': 'string',
@@ -209,34 +768,49 @@ def create_dataframes(data_path):
         'MemberType': 'string',
         'Notes': 'string'
     }
-    df_country_codes = pd.read_excel(data_path, sheet_name="team_codes", dtype=dict_code_dtypes)
+    sheets = read_workbook(data_path, {
+        "games": {'dtype': dict_event_dtypes},
+        "team_codes": {'dtype': dict_code_dtypes},
+    })
+    df_games = sheets["games"]
+    # Clean the 'type' column
+    df_games['type'] = df_games['type'].str.strip().str.lower()
+    df_games = df_games[df_games['type'].isin(['winter', 'summer'])]
+    df_country_codes = sheets["team_codes"]
     return df_games, df_country_codes
 
 
-def main():
+def main(incremental=False):
+    """ Create and load the paralympics database.
+
+    Args:
+        incremental: If True and the database exists, only apply the changes in the source data instead of
+            creating the database and loading all the data
+    """
+    # The solutions package is only available once activities 3.1 to 3.11 are completed
+    from activities.database_wk3 import data_solutions
+    from activities.database_wk3.solutions_db import create_db
+
     db_path = resources.files(data_solutions).joinpath("paralympics.db")
     data_path = resources.files(data_solutions).joinpath("paralympics_all_raw.xlsx")
     schema_path = resources.files(data_solutions).joinpath("paralympics_schema.sql")
-    create_db(schema_path=schema_path, db_path=db_path)
+    incremental = incremental and db_path.is_file()
+    if not incremental:
+        create_db(schema_path=schema_path, db_path=db_path)
     df_games, df_codes = create_dataframes(data_path)
-    # games data
-    insert_data(db_path, df_games, "games")
-    # disability data using the unique values from the disabilities_included column
-    disability_values = pd.unique(df_games.disabilities_included.dropna().str.split(',').explode().str.strip())
-    df_disabilities = pd.DataFrame({'description': disability_values})
-    insert_data(db_path, df_disabilities, "disability")
-    # country data, needs to be unique and split the values in the row that has both UK and USA in
-    country_values = pd.unique(df_games.country.dropna().str.split(',').explode().str.strip())
-    df_country = pd.DataFrame({'country': country_values})
-    insert_data(db_path, df_country, "country")
-    # team
-    insert_team_data(db_path, df=df_codes)
-    # Host
-    delete_rows(db_path, ["host", ])
-    insert_host_data(db_path, df_games)
-    # gameshost, gamesdisability
-    insert_association_table_data(db_path, df_games)
+    with LoaderSession(db_path, query_log=QUERY_LOG) as session:
+        if incremental:
+            session.load_incremental(df_games, df_codes)
+        else:
+            session.load(df_games, df_codes)
+    session.print_timings()
+    QUERY_LOG.print_report()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Create and load the paralympics database.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="apply only the changes in the source data to an existing database")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    main(incremental=args.incremental)
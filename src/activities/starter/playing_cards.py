@@ -1,12 +1,21 @@
 import random
+import time
 from pathlib import Path
 from typing import List
 
-from sqlalchemy.exc import OperationalError
-from sqlmodel import Field, SQLModel, Session, create_engine, Relationship
+from sqlalchemy import func, insert, inspect
+from sqlmodel import Field, SQLModel, Session, Relationship, select
+
+from activities.starter.db_engine import get_engine
+from activities.starter.lazy_import import lazy_import
+
+np = lazy_import("numpy")
 
 database_path = Path(__file__).parent.joinpath('test_deck.db')
 
+SUITS = ['Clubs', 'Diamonds', 'Hearts', 'Spades']
+RANKS = [str(r) for r in [2, 3, 4, 5, 6, 7, 8, 9, 10, 'Jack', 'Queen', 'King', 'Ace']]
+
 
 class Suit(SQLModel, table=True):
     """ Suit for playing cards """
@@ -33,9 +42,13 @@ class Rank(SQLModel, table=True):
 
 
 class CardModel(SQLModel, table=True):
-    """ Model for playing cards - database table version"""
+    """ Model for playing cards - database table version
+
+    deck is part of the primary key so that the table can hold more than one deck, e.g. a six deck shoe.
+    """
     rank_id: int | None = Field(primary_key=True, foreign_key="rank.rank_id")
     suit_id: int | None = Field(primary_key=True, foreign_key="suit.suit_id")
+    deck: int = Field(default=1, primary_key=True)
 
     rank: Rank | None = Relationship(back_populates="cards")
     suit: Suit | None = Relationship(back_populates="cards")
@@ -43,6 +56,8 @@ class CardModel(SQLModel, table=True):
 
 class Card:
     """ Card for playing cards """
+    # No per-instance __dict__, so each card uses less memory and is faster to create
+    __slots__ = ('rank', 'suit')
 
     def __init__(self, suit, rank):
         self.suit = suit
@@ -91,42 +106,254 @@ class Deck:
         return hand
 
 
-def create_cards_db(db_path):
+class CompactDeck:
+    """ Represents one or more decks of playing cards as an array of small integers.
+
+        Deck creates a tuple per card and a Card object per card drawn. CompactDeck stores each card as a code,
+        suit index * number of ranks + rank index, in a NumPy array. Shuffling is a single in-place permutation with
+        the deck's own random number generator, drawing moves a position along the array, and hands are copies of
+        slices of the array, so no Card objects are created unless they are asked for. A dealt hand does not change
+        when the deck is reset and shuffled again.
+
+        Attributes:
+            suits (List[str]): Suit names, in code order.
+            ranks (List[str]): Rank names, in code order.
+            cards (np.ndarray): Code of each card, the cards before position have been drawn.
+            position (int): Index of the next card to draw.
+            rng (np.random.Generator): Random number generator used to shuffle.
+
+        Examples:
+
+            deck = CompactDeck(seed=42)
+            deck.shuffle()
+            hands = deck.deal_hands(4, 5)  # 4 x 5 array of codes
+            deck.to_cards(hands[0])  # Card objects for the first hand
+    """
+
+    def __init__(self, suits=None, ranks=None, decks=1, seed=None, rng=None):
+        """
+        Args:
+            suits: Suit objects or names, defaults to SUITS
+            ranks: Rank objects or names, defaults to RANKS
+            decks (int): Number of decks, e.g. 6 for a six deck shoe
+            seed: Seed for a new random number generator, ignored if rng is given
+            rng (np.random.Generator): Random number generator to use, e.g. one per process in a simulation
+        """
+        self.suits = [getattr(suit, 'suit', suit) for suit in suits or SUITS]
+        self.ranks = [getattr(rank, 'rank', rank) for rank in ranks or RANKS]
+        n_codes = len(self.suits) * len(self.ranks)
+        dtype = np.uint8 if n_codes <= 256 else np.uint16
+        self.cards = np.tile(np.arange(n_codes, dtype=dtype), decks)
+        self.position = 0
+        self.rng = rng if rng is not None else np.random.default_rng(seed)
+
+    def __len__(self):
+        """ Number of cards left to draw """
+        return len(self.cards) - self.position
+
+    def reset(self):
+        """ Return the drawn cards to the deck, without shuffling. """
+        self.position = 0
+
+    def shuffle(self):
+        """ Shuffle the cards that have not been drawn. """
+        self.rng.shuffle(self.cards[self.position:])
+
+    def deal_codes(self, size):
+        """ Draw size cards and return a copy of their codes.
+
+        A view of the deck array would be changed by the next shuffle after reset, the copy costs one byte per card.
+
+        Raises:
+            IndexError: If there are fewer than size cards left
+        """
+        if size > len(self):
+            raise IndexError(f"Cannot deal {size} cards, {len(self)} left in the deck")
+        codes = self.cards[self.position:self.position + size].copy()
+        self.position += size
+        return codes
+
+    def deal_hands(self, n_hands, size):
+        """ Deal n_hands hands of size cards, returned as an n_hands x size array of codes. """
+        return self.deal_codes(n_hands * size).reshape(n_hands, size)
+
+    def suit_index(self, codes):
+        """ Return the index in suits of each code """
+        return codes // len(self.ranks)
+
+    def rank_index(self, codes):
+        """ Return the index in ranks of each code """
+        return codes % len(self.ranks)
+
+    def to_card(self, code):
+        """ Create the Card for a code """
+        suit, rank = divmod(int(code), len(self.ranks))
+        return Card(self.suits[suit], self.ranks[rank])
+
+    def to_cards(self, codes):
+        """ Create the Cards for an array of codes """
+        return [self.to_card(code) for code in codes]
+
+    def draw_card(self):
+        card_code = self.deal_codes(1)[0]
+        return self.to_card(card_code)
+
+    def deal_hand(self, size):
+        return self.to_cards(self.deal_codes(size))
+
+
+def create_cards_db(db_path, echo=False, decks=1):
     """ Creates a deck of cards database.
 
+       Uses ORM objects, see create_cards_db_bulk for a faster version for many decks.
+
        Args:
-           db_path (str or Path): The path to the SQLite database file.
+           db_path (str or Path): The path to the SQLite database file, or ':memory:'.
+           echo (bool): If True, log the SQL of every statement.
+           decks (int): The number of decks of cards.
 
        Returns:
            engine: SQLModel engine object.
 
         Raises:
-            OperationalError: If an error occurs during database creation.
+            OperationalError: If the database file cannot be opened or created, e.g. db_path is a directory.
     """
+    engine = get_engine(db_path, echo=echo)
+    create_tables(engine)
+    suits, ranks, cards = create_cards(decks)
+
+    with Session(engine) as session:
+        session.add_all(suits)
+        session.add_all(ranks)
+        session.add_all(cards)
+        session.commit()
+        return engine
 
-    try:
-        engine = create_engine(f"sqlite:///{db_path}", echo=True)
-    except OperationalError as err:
-        raise f"Cannot connect to DB {err}"
-    else:
-        SQLModel.metadata.create_all(engine)
-        suits, ranks, cards = create_cards()
 
-        with Session(engine) as session:
-            session.add_all(suits)
-            session.add_all(ranks)
-            session.add_all(cards)
-            session.commit()
-            return engine
+def create_tables(engine):
+    """ Create the tables, first updating a cardmodel table from before deck was added to its primary key.
 
+    SQLModel.metadata.create_all does not change a table that already exists, so an older cards database would keep
+    a cardmodel table without the deck column. That table is renamed, the new table created and the cards copied into
+    it as deck 1, keeping their suit and rank ids.
 
-def create_cards():
+    Args:
+        engine: SQLModel engine for the database
+    """
+    table_name = CardModel.__table__.name
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        migrate = inspector.has_table(table_name) and 'deck' not in {
+            column['name'] for column in inspector.get_columns(table_name)}
+        if migrate:
+            connection.exec_driver_sql(f"ALTER TABLE {table_name} RENAME TO {table_name}_old;")
+        SQLModel.metadata.create_all(connection)
+        if migrate:
+            connection.exec_driver_sql(f"INSERT INTO {table_name} (rank_id, suit_id, deck) "
+                                       f"SELECT rank_id, suit_id, 1 FROM {table_name}_old;")
+            connection.exec_driver_sql(f"DROP TABLE {table_name}_old;")
+
+
+def create_cards(decks=1):
     """ Create the objects that will be stored in the database """
-    suits = [Suit(suit=s) for s in ['Clubs', 'Diamonds', 'Hearts', 'Spades']]
-    ranks = [Rank(rank=str(r)) for r in [2, 3, 4, 5, 6, 7, 8, 9, 10, 'Jack', 'Queen', 'King', 'Ace']]
+    suits = [Suit(suit=s) for s in SUITS]
+    ranks = [Rank(rank=r) for r in RANKS]
     cards = []
-    for suit in suits:
-        for rank in ranks:
-            card = CardModel(suit=suit, rank=rank)
-            cards.append(card)
+    for deck in range(1, decks + 1):
+        for suit in suits:
+            for rank in ranks:
+                card = CardModel(suit=suit, rank=rank, deck=deck)
+                cards.append(card)
     return [suits, ranks, cards]
+
+
+def get_or_create_ids(connection, model, column, values):
+    """ Return a dict of value to id for the rows of a lookup table, e.g. Suit, inserting any missing values.
+
+    The missing values are inserted in one statement and SQLite assigns their ids, which are read back with RETURNING.
+
+    Args:
+        connection: SQLAlchemy connection
+        model: Suit or Rank
+        column: Name of the value column, e.g. 'suit'
+        values: Values needed, e.g. SUITS
+
+    Returns:
+        dict[str, int]: id for each value
+    """
+    table = model.__table__
+    id_col = table.primary_key.columns[0]
+    ids = {value: row_id for row_id, value in connection.execute(select(id_col, table.c[column]))}
+    missing = [{column: value} for value in values if value not in ids]
+    if missing:
+        inserted = connection.execute(insert(table).returning(id_col, table.c[column]), missing)
+        ids.update({value: row_id for row_id, value in inserted})
+    return ids
+
+
+def add_decks(engine, decks=1):
+    """ Add decks of cards to the database in a single transaction, without creating ORM objects.
+
+    The decks are numbered after the highest deck already in the database. The cards are inserted with one
+    executemany call using the suit and rank ids, rather than the ORM resolving each card's relationships.
+
+    Args:
+        engine: SQLModel engine for a database with the tables created
+        decks (int): The number of decks to add
+
+    Returns:
+        list[int]: the deck numbers added
+    """
+    card_table = CardModel.__table__
+    with engine.begin() as connection:
+        suit_ids = get_or_create_ids(connection, Suit, 'suit', SUITS)
+        rank_ids = get_or_create_ids(connection, Rank, 'rank', RANKS)
+        first_deck = connection.execute(select(func.coalesce(func.max(card_table.c.deck), 0))).scalar_one() + 1
+        deck_numbers = list(range(first_deck, first_deck + decks))
+        cards = [{'deck': deck, 'suit_id': suit_ids[suit], 'rank_id': rank_ids[rank]}
+                 for deck in deck_numbers for suit in SUITS for rank in RANKS]
+        connection.execute(insert(card_table), cards)
+    return deck_numbers
+
+
+def create_cards_db_bulk(db_path, decks=1, echo=False):
+    """ Creates a database with one or more decks of cards, using bulk inserts instead of ORM objects.
+
+       Args:
+           db_path (str or Path): The path to the SQLite database file, or ':memory:'.
+           decks (int): The number of decks of cards.
+           echo (bool): If True, log the SQL of every statement.
+
+       Returns:
+           engine: SQLModel engine object.
+    """
+    engine = get_engine(db_path, echo=echo)
+    create_tables(engine)
+    add_decks(engine, decks)
+    return engine
+
+
+def benchmark_create_cards(decks=(1, 10, 100), repeat=3):
+    """ Print the time taken to create in-memory databases of cards with create_cards_db and create_cards_db_bulk.
+
+    Args:
+        decks: Numbers of decks to time
+        repeat: Number of times each is run, the fastest time is printed
+    """
+    print(f"{'decks':>6} {'cards':>8} {'orm s':>10} {'bulk s':>10} {'speedup':>8}")
+    for n in decks:
+        times = {}
+        for name, create in (('orm', create_cards_db), ('bulk', create_cards_db_bulk)):
+            durations = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                engine = create(":memory:", decks=n)
+                durations.append(time.perf_counter() - start)
+                engine.dispose()
+            times[name] = min(durations)
+        print(f"{n:>6} {n * len(SUITS) * len(RANKS):>8} {times['orm']:>10.4f} {times['bulk']:>10.4f}"
+              f" {times['orm'] / times['bulk']:>7.1f}x")
+
+
+if __name__ == '__main__':
+    benchmark_create_cards()
@@ -0,0 +1,185 @@
+""" Benchmark SQL queries against SQLite databases.
+
+Timing a single run of a query is mostly noise: the first run includes reading the database pages from disk and
+compiling the statement. Each query is therefore run a number of warmup times that are not recorded, then
+repeated and timed with time.perf_counter_ns. Each run is split into phases:
+
+    prepare: compiling the statement. The sqlite3 module does not expose statement preparation on its own, so this is
+        measured by running EXPLAIN on the query on a connection with the statement cache turned off; EXPLAIN compiles
+        the statement but does not read any data.
+    execute: cursor.execute(), which runs the query up to the first result row.
+    fetch: cursor.fetchall(), which reads the remaining rows.
+
+The results are summarised as min/median/p95/standard deviation per phase and can be saved as JSON with
+benchmark_report.write_json, so timings can be compared between versions of the code or the database.
+
+Examples:
+
+    from importlib import resources
+
+    from activities import data
+
+    db_path = resources.files(data).joinpath("para-normalised.db")
+    results = run_workload(db_path, {"summer_2012": "SELECT * FROM Games WHERE year = 2012;"})
+    print_report(results)
+    benchmark_report.write_json(results, "benchmark.json")
+"""
+import sqlite3
+import statistics
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from activities.starter.benchmark_report import print_table
+
+PHASES = ['prepare', 'execute', 'fetch', 'total']
+
+
+def percentile(values, pct):
+    """ Return the nearest-rank percentile of a list of numbers, e.g. pct=95 for the 95th percentile. """
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarise(values_ns):
+    """ Summarise a list of timings in nanoseconds.
+
+    Returns:
+        dict with the min, median, p95 and stddev in nanoseconds
+    """
+    return {
+        'min': min(values_ns),
+        'median': statistics.median(values_ns),
+        'p95': percentile(values_ns, 95),
+        'stddev': statistics.stdev(values_ns) if len(values_ns) > 1 else 0.0,
+    }
+
+
+@dataclass
+class QueryStats:
+    """ Timings of repeated runs of one query.
+
+    Attributes:
+        label: Name of the query in the workload
+        database: Name of the database file
+        query: SQL that was run
+        warmup: Number of untimed runs before the timed runs
+        rows: Number of rows returned by the query
+        timings: Nanoseconds taken by each timed run, for each phase in PHASES
+    """
+    label: str
+    database: str
+    query: str
+    warmup: int
+    rows: int = 0
+    timings: dict = field(default_factory=lambda: {phase: [] for phase in PHASES})
+
+    @property
+    def repeat(self):
+        """ Number of timed runs. """
+        return len(self.timings['total'])
+
+    def summary(self):
+        """ Return the summary statistics for each phase, see summarise. """
+        return {phase: summarise(values) for phase, values in self.timings.items()}
+
+    def to_dict(self):
+        """ Return the statistics as a dict that can be saved as JSON. """
+        return {
+            'label': self.label,
+            'database': self.database,
+            'query': self.query,
+            'repeat': self.repeat,
+            'warmup': self.warmup,
+            'rows': self.rows,
+            'summary_ns': self.summary(),
+        }
+
+
+def _time_prepare(prepare_con, query, params):
+    """ Time compiling the query, see the module docstring. """
+    start = time.perf_counter_ns()
+    cur = prepare_con.execute(f"EXPLAIN {query}", params)
+    duration = time.perf_counter_ns() - start
+    cur.close()
+    return duration
+
+
+def _time_query(con, query, params):
+    """ Time executing the query and fetching the rows.
+
+    Returns:
+        execute_ns, fetch_ns, rows (tuple [int, int, int])
+    """
+    cur = con.cursor()
+    start = time.perf_counter_ns()
+    cur.execute(query, params)
+    executed = time.perf_counter_ns()
+    rows = cur.fetchall()
+    fetched = time.perf_counter_ns()
+    cur.close()
+    return executed - start, fetched - executed, len(rows)
+
+
+def benchmark_query(db_path, query, label=None, repeat=30, warmup=3, params=()):
+    """ Run a query repeatedly and record the time taken by each phase.
+
+    Args:
+        db_path: Path to the SQLite database
+        query: SQL query to run
+        label: Name for the query in reports, defaults to the query text
+        repeat: Number of timed runs
+        warmup: Number of runs before the timed runs that are not recorded
+        params: Parameters for the query
+
+    Returns:
+        QueryStats: timings of the timed runs
+    """
+    stats = QueryStats(label=label or query, database=Path(str(db_path)).name, query=query, warmup=warmup)
+    con = sqlite3.connect(db_path)
+    # No statement cache, so every EXPLAIN has to compile the query again
+    prepare_con = sqlite3.connect(db_path, cached_statements=0)
+    try:
+        for _ in range(warmup):
+            _time_prepare(prepare_con, query, params)
+            _time_query(con, query, params)
+        for _ in range(repeat):
+            prepare_ns = _time_prepare(prepare_con, query, params)
+            execute_ns, fetch_ns, stats.rows = _time_query(con, query, params)
+            stats.timings['prepare'].append(prepare_ns)
+            stats.timings['execute'].append(execute_ns)
+            stats.timings['fetch'].append(fetch_ns)
+            stats.timings['total'].append(execute_ns + fetch_ns)
+    finally:
+        prepare_con.close()
+        con.close()
+    return stats
+
+
+def run_workload(db_path, queries, repeat=30, warmup=3):
+    """ Benchmark each query in a named workload.
+
+    Args:
+        db_path: Path to the SQLite database
+        queries: dict of query name to SQL
+        repeat: Number of timed runs of each query
+        warmup: Number of untimed runs of each query
+
+    Returns:
+        list[QueryStats]: one per query, in the order of queries
+    """
+    return [benchmark_query(db_path, query, label, repeat=repeat, warmup=warmup) for label, query in queries.items()]
+
+
+def print_report(results):
+    """ Print a table of the execute + fetch time of each query, in microseconds, and the median of each phase. """
+    columns = [("database", "<28"), ("query", "<24"), ("rows", ">6")]
+    columns += [(name, ">10.1f") for name in ('min', 'median', 'p95', 'stddev', 'prepare', 'execute', 'fetch')]
+    rows = []
+    for stats in results:
+        summary = stats.summary()
+        total = [summary['total'][name] / 1000 for name in ('min', 'median', 'p95', 'stddev')]
+        phases = [summary[phase]['median'] / 1000 for phase in ('prepare', 'execute', 'fetch')]
+        rows.append([stats.database, stats.label, stats.rows, *total, *phases])
+    print_table(columns, rows)
@@ -0,0 +1,268 @@
+""" Cache the results of read queries, so the same query on an unchanged database is only run once.
+
+The cache key is made from:
+
+    - the database file path
+    - the SQL with the whitespace collapsed (query_log.normalise_sql), so formatting does not matter
+    - the query parameters
+    - the size and modification time of the database file and its -wal file, and the change counters in their
+      headers, so any change to the database means the query is run again. A query on an open connection also uses
+      PRAGMA data_version, which changes when another connection commits, and Connection.total_changes, which
+      changes when this connection writes.
+
+The results (the list of rows that fetchall returns) are kept in memory, with the least recently used results removed
+when their total pickled size is more than max_bytes. If cache_dir is given the results are also saved as pickle
+files, so they are still cached when Python is restarted. The same limit applies to the files, the least recently used
+being deleted first. Loading a pickle file can run code, so as in workbook_cache the directory must only be readable
+and writable by the current user, otherwise the files are not used.
+
+Only SELECT, WITH and VALUES statements are cached. These queries are run every time and never cached:
+
+    - queries on an in-memory database, ':memory:' or a file::memory: or mode=memory URI, as it has no file
+    - queries on a path or file: URI where there is no database file, as there is no file to check for changes
+    - queries whose result changes without the database changing, i.e. that use random(), randomblob(), 'now',
+      CURRENT_TIMESTAMP, CURRENT_DATE, CURRENT_TIME, changes(), total_changes() or last_insert_rowid(). These are
+      found by name in the SQL, so a user-defined function that is not deterministic must not be used with the cache.
+
+Examples:
+
+    rows = cached_query("para-normalised.db", "SELECT type, COUNT(*) FROM Games GROUP BY type")
+    cache = QueryCache(max_bytes=1_000_000, cache_dir="query_cache")
+    rows = cache.query(conn, "SELECT * FROM tracks WHERE GenreId = ?", (1,))
+    cache.print_report()
+"""
+import hashlib
+import os
+import pickle
+import re
+import warnings
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from activities.starter.query_log import connect, normalise_sql
+from activities.starter.schema_cache import file_state
+from activities.starter.workbook_cache import private_dir
+
+# Maximum total size of the results kept in memory, in bytes
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+READ_QUERY = re.compile(r"^\s*(SELECT|WITH|VALUES)\b", re.IGNORECASE)
+NOT_DETERMINISTIC = re.compile(r"\b(random|randomblob|changes|total_changes|last_insert_rowid)\s*\(|'now'"
+                               r"|\bCURRENT_(TIMESTAMP|DATE|TIME)\b", re.IGNORECASE)
+
+
+def is_memory_db(db_file):
+    """ Return True if db_file names an in-memory database rather than a file. """
+    name = str(db_file)
+    return name in ("", ":memory:") or name.startswith("file::memory:") or (
+        name.startswith("file:") and "mode=memory" in name)
+
+
+def db_file_path(db_file):
+    """ Return the resolved path of the database file for a path or a file: URI, e.g. 'file:data.db?mode=ro'. """
+    name = str(db_file)
+    if name.startswith("file:"):
+        name = unquote(urlsplit(name).path)
+    return Path(name).resolve()
+
+
+def _change_counters(db_path):
+    """ Return the file change counter from the database header and the salt from the -wal header, if there is one.
+
+    The modification time may not change if two writes are close together. SQLite increments the change counter
+    for each transaction that writes to the database, except in WAL mode, where each commit adds to the -wal file
+    and the salt changes each time the -wal file is started again.
+    """
+    counters = []
+    for path, offset, size in ((db_path, 24, 4), (db_path.with_name(f"{db_path.name}-wal"), 16, 8)):
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                counters.append(f.read(size))
+        except FileNotFoundError:
+            counters.append(None)
+    return tuple(counters)
+
+
+class QueryCache:
+    """ Results of read queries, see the module docstring.
+
+    Args:
+        max_bytes: Maximum total pickled size of the results kept in memory
+        cache_dir: Optional directory to also save the results in
+
+    Attributes:
+        hits: Number of queries answered from memory
+        disk_hits: Number of queries answered from cache_dir
+        misses: Number of queries run on the database
+        evictions: Number of results removed from memory or cache_dir to make space
+        uncached: Number of queries that were not cached, on an in-memory database, without a database file or not
+            deterministic
+        size: Total pickled size of the results in memory
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, cache_dir=None):
+        self.max_bytes = max_bytes
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir and not private_dir(self.cache_dir):
+            warnings.warn(f"Not saving query results, {self.cache_dir} can be read or written by other users")
+            self.cache_dir = None
+        # Key -> (rows, size)
+        self._entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncached = 0
+
+    def clear(self):
+        """ Remove the results from memory and cache_dir. The counts are not reset. """
+        self._entries.clear()
+        self.size = 0
+        if self.cache_dir:
+            for cache_file in self.cache_dir.glob("*.pkl"):
+                cache_file.unlink()
+
+    def _key(self, path, sql, params, version=None):
+        """ Return the cache key as a hex digest, see the module docstring. """
+        # Named parameters are a dict, which would only give its keys as a tuple
+        params = tuple(sorted(params.items())) if isinstance(params, Mapping) else tuple(params)
+        spec = (str(path), normalise_sql(sql), params, file_state(path), _change_counters(path), version)
+        return hashlib.sha256(repr(spec).encode()).hexdigest()
+
+    def _get(self, key):
+        """ Return the cached rows for the key, or None. """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if self.cache_dir:
+            cache_file = self.cache_dir.joinpath(f"{key}.pkl")
+            try:
+                data = cache_file.read_bytes()
+                rows = pickle.loads(data)
+                # The modification time records the last use, for _trim_dir
+                os.utime(cache_file)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                return None
+            self.disk_hits += 1
+            self._put_memory(key, rows, len(data))
+            return rows
+        return None
+
+    def _put_memory(self, key, rows, size):
+        """ Keep the rows in memory, removing the least recently used results if the cache is full. """
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (rows, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def _put(self, key, rows):
+        data = pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL)
+        self._put_memory(key, rows, len(data))
+        if self.cache_dir and len(data) <= self.max_bytes:
+            # Write to a temporary file first so a partial file is never read
+            tmp_file = self.cache_dir.joinpath(f"{key}.tmp")
+            tmp_file.write_bytes(data)
+            tmp_file.replace(self.cache_dir.joinpath(f"{key}.pkl"))
+            self._trim_dir()
+
+    def _trim_dir(self):
+        """ Delete the least recently used files in cache_dir until their total size is no more than max_bytes. """
+        files = []
+        for cache_file in self.cache_dir.glob("*.pkl"):
+            try:
+                stat = cache_file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, cache_file))
+        total = sum(size for _, size, _ in files)
+        for _, size, cache_file in sorted(files):
+            if total <= self.max_bytes:
+                break
+            cache_file.unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+
+    def query(self, db, sql, params=()):
+        """ Return the rows of a read query, from the cache if the database has not changed.
+
+        Args:
+            db: Path to the database file, which is only opened if the query is not cached, or an open connection
+            sql: SELECT statement
+            params: Query parameters
+
+        Returns:
+            list[tuple]: the rows, as from fetchall
+
+        Raises:
+            ValueError: If the statement is not a read query
+        """
+        if not READ_QUERY.match(sql):
+            raise ValueError(f"Only read queries can be cached: {normalise_sql(sql)[:60]}")
+        if hasattr(db, "execute"):
+            # Each row is (seq, name, file), file is '' for an in-memory database
+            db_file = db.execute("PRAGMA database_list;").fetchone()[2]
+            version = (db.execute("PRAGMA data_version;").fetchone()[0], db.total_changes)
+        else:
+            db_file, version = db, None
+        path = None if is_memory_db(db_file) else db_file_path(db_file)
+        if path is None or not path.is_file() or NOT_DETERMINISTIC.search(sql):
+            self.uncached += 1
+            return self._run(db, sql, params)
+
+        key = self._key(path, sql, params, version)
+        rows = self._get(key)
+        if rows is None:
+            self.misses += 1
+            rows = self._run(db, sql, params)
+            self._put(key, rows)
+        # A new list so changing it does not change the cached result
+        return list(rows)
+
+    @staticmethod
+    def _run(db, sql, params):
+        if hasattr(db, "execute"):
+            return db.execute(sql, params).fetchall()
+        conn = connect(db, uri=str(db).startswith("file:"))
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def stats(self):
+        """ Return the counts, the hit rate and the number and size of the results in memory. """
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'uncached': self.uncached,
+            'entries': len(self._entries),
+            'bytes': self.size,
+        }
+
+    def print_report(self):
+        stats = self.stats()
+        print(f"Query cache: {stats['hits']} hits, {stats['disk_hits']} disk hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate), {stats['evictions']} evictions, "
+              f"{stats['entries']} results using {stats['bytes'] / 1024:.1f} KiB")
+
+
+# Shared by the modules in the package
+QUERY_CACHE = QueryCache()
+
+
+def cached_query(db, sql, params=()):
+    """ Run a read query using QUERY_CACHE. See QueryCache.query for the arguments. """
+    return QUERY_CACHE.query(db, sql, params)
@@ -0,0 +1,282 @@
+""" Record the SQL run on sqlite3 connections and report the slow statements.
+
+connect() returns a sqlite3 connection that records every statement run through it in a QueryLog:
+
+    - the SQL, and the SQL with the parameters filled in, from Connection.set_trace_callback
+    - the time taken to execute the statement and fetch its rows, and the number of rows
+    - the number of SQLite virtual machine steps, counted with Connection.set_progress_handler
+    - the EXPLAIN QUERY PLAN output, for statements that take longer than the log's threshold
+
+The connections are ordinary sqlite3 connections otherwise, so they can be used in place of sqlite3.connect().
+
+Recording has a cost for every statement and row, so it is off unless asked for. connect() returns a plain
+sqlite3.Connection unless it is given a QueryLog, or the environment variable COMP0035_QUERY_LOG is set to 1, which
+records the statements of every connection from connect() in the module level QUERY_LOG, so one report covers all
+the modules that use it.
+
+Examples:
+
+    conn = connect("para-normalised.db", query_log=QUERY_LOG)
+    conn.execute("SELECT * FROM Games WHERE year = ?", (2012,)).fetchall()
+    conn.close()
+    QUERY_LOG.print_report()
+"""
+import os
+import re
+import sqlite3
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+# Set COMP0035_QUERY_LOG=1 to record the statements of every connection from connect() in QUERY_LOG
+LOG_ALL = os.environ.get("COMP0035_QUERY_LOG", "0") not in ("", "0")
+
+# Number of SQLite virtual machine instructions between calls of the progress handler
+PROGRESS_STEPS = 1000
+
+# Statements that EXPLAIN QUERY PLAN is not run for
+NO_PLAN = re.compile(r"^\s*(EXPLAIN|PRAGMA|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|CREATE|DROP|ALTER|ANALYZE|VACUUM)",
+                     re.IGNORECASE)
+
+
+def normalise_sql(sql):
+    """ Return the SQL with the whitespace collapsed, so the same statement is grouped in the report. """
+    return " ".join(sql.split())
+
+
+@dataclass
+class QueryRecord:
+    """ One statement run on an instrumented connection.
+
+    Attributes:
+        sql: SQL passed to execute
+        expanded_sql: SQL with the parameters filled in, as reported by the trace callback
+        database: Path to the database
+        duration_ns: Time taken to execute the statement plus the time taken fetching its rows
+        rows: Number of rows fetched, or the number of rows changed for INSERT, UPDATE and DELETE
+        vm_steps: Approximate number of SQLite virtual machine instructions, in multiples of PROGRESS_STEPS
+        plan: EXPLAIN QUERY PLAN details, only for statements slower than the log threshold
+    """
+    sql: str
+    expanded_sql: str = None
+    database: str = None
+    duration_ns: int = 0
+    rows: int = 0
+    vm_steps: int = 0
+    plan: list = field(default=None)
+
+    @property
+    def duration_ms(self):
+        return self.duration_ns / 1e6
+
+
+class QueryLog:
+    """ Collects the statements run on instrumented connections.
+
+    Attributes:
+        threshold_ms: Statements slower than this are slow queries and have their query plan recorded
+        records (deque[QueryRecord]): The most recent statements
+    """
+
+    def __init__(self, threshold_ms=10.0, max_records=10_000):
+        self.threshold_ms = threshold_ms
+        self.records = deque(maxlen=max_records)
+
+    def add(self, record):
+        self.records.append(record)
+
+    def clear(self):
+        self.records.clear()
+
+    def slow_queries(self):
+        """ Return the records slower than the threshold, slowest first. """
+        slow = [record for record in self.records if record.duration_ms > self.threshold_ms]
+        return sorted(slow, key=lambda record: record.duration_ns, reverse=True)
+
+    def summary(self):
+        """ Aggregate the records by statement.
+
+        Returns:
+            list[dict]: count, total, mean and max time in ms, and total rows for each statement, by total time
+        """
+        stats = {}
+        for record in self.records:
+            sql = normalise_sql(record.sql)
+            entry = stats.setdefault(sql, {'sql': sql, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0})
+            entry['count'] += 1
+            entry['total_ms'] += record.duration_ms
+            entry['max_ms'] = max(entry['max_ms'], record.duration_ms)
+            entry['rows'] += record.rows
+        for entry in stats.values():
+            entry['mean_ms'] = entry['total_ms'] / entry['count']
+        return sorted(stats.values(), key=lambda entry: entry['total_ms'], reverse=True)
+
+    def print_report(self, top=10, sql_width=70):
+        """ Print the statements that took the most time in total and the query plans of the slow queries. """
+        print(f"{'count':>6} {'total ms':>10} {'mean ms':>10} {'max ms':>10} {'rows':>8}  sql")
+        for entry in self.summary()[:top]:
+            print(f"{entry['count']:>6} {entry['total_ms']:>10.2f} {entry['mean_ms']:>10.2f} {entry['max_ms']:>10.2f}"
+                  f" {entry['rows']:>8}  {entry['sql'][:sql_width]}")
+        slow = self.slow_queries()
+        print(f"\n{len(slow)} statements slower than {self.threshold_ms} ms")
+        for record in slow[:top]:
+            print(f"\n{record.duration_ms:.2f} ms, {record.rows} rows, ~{record.vm_steps} VM steps: "
+                  f"{normalise_sql(record.expanded_sql or record.sql)[:sql_width]}")
+            for detail in record.plan or []:
+                print(f"    {detail}")
+
+
+# Used by the connections created by connect() when COMP0035_QUERY_LOG is set, and by InstrumentedConnection
+QUERY_LOG = QueryLog()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """ Cursor that records the time and rows of each statement in the connection's QueryLog. """
+
+    _record = None
+    _params = ()
+
+    def _start(self, sql):
+        self._record = QueryRecord(sql=sql, database=self.connection.database)
+        self.connection.query_log.add(self._record)
+        self.connection.start_statement()
+        return time.perf_counter_ns()
+
+    def _finish(self, start, rows, params):
+        # params is None for executemany and executescript, which do not get a query plan
+        record = self._record
+        record.duration_ns += time.perf_counter_ns() - start
+        record.rows += rows
+        record.vm_steps += self.connection.steps * PROGRESS_STEPS
+        if record.expanded_sql is None:
+            record.expanded_sql = self.connection.last_traced
+        if record.plan is None and record.duration_ms > self.connection.query_log.threshold_ms:
+            record.plan = self.connection.explain_query_plan(record.sql, params)
+        # Count the steps of the next fetch from here, not including the EXPLAIN
+        self.connection.start_statement()
+
+    def execute(self, sql, parameters=()):
+        start = self._start(sql)
+        self._params = parameters
+        super().execute(sql, parameters)
+        # For a SELECT the rows are counted as they are fetched, rowcount is -1
+        self._finish(start, max(self.rowcount, 0), parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        start = self._start(sql)
+        self._params = None
+        super().executemany(sql, seq_of_parameters)
+        self._finish(start, max(self.rowcount, 0), None)
+        return self
+
+    def executescript(self, sql_script):
+        start = self._start(sql_script)
+        self._params = None
+        super().executescript(sql_script)
+        self._finish(start, 0, None)
+        return self
+
+    def _fetched(self, start, rows):
+        if self._record is not None:
+            self._finish(start, rows, self._params)
+
+    def __next__(self):
+        start = time.perf_counter_ns()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(start, 0)
+            raise
+        self._fetched(start, 1)
+        return row
+
+    def fetchone(self):
+        start = time.perf_counter_ns()
+        row = super().fetchone()
+        self._fetched(start, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter_ns()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter_ns()
+        rows = super().fetchall()
+        self._fetched(start, len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """ sqlite3 connection whose cursors record each statement in query_log.
+
+    Create it with connect(), or sqlite3.connect(db_path, factory=InstrumentedConnection).
+    """
+
+    def __init__(self, database, *args, **kwargs):
+        super().__init__(database, *args, **kwargs)
+        self.database = str(database)
+        self.query_log = QUERY_LOG
+        self.last_traced = None
+        self.steps = 0
+        self._explaining = False
+        self.set_trace_callback(self._trace)
+        self.set_progress_handler(self._progress, PROGRESS_STEPS)
+
+    def _trace(self, statement):
+        if not self._explaining:
+            self.last_traced = statement
+
+    def _progress(self):
+        self.steps += 1
+        return 0  # Any other value aborts the statement
+
+    def start_statement(self):
+        self.steps = 0
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def explain_query_plan(self, sql, params=()):
+        """ Return the query plan details for a statement, or an empty list if it does not have a plan. """
+        if NO_PLAN.match(sql) or params is None:
+            return []
+        self._explaining = True
+        try:
+            cursor = sqlite3.Cursor(self)
+            return [row[3] for row in cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        except sqlite3.Error:
+            return []
+        finally:
+            self._explaining = False
+
+
+def connect(db_path, query_log=None, **kwargs):
+    """ Open a sqlite3 connection, which records its statements if query_log is given or COMP0035_QUERY_LOG is set.
+
+    Args:
+        db_path: Path to the database
+        query_log: QueryLog to record the statements in, defaults to QUERY_LOG if COMP0035_QUERY_LOG is set
+        **kwargs: Other arguments for sqlite3.connect, e.g. isolation_level
+
+    Returns:
+        InstrumentedConnection, or sqlite3.Connection if the statements are not recorded
+    """
+    if query_log is None and not LOG_ALL:
+        return sqlite3.connect(db_path, **kwargs)
+    conn = sqlite3.connect(db_path, factory=InstrumentedConnection, **kwargs)
+    if query_log is not None:
+        conn.query_log = query_log
+    return conn
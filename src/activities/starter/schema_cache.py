@@ -0,0 +1,187 @@
+""" Cache the table definitions of SQLite databases so PRAGMA table_info is not run on every call.
+
+The schema of every table and view in a database is read once, using PRAGMA table_info, PRAGMA foreign_key_list and
+PRAGMA index_list, and kept in memory keyed by the database file. It is read again when the database's PRAGMA
+schema_version changes, which SQLite increments whenever a table, index or trigger is created, altered or dropped.
+
+There are two ways to look up a table:
+
+    - With an open connection: schema_version is checked on that connection, a single cheap PRAGMA.
+    - With the path to the database: the size and modification time of the database file (and its -wal file) are
+      checked first, and the database is only opened to check schema_version if the file has changed.
+
+In-memory databases are not cached, as they are not shared between connections.
+
+Examples:
+
+    get_column_names("para-normalised.db", "Games")
+    get_table_info(conn, "GamesHost").foreign_keys
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from activities.starter.query_log import connect
+
+
+@dataclass
+class TableInfo:
+    """ Definition of a table.
+
+    Attributes:
+        name: Name of the table as it is in the schema
+        columns: Column names, in table order
+        types: Declared type of each column, e.g. {'id': 'INTEGER'}
+        primary_key: Primary key columns, in key order
+        foreign_keys: (columns, referenced table, referenced columns) for each foreign key
+        indexes: Columns of each index, in index order
+        is_view: True for a view, which has columns but no keys or indexes
+    """
+    name: str
+    columns: list
+    types: dict
+    primary_key: tuple
+    foreign_keys: list
+    indexes: list = field(default_factory=list)
+    is_view: bool = False
+
+
+def read_schema(conn):
+    """ Read the definition of every table and view in the database.
+
+    Returns:
+        dict[str, TableInfo]: keyed by lower case name, as SQLite table names are not case-sensitive
+    """
+    tables = {}
+    table_names = conn.execute(
+        "SELECT name, type FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%';").fetchall()
+    for table_name, table_type in table_names:
+        # The pragma functions take the name as a parameter, so a name with quotes in it does not change the SQL.
+        # Each row is (cid, name, type, notnull, default, pk), pk is the position in the primary key or 0
+        table_info = conn.execute("SELECT * FROM pragma_table_info(?);", (table_name,)).fetchall()
+        foreign_keys = {}
+        # Each row is (id, seq, table, from, to, on_update, on_delete, match), composite keys share an id
+        fk_rows = conn.execute("SELECT * FROM pragma_foreign_key_list(?);", (table_name,))
+        for fk_id, _, ref_table, from_col, to_col, *_ in fk_rows:
+            columns, _, ref_columns = foreign_keys.get(fk_id, ((), ref_table, ()))
+            foreign_keys[fk_id] = (columns + (from_col,), ref_table, ref_columns + (to_col,))
+        indexes = []
+        for index_name, in conn.execute("SELECT name FROM pragma_index_list(?);", (table_name,)).fetchall():
+            # The name is NULL for a column of an index on an expression
+            index_info = conn.execute("SELECT name FROM pragma_index_info(?) ORDER BY seqno;", (index_name,))
+            indexes.append(tuple(row[0] for row in index_info))
+        tables[table_name.lower()] = TableInfo(
+            name=table_name,
+            columns=[row[1] for row in table_info],
+            types={row[1]: row[2] for row in table_info},
+            primary_key=tuple(row[1] for row in sorted(table_info, key=lambda row: row[5]) if row[5] > 0),
+            foreign_keys=list(foreign_keys.values()),
+            indexes=indexes,
+            is_view=table_type == 'view',
+        )
+    return tables
+
+
+def file_state(db_path):
+    """ Return the size and modification time of the database file and its write-ahead log, if there is one. """
+    state = []
+    for path in (db_path, db_path.with_name(f"{db_path.name}-wal")):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            state.append(None)
+        else:
+            state.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(state)
+
+
+class SchemaCache:
+    """ Table definitions for each database file, see the module docstring.
+
+    Attributes:
+        hits: Number of lookups answered from memory
+        misses: Number of lookups that read the schema from the database
+    """
+
+    def __init__(self):
+        # Database file path -> (schema_version, file state, tables)
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self._entries.clear()
+
+    def _lookup(self, conn, key):
+        """ Return the cached tables if schema_version on conn is unchanged, otherwise read and cache them. """
+        schema_version = conn.execute("PRAGMA schema_version;").fetchone()[0]
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == schema_version:
+            self.hits += 1
+            return schema_version, entry[2]
+        self.misses += 1
+        return schema_version, read_schema(conn)
+
+    def tables(self, conn):
+        """ Return the definitions of the tables in the database open on conn, see read_schema. """
+        # Each row is (seq, name, file), file is '' for an in-memory database
+        db_file = conn.execute("PRAGMA database_list;").fetchone()[2]
+        if not db_file:
+            self.misses += 1
+            return read_schema(conn)
+        key = str(Path(db_file).resolve())
+        schema_version, tables = self._lookup(conn, key)
+        self._entries[key] = (schema_version, file_state(Path(key)), tables)
+        return tables
+
+    def tables_for_path(self, db_path):
+        """ Return the table definitions for a database file, only opening the database if the file has changed. """
+        key = str(Path(str(db_path)).resolve())
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] == file_state(Path(key)):
+            self.hits += 1
+            return entry[2]
+        conn = connect(key)
+        try:
+            schema_version, tables = self._lookup(conn, key)
+        finally:
+            conn.close()
+        # The file state is recorded after the connection is closed, as closing can checkpoint the -wal file
+        self._entries[key] = (schema_version, file_state(Path(key)), tables)
+        return tables
+
+
+# Shared by all the helpers in the package
+SCHEMA_CACHE = SchemaCache()
+
+
+def get_table_info(db, table_name):
+    """ Return the definition of a table.
+
+    Args:
+        db: Path to the database file, or an open sqlite3 connection or cursor
+        table_name: Name of the table or view, not case-sensitive
+
+    Returns:
+        TableInfo
+
+    Raises:
+        KeyError: If the database does not have the table or view
+    """
+    if hasattr(db, "connection"):
+        db = db.connection
+    if hasattr(db, "execute"):
+        tables = SCHEMA_CACHE.tables(db)
+    else:
+        tables = SCHEMA_CACHE.tables_for_path(db)
+    return tables[table_name.lower()]
+
+
+def get_column_names(db, table_name):
+    """ Return the column names of a table or view, in table order. See get_table_info for the arguments.
+
+    Like PRAGMA table_info, an empty list is returned if the database does not have the table.
+    """
+    try:
+        return list(get_table_info(db, table_name).columns)
+    except KeyError:
+        return []
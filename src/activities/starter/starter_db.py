@@ -1,8 +1,10 @@
 from importlib import resources
 
-import pandas as pd
-
 from activities import data
+from activities.starter.lazy_import import lazy_import
+from activities.starter.workbook_cache import read_workbook
+
+pd = lazy_import("pandas")
 
 
 def read_data_to_df(data_path):
@@ -41,7 +43,6 @@ def read_data_to_df(data_path):
         'highlights': 'string',
         'URL': 'string'
     }
-    df_games = pd.read_excel(data_path, sheet_name="games", dtype=dict_event_dtypes, parse_dates=['start', 'end'])
     # Country code sheet
     dict_code_dtypes = {
         'Code': 'string',
@@ -51,8 +52,12 @@ def read_data_to_df(data_path):
         'MemberType': 'string',
         'Notes': 'string'
     }
-    df_country_codes = pd.read_excel(data_path, sheet_name="team_codes", dtype=dict_code_dtypes)
-    return df_games, df_country_codes
+    # Both sheets are parsed from one read of the workbook, then cached so later calls skip the Excel parsing
+    sheets = read_workbook(data_path, {
+        "games": {'dtype': dict_event_dtypes, 'parse_dates': ['start', 'end']},
+        "team_codes": {'dtype': dict_code_dtypes},
+    })
+    return sheets["games"], sheets["team_codes"]
 
 
 def describe(games_df, codes_df):
@@ -1,9 +1,10 @@
 import importlib.resources
-import sqlite3
-
-import pandas as pd
 
 from activities import data
+from activities.starter.lazy_import import lazy_import
+from activities.starter.query_log import connect
+
+pd = lazy_import("pandas")
 
 
 def print_data(file_path):
@@ -102,7 +103,7 @@ def create_db(schema_path, db_path):
     """
 
     # Create a connection
-    conn = sqlite3.connect(db_path)
+    conn = connect(db_path)
     cursor = conn.cursor()
 
     # Read the SQL schema file
@@ -0,0 +1,167 @@
+""" Read large tables a page at a time, so memory use stays the same however many rows there are.
+
+fetchall() holds every row of the result in memory at once. The functions here return generators instead:
+
+    - iter_rows: runs one query and fetches its rows with fetchmany, a batch at a time
+    - keyset_pages: runs a query for each page, starting after the key of the last row of the previous page:
+
+        SELECT ... FROM playlist_track WHERE (PlaylistId, TrackId) > (?, ?) ORDER BY PlaylistId, TrackId LIMIT ?
+
+      The key is the table's primary key (or rowid), so each page is found with the primary key index. LIMIT with
+      OFFSET would read and skip all the earlier rows for every page. No statement is left open between pages, so
+      the table can be written to while it is read, and reading can stop and later carry on from a saved key.
+    - stream_table and stream_dataframes: the rows of keyset_pages one at a time, or each page as a pandas DataFrame
+
+The rows are the plain tuples that sqlite3 returns.
+
+Examples:
+
+    conn = connect(resources.files(data).joinpath("chinook.db"))
+    for row in stream_table(conn, "playlist_track"):
+        print(row)
+    total = sum(df["UnitPrice"].mul(df["Quantity"]).sum() for df in stream_dataframes(conn, "invoice_items"))
+"""
+import time
+import tracemalloc
+from importlib import resources
+
+from activities import data
+from activities.starter.lazy_import import lazy_import
+from activities.starter.query_log import connect
+from activities.starter.schema_cache import get_table_info
+
+pd = lazy_import("pandas")
+
+DEFAULT_PAGE_SIZE = 500
+
+
+def quote(name):
+    """ Quote a table or column name for use in SQL. """
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def iter_rows(conn, sql, params=(), size=DEFAULT_PAGE_SIZE):
+    """ Run a query and yield its rows, fetching size rows at a time.
+
+    The statement stays open until all the rows have been read or the generator is closed.
+
+    Args:
+        conn: sqlite3 connection
+        sql: SELECT statement
+        params: Query parameters
+        size: Number of rows fetched at a time
+
+    Yields:
+        tuple: each row
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(size):
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def keyset_query(table_name, columns, key, where=None, first_page=False):
+    """ Return the SQL for a page of rows ordered by key, see keyset_pages. """
+    conditions = [f"({where})"] if where else []
+    if not first_page:
+        key_columns = ", ".join(quote(column) for column in key)
+        placeholders = ", ".join("?" * len(key))
+        conditions.append(f"({key_columns}) > ({placeholders})")
+    where_clause = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return (f"SELECT {', '.join(quote(column) for column in columns)} FROM {quote(table_name)}{where_clause}"
+            f" ORDER BY {', '.join(quote(column) for column in key)} LIMIT ?")
+
+
+def keyset_pages(conn, table_name, columns=None, key=None, where=None, params=(), page_size=DEFAULT_PAGE_SIZE,
+                 after=None):
+    """ Yield the rows of a table a page at a time, in key order, see the module docstring.
+
+    Args:
+        conn: sqlite3 connection
+        table_name: Name of the table
+        columns: Columns to select, defaults to all the columns
+        key: Columns that uniquely identify a row, defaults to the primary key or rowid if the table has none
+        where: Optional SQL condition, e.g. "GenreId = ?"
+        params: Parameters for where
+        page_size: Maximum number of rows in a page
+        after: Key of the row to start after, e.g. (3, 1250) for playlist_track, None to start at the beginning
+
+    Yields:
+        list[tuple]: the rows of each page, with the selected columns
+
+    Raises:
+        KeyError: If the database does not have the table
+    """
+    table = get_table_info(conn, table_name)
+    columns = list(columns or table.columns)
+    key = tuple(key or table.primary_key or ("rowid",))
+    # The key columns are needed to find the next page, they are selected after the columns if not among them
+    extra = [column for column in key if column not in columns]
+    selected = columns + extra
+    key_index = [selected.index(column) for column in key]
+    first_sql = keyset_query(table.name, selected, key, where, first_page=True)
+    next_sql = keyset_query(table.name, selected, key, where)
+    while True:
+        if after is None:
+            rows = conn.execute(first_sql, (*params, page_size)).fetchall()
+        else:
+            rows = conn.execute(next_sql, (*params, *after, page_size)).fetchall()
+        if not rows:
+            return
+        after = tuple(rows[-1][i] for i in key_index)
+        yield [row[:len(columns)] for row in rows] if extra else rows
+        if len(rows) < page_size:
+            return
+
+
+def stream_table(conn, table_name, **kwargs):
+    """ Yield the rows of a table one at a time, read a page at a time. See keyset_pages for the arguments. """
+    for page in keyset_pages(conn, table_name, **kwargs):
+        yield from page
+
+
+def stream_dataframes(conn, table_name, columns=None, **kwargs):
+    """ Yield each page of a table as a DataFrame. See keyset_pages for the arguments. """
+    columns = list(columns or get_table_info(conn, table_name).columns)
+    for page in keyset_pages(conn, table_name, columns=columns, **kwargs):
+        yield pd.DataFrame.from_records(page, columns=columns)
+
+
+def measure(function):
+    """ Run function and return the result, seconds taken and peak memory allocated in KiB. """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return result, duration, peak
+
+
+def main():
+    """ Compare fetchall with streaming for the largest tables in chinook.db. """
+    db_path = resources.files(data).joinpath("chinook.db")
+    conn = connect(db_path)
+    # Import pandas before measuring, so its import is not counted in the first stream_dataframes
+    pd.DataFrame()
+    print(f"{'table':<16} {'method':<18} {'rows':>6} {'seconds':>8} {'peak KiB':>9}")
+    for table_name in ("tracks", "playlist_track", "invoice_items"):
+        sql = f"SELECT * FROM {table_name}"
+        # The loop variables are bound as defaults, so each function uses this table even if it is called later
+        methods = {
+            'fetchall': lambda sql=sql: len(conn.execute(sql).fetchall()),
+            'iter_rows': lambda sql=sql: sum(1 for _ in iter_rows(conn, sql)),
+            'stream_table': lambda table=table_name: sum(1 for _ in stream_table(conn, table)),
+            'stream_dataframes': lambda table=table_name: sum(len(df) for df in stream_dataframes(conn, table)),
+        }
+        for method, function in methods.items():
+            rows, duration, peak = measure(function)
+            print(f"{table_name:<16} {method:<18} {rows:>6} {duration:>8.4f} {peak:>9.0f}")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+""" Read sheets from an Excel workbook, keeping a cache of the parsed DataFrames.
+
+Reading .xlsx files with openpyxl is slow. The first time a sheet is read it is parsed from the workbook, with the
+workbook opened only once for all the sheets, and the typed DataFrame is saved as a pickle file. Later reads load
+the pickle file instead, so openpyxl is not used at all.
+
+The cache key includes the workbook path, modification time and size and the options used to parse the sheet
+(e.g. dtype), so editing the workbook or changing the dtypes means the sheet is parsed again.
+
+Loading a pickle file can run code, so the cache is kept in a directory that only the current user can read or write,
+by default ~/.cache/comp0035/workbook_cache (or under XDG_CACHE_HOME). If the directory is shared with other users the
+cache is not used.
+
+Examples:
+
+    from importlib import resources
+
+    from activities import data
+
+    path_raw = resources.files(data).joinpath("paralympics_all_raw.xlsx")
+    sheets = read_workbook(path_raw, {"games": {"dtype": {"year": "Int64"}}, "team_codes": {}})
+    df_games = sheets["games"]
+"""
+import hashlib
+import json
+import os
+import pickle
+import warnings
+from pathlib import Path
+
+from activities.starter.lazy_import import lazy_import
+
+pd = lazy_import("pandas")
+
+# Default location of the cached DataFrames, in the user's own cache directory rather than the shared temp directory
+USER_CACHE_DIR = os.environ.get("XDG_CACHE_HOME") or Path.home().joinpath(".cache")
+CACHE_DIR = Path(USER_CACHE_DIR).joinpath("comp0035", "workbook_cache")
+
+# Key used in place of a sheet name when every sheet in the workbook is read
+ALL_SHEETS = "*"
+
+
+def cache_key(data_path, sheet_name, read_options=None):
+    """ Generate the key for a sheet from the workbook file state and the options used to parse the sheet.
+
+    Args:
+        data_path: Path to the Excel workbook
+        sheet_name: Name of the sheet, or ALL_SHEETS
+        read_options: dict of keyword arguments passed to pd.read_excel, e.g. dtype and parse_dates
+
+    Returns:
+        str: hex digest that changes when the file or the options change
+    """
+    path = Path(data_path).resolve()
+    stat = path.stat()
+    spec = {
+        'path': str(path),
+        'mtime': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sheet': sheet_name,
+        'options': read_options or {},
+        'pandas': pd.__version__,
+    }
+    spec_json = json.dumps(spec, sort_keys=True, default=str)
+    return hashlib.sha256(spec_json.encode()).hexdigest()
+
+
+def _load(cache_file):
+    """ Return the cached object, or None if there is no cache file or it cannot be read. """
+    try:
+        return pd.read_pickle(cache_file)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError, ImportError, AttributeError):
+        return None
+
+
+def private_dir(cache_dir):
+    """ Create the cache directory so only the current user can use it, and check an existing one is not shared.
+
+    Returns:
+        bool: True if the directory is owned by the current user and other users cannot read or write it
+    """
+    cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if os.name != "posix":
+        # Windows user directories are private by default and st_mode does not show the permissions
+        return True
+    stat = cache_dir.stat()
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o077
+
+
+def _save(obj, cache_file):
+    """ Save the object to the cache, writing to a temporary file first so a partial file is never read. """
+    tmp_file = cache_file.with_suffix(".tmp")
+    pd.to_pickle(obj, tmp_file)
+    tmp_file.replace(cache_file)
+
+
+def read_workbook(data_path, sheets=None, use_cache=True, cache_dir=CACHE_DIR):
+    """ Read sheets from an Excel workbook into DataFrames, using the cache where possible.
+
+    Args:
+        data_path: Path to the Excel workbook
+        sheets: dict of sheet name to a dict of keyword arguments for pd.read_excel (e.g. dtype, parse_dates),
+            or None to read every sheet with the default options
+        use_cache: If False the workbook is always parsed and the cache is not updated
+        cache_dir: Directory where the parsed DataFrames are saved
+
+    Returns:
+        dict[str, pd.DataFrame]: DataFrame for each sheet, in the order requested (or workbook order for None)
+    """
+    cache_dir = Path(cache_dir)
+    if use_cache and not private_dir(cache_dir):
+        warnings.warn(f"Not using the workbook cache, {cache_dir} can be read or written by other users")
+        use_cache = False
+    if sheets is None:
+        cache_file = cache_dir.joinpath(f"{cache_key(data_path, ALL_SHEETS)}.pkl")
+        frames = _load(cache_file) if use_cache else None
+        if frames is None:
+            frames = pd.read_excel(data_path, sheet_name=None)
+            if use_cache:
+                _save(frames, cache_file)
+        return frames
+
+    frames = {}
+    missing = {}
+    for sheet_name, read_options in sheets.items():
+        cache_file = cache_dir.joinpath(f"{cache_key(data_path, sheet_name, read_options)}.pkl")
+        frames[sheet_name] = _load(cache_file) if use_cache else None
+        if frames[sheet_name] is None:
+            missing[sheet_name] = cache_file
+
+    if missing:
+        # Open the workbook once for all the sheets that need to be parsed
+        with pd.ExcelFile(data_path) as workbook:
+            for sheet_name, cache_file in missing.items():
+                frames[sheet_name] = pd.read_excel(workbook, sheet_name=sheet_name, **sheets[sheet_name])
+                if use_cache:
+                    _save(frames[sheet_name], cache_file)
+    return frames
+
+
+def clear_cache(cache_dir=CACHE_DIR):
+    """ Delete all the cached DataFrames. """
+    for cache_file in Path(cache_dir).glob("*.pkl"):
+        cache_file.unlink()
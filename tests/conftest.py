@@ -1 +1,41 @@
-# Placeholder for pytest fixtures
\ No newline at end of file
+""" Shared pytest fixtures """
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+
+class QueryCounter:
+    """ The SQL statements run by an engine while counting. """
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@pytest.fixture
+def count_queries():
+    """ Count the queries an engine runs, e.g. to check that related objects are not loaded one query per object.
+
+    Usage:
+        with count_queries(engine) as queries:
+            ...
+        assert queries.count == 3, queries.statements
+    """
+
+    @contextmanager
+    def counting(engine):
+        counter = QueryCounter()
+        event.listen(engine, "before_cursor_execute", counter)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, "before_cursor_execute", counter)
+
+    return counting
@@ -0,0 +1,165 @@
+""" Tests for the students database queries in db_wk8
+
+The related objects should be loaded by a fixed number of queries, however many rows there are (no N+1 queries).
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import InvalidRequestError
+from sqlmodel import SQLModel
+
+from activities.starter.db_engine import create_sqlite_engine, dispose_engines, get_engine
+from activities.starter.db_wk8 import database
+from activities.starter.db_wk8.async_database import (
+    create_db_and_tables_async,
+    get_async_engine,
+    get_async_session_factory,
+)
+from activities.starter.db_wk8.load_test import seed_database
+from activities.starter.db_wk8.models import Course, Location, Student, Teacher
+from activities.starter.db_wk8.repository import AsyncRepository, Repository
+
+
+@pytest.fixture
+def repository():
+    """ Repository for an in-memory students database with generated rows. """
+    engine = create_sqlite_engine(":memory:")
+    SQLModel.metadata.create_all(engine)
+    repository = Repository(engine)
+    seed_database(repository, students=50, teachers=5, courses=10, courses_per_student=3)
+    yield repository
+    engine.dispose()
+
+
+def test_courses_with_people_query_count(repository, count_queries):
+    """
+    GIVEN a database with 10 courses, each with students, teachers and a location
+    WHEN every course is listed with its location, students and teachers
+    THEN there should be 3 queries: courses joined to locations, students and teachers
+    """
+    with count_queries(repository.engine) as queries:
+        courses = repository.courses_with_people()
+        summary = [(course.location.room, len(course.students), len(course.teachers)) for course in courses]
+
+    assert len(summary) == 10
+    assert sum(students for _, students, _ in summary) == 150
+    assert queries.count == 3, queries.statements
+
+
+def test_student_timetable_query_count(repository, count_queries):
+    """
+    GIVEN a student enrolled on 3 courses
+    WHEN the student's timetable is loaded and each course's location is used
+    THEN there should be 3 queries: the student, courses joined to locations, and teachers
+    """
+    with count_queries(repository.engine) as queries:
+        student = repository.student_timetable(1)
+        rooms = [course.location.room for course in student.courses]
+        teachers = list(student.teachers)
+
+    assert len(rooms) == 3
+    assert teachers
+    assert queries.count == 3, queries.statements
+
+
+def test_unloaded_relationship_raises(repository):
+    """
+    GIVEN a student timetable, which does not load the students on each course
+    WHEN the students on a course are used
+    THEN an error should be raised rather than running a query for each course
+    """
+    student = repository.student_timetable(1)
+
+    with pytest.raises(InvalidRequestError, match="lazy='raise'"):
+        _ = student.courses[0].students
+
+
+def test_get_engine_reuses_engine_per_settings(tmp_path):
+    """
+    GIVEN a database file
+    WHEN get_engine is called with the default settings twice, then with echo on, then with wal=True
+    THEN the default calls should share an engine that keeps echo off and the default journal mode, and each other
+        setting should get its own engine
+    """
+    db_path = tmp_path.joinpath("engine.sqlite")
+    try:
+        engine = get_engine(db_path)
+        same_engine = get_engine(db_path)
+        echo_engine = get_engine(db_path, echo=True)
+        with engine.connect() as connection:
+            journal_mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+            foreign_keys = connection.execute(text("PRAGMA foreign_keys")).scalar()
+        wal_engine = get_engine(db_path, wal=True)
+    finally:
+        dispose_engines()
+
+    assert engine is same_engine
+    assert len({id(engine), id(echo_engine), id(wal_engine)}) == 3
+    assert echo_engine.echo and not engine.echo and not wal_engine.echo
+    assert (journal_mode, foreign_keys) == ("delete", 1)
+
+
+def test_get_wal_engine(tmp_path):
+    """
+    GIVEN a database file
+    WHEN the engine is created with wal=True
+    THEN its connections should use WAL mode with synchronous=NORMAL
+    """
+    try:
+        engine = get_engine(tmp_path.joinpath("wal.sqlite"), wal=True)
+        with engine.connect() as connection:
+            journal_mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+            synchronous = connection.execute(text("PRAGMA synchronous")).scalar()
+    finally:
+        dispose_engines()
+
+    assert (journal_mode, synchronous) == ("wal", 1)
+
+
+def test_database_engine_attribute():
+    """
+    GIVEN the students database module
+    WHEN database.engine and an attribute the module does not have are used
+    THEN engine should be the engine from get_engine, and the other attribute should raise AttributeError
+    """
+    try:
+        engine = database.engine
+        same_engine = database.get_engine()
+    finally:
+        dispose_engines()
+
+    assert engine is same_engine
+    assert engine.url.database == str(database.student_db.resolve())
+    with pytest.raises(AttributeError, match="no attribute 'engines'"):
+        _ = database.engines
+
+
+def test_async_repository_enrolls_and_loads_courses():
+    """
+    GIVEN an in-memory aiosqlite database with a student, a teacher and two courses
+    WHEN the student is enrolled on both courses with the AsyncRepository, and read back with their courses loaded
+    THEN the enrollments should list both courses with the teacher, and student.courses should be loaded
+    """
+    async def enroll_and_read():
+        engine = get_async_engine(":memory:")
+        await create_db_and_tables_async(engine)
+        repository = AsyncRepository(get_async_session_factory(engine))
+        await repository.add_all([
+            Location(id=1, room="Room 1"),
+            Teacher(id=1, teacher_name="Teacher 1", teacher_email="teacher1@school.com"),
+            Course(id=1, course_name="Course 1", course_code=1001, location_id=1),
+            Course(id=2, course_name="Course 2", course_code=1002, location_id=1),
+            Student(id=1, student_name="Student 1", student_email="student1@school.com"),
+        ])
+        await repository.enroll(1, 1, 1)
+        await repository.enroll(1, 2, 1)
+        enrollments = await repository.enrollments_for_student(1)
+        student = await repository.get_student(1, load=("courses",))
+        await engine.dispose()
+        return enrollments, student
+
+    enrollments, student = asyncio.run(enroll_and_read())
+
+    assert [(course.id, teacher.id) for course, teacher in enrollments] == [(1, 1), (2, 1)]
+    assert sorted(course.id for course in student.courses) == [1, 2]
@@ -0,0 +1,88 @@
+""" Tests for the trigger-maintained games_flat table """
+import shutil
+import sqlite3
+from importlib import resources
+
+import pytest
+
+from activities import data
+from activities.starter.games_flat import FLAT_SELECT, FLAT_TABLE, create_flat_table, drop_flat_table, query_games
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """ Connection to a copy of para-normalised.db with games_flat and its triggers. """
+    db_path = tmp_path.joinpath("para-normalised.db")
+    shutil.copyfile(resources.files(data).joinpath("para-normalised.db"), db_path)
+    conn = sqlite3.connect(db_path)
+    create_flat_table(conn)
+    yield conn
+    conn.close()
+
+
+def assert_flat_table_current(conn):
+    """ Check that games_flat has the same rows as selecting them from the normalised tables. """
+    flat_rows = conn.execute(f"SELECT * FROM {FLAT_TABLE} ORDER BY games_id").fetchall()
+    normalised_rows = conn.execute(f"{FLAT_SELECT} ORDER BY g.id").fetchall()
+    assert flat_rows == normalised_rows
+
+
+def test_triggers_update_games_flat_for_each_table(conn):
+    """
+    GIVEN games_flat with its triggers
+    WHEN a host, a country and a disability are renamed, a games with a host is added and a disability is removed
+    THEN games_flat should match the normalised tables after each change
+    """
+    changes = [
+        "UPDATE Host SET place_name = 'London (Stratford)' WHERE id = 17",
+        "UPDATE Country SET country = 'Great Britain' WHERE id = 7",
+        "UPDATE Disability SET description = 'Visual Impairment' WHERE id = 3",
+        "INSERT INTO Games (id, type, year) VALUES (100, 'summer', 2032)",
+        "INSERT INTO GamesHost (games_id, host_id) VALUES (100, 17)",
+        "DELETE FROM GamesDisability WHERE games_id = 14 AND disability_id = 3",
+    ]
+    for sql in changes:
+        with conn:
+            conn.execute(sql)
+        assert_flat_table_current(conn)
+
+    assert query_games(conn, {"year": 2012}, columns=["country", "host"]) == [("Great Britain", "London (Stratford)")]
+    assert query_games(conn, {"games_id": 100}, columns=["host"]) == [("London (Stratford)",)]
+
+
+def test_trigger_removes_deleted_games(conn):
+    """
+    GIVEN games_flat with its triggers
+    WHEN a games is deleted
+    THEN its games_flat row should be deleted
+    """
+    with conn:
+        conn.execute("DELETE FROM Games WHERE year = 2012")
+
+    assert_flat_table_current(conn)
+    assert query_games(conn, {"year": 2012}) == []
+
+
+def test_query_games_same_rows_without_flat_table(conn):
+    """
+    GIVEN a database with games_flat
+    WHEN the summer 2012 games are queried, then games_flat is dropped and they are queried again
+    THEN both queries should return the same row
+    """
+    filters = {"type": "summer", "year": 2012}
+    flat_rows = query_games(conn, filters)
+    drop_flat_table(conn)
+    normalised_rows = query_games(conn, filters)
+
+    assert len(flat_rows) == 1
+    assert flat_rows == normalised_rows
+
+
+def test_query_games_rejects_unknown_columns(conn):
+    """
+    GIVEN a database with games_flat
+    WHEN a filter uses a name that is not a games_flat column
+    THEN a ValueError should be raised and nothing run
+    """
+    with pytest.raises(ValueError, match="year = 2012 OR 1"):
+        query_games(conn, {"year = 2012 OR 1": 1})
@@ -0,0 +1,257 @@
+""" Tests for the paralympics loader in activities.starter.paralympics_add_data
+
+The tests use a small schema matching the paralympics database and a few rows of made up data.
+"""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from activities.starter.paralympics_add_data import (LoaderSession, batched, dataframe_to_rows, diff_rows,
+                                                     fingerprint_rows, get_country_df, get_insert_sql,
+                                                     insert_data_bulk, insert_team_data)
+
+SCHEMA = """
+CREATE TABLE games (id INTEGER PRIMARY KEY, type TEXT, year INTEGER, start TEXT, end TEXT, countries INTEGER,
+    events INTEGER, sports INTEGER, participants_m INTEGER, participants_f INTEGER, participants INTEGER,
+    highlights TEXT, URL TEXT);
+CREATE TABLE country (id INTEGER PRIMARY KEY, country TEXT NOT NULL);
+CREATE TABLE disability (id INTEGER PRIMARY KEY, description TEXT NOT NULL);
+CREATE TABLE team (code TEXT PRIMARY KEY, name TEXT NOT NULL, region TEXT, sub_region TEXT, member_type TEXT,
+    notes TEXT, country_id INTEGER REFERENCES country (id));
+CREATE TABLE host (id INTEGER PRIMARY KEY, place_name TEXT NOT NULL, country_id INTEGER REFERENCES country (id));
+CREATE TABLE gamesdisability (id INTEGER PRIMARY KEY, games_id INTEGER NOT NULL REFERENCES games (id),
+    disability_id INTEGER NOT NULL REFERENCES disability (id));
+CREATE TABLE gameshost (id INTEGER PRIMARY KEY, games_id INTEGER NOT NULL REFERENCES games (id),
+    host_id INTEGER NOT NULL REFERENCES host (id));
+"""
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """ Path to an empty paralympics database. """
+    path = tmp_path.joinpath("paralympics.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def df_games():
+    """ Rows in the format of the games sheet. """
+    return pd.DataFrame({
+        'type': ['summer', 'winter', 'summer'],
+        'year': pd.array([2012, 2014, 2016], dtype='Int64'),
+        'country': ['UK', 'Russia', 'Brazil'],
+        'host': ['London', 'Sochi', 'Rio de Janeiro'],
+        'start': ['29/08/2012', '07/03/2014', '07/09/2016'],
+        'end': ['09/09/2012', '16/03/2014', '18/09/2016'],
+        'disabilities_included': ['Spinal injury, Amputee', 'Amputee', 'Spinal injury, Vision Impairment'],
+        'countries': pd.array([164, 45, None], dtype='Int64'),
+        'events': pd.array([503, 72, 528], dtype='Int64'),
+        'sports': pd.array([20, 5, 22], dtype='Int64'),
+        'participants_m': pd.array([2736, 418, 2657], dtype='Int64'),
+        'participants_f': pd.array([1501, 129, 1671], dtype='Int64'),
+        'participants': pd.array([4237, 547, 4328], dtype='Int64'),
+        'highlights': ['London', None, 'Rio'],
+        'URL': ['https://www.paralympic.org/london-2012', None, None],
+    })
+
+
+@pytest.fixture
+def df_codes():
+    """ Rows in the format of the team codes sheet, China's name does not match a country in df_games. """
+    return pd.DataFrame({
+        'Code': ['GBR', 'BRA', 'CHN'],
+        'Name': ['Great Britain', 'Brazil', "People's Republic of China"],
+        'Region': ['Europe', 'America', 'Asia'],
+        'SubRegion': [None, 'South America', 'East Asia'],
+        'MemberType': ['country', 'country', 'country'],
+        'Notes': [None, None, None],
+    })
+
+
+def read_rows(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(sql).fetchall()
+    conn.close()
+    return rows
+
+
+def test_bulk_insert_loads_every_row_once(db_path, df_games):
+    """ Test that the bulk loader inserts every row in batches and skips a table that already has data
+
+    GIVEN an empty games table and 3 games rows, one with a missing countries value
+    WHEN the rows are bulk inserted in batches of 2, then inserted again
+    THEN the table should have 3 rows with NULL for the missing value, and the journal mode should be unchanged
+    """
+    first = insert_data_bulk(db_path, df_games, "games", batch_size=2)
+    second = insert_data_bulk(db_path, df_games, "games", batch_size=2)
+
+    conn = sqlite3.connect(db_path)
+    row_count = conn.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+    missing = conn.execute("SELECT countries FROM games WHERE year = 2016").fetchone()[0]
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.close()
+
+    assert (first, second) == (3, 0)
+    assert row_count == 3
+    assert missing is None
+    assert journal_mode == "delete"
+
+
+def test_insert_helpers(db_path, df_games):
+    """ Test the helpers used to build the executemany calls
+
+    GIVEN the games table and rows
+    WHEN the INSERT statement, rows and batches are generated
+    THEN the id column should be left out, missing values should be None and the batches at most 2 rows
+    """
+    conn = sqlite3.connect(db_path)
+    cols, sql = get_insert_sql(conn.cursor(), "games")
+    conn.close()
+
+    rows = dataframe_to_rows(df_games, cols)
+    batches = list(batched(rows, 2))
+
+    assert "id" not in cols
+    assert sql.startswith("INSERT INTO games (type, year")
+    assert rows[1][cols.index('highlights')] is None
+    assert [len(batch) for batch in batches] == [2, 1]
+
+
+def test_fingerprint_rows_ignores_dtype_differences():
+    """ Test that rows with the same values have the same fingerprint, whatever the dtype
+
+    GIVEN the same rows as Int64 and as Python objects read from SQLite, and a row with a changed value
+    WHEN the rows are fingerprinted
+    THEN the first two should be equal and the changed row different
+    """
+    source = pd.DataFrame({'year': pd.array([2012, None], dtype='Int64'), 'type': ['summer', 'winter']})
+    existing = pd.DataFrame({'year': [2012, None], 'type': ['summer', 'winter']}, dtype=object)
+    changed = pd.DataFrame({'year': pd.array([2012, 2014], dtype='Int64'), 'type': ['summer', 'winter']})
+
+    assert list(fingerprint_rows(source)) == list(fingerprint_rows(existing))
+    assert list(fingerprint_rows(source))[1] != list(fingerprint_rows(changed))[1]
+
+
+def test_diff_rows_finds_new_changed_and_deleted_rows():
+    """
+    GIVEN source rows for 2012 (changed), 2016 (new) and database rows for 2012 and 2008 (no longer in the source)
+    WHEN the rows are compared on year
+    THEN there should be one new, one changed and one deleted row
+    """
+    source = pd.DataFrame({'year': [2012, 2016], 'events': [503, 528]})
+    existing = pd.DataFrame({'year': [2012, 2008], 'events': [500, 472]}, dtype=object)
+
+    new, changed, deleted = diff_rows(source, existing, ['year'])
+
+    assert new['year'].tolist() == [2016]
+    assert changed['year'].tolist() == [2012]
+    assert deleted['year'].tolist() == [2008]
+
+
+def test_apply_delta_upserts_changed_rows(db_path, df_games):
+    """
+    GIVEN a loaded games table
+    WHEN the events value of one game is changed, a game is added and one is removed, and the delta applied
+    THEN only those rows should change, and the unchanged games should keep their ids
+    """
+    insert_data_bulk(db_path, df_games, "games")
+    ids_before = dict(read_rows(db_path, "SELECT year, id FROM games"))
+    df_update = df_games[df_games['year'] != 2014].copy()
+    df_update.loc[df_update['year'] == 2012, 'events'] = 999
+    df_update.loc[len(df_games)] = df_games.iloc[0].copy()
+    df_update.loc[len(df_games), 'year'] = 2020
+
+    with LoaderSession(db_path) as session:
+        with session.transaction():
+            new, changed, deleted = session.upsert_data(df_update, "games", delete_missing=True)
+
+    rows = dict(read_rows(db_path, "SELECT year, events FROM games"))
+    ids_after = dict(read_rows(db_path, "SELECT year, id FROM games"))
+    assert (len(new), len(changed), len(deleted)) == (1, 1, 1)
+    assert rows == {2012: 999, 2016: 528, 2020: 503}
+    assert ids_after[2016] == ids_before[2016]
+
+
+def test_incremental_load_relinks_unchanged_team_to_new_country(db_path, df_games, df_codes):
+    """
+    GIVEN a loaded database where team CHN has no country as China is not in the games data
+    WHEN a game hosted in China is added and the load is run incrementally, with the team codes unchanged
+    THEN team CHN should be linked to the new country
+    """
+    with LoaderSession(db_path) as session:
+        session.load(df_games, df_codes)
+    df_games_2 = pd.concat([df_games, df_games.iloc[[0]].assign(year=2008, country='China', host='Beijing')],
+                           ignore_index=True)
+
+    with LoaderSession(db_path) as session:
+        session.load_incremental(df_games_2, df_codes)
+
+    rows = read_rows(db_path, "SELECT t.code, c.country FROM team t LEFT JOIN country c ON t.country_id = c.id")
+    assert dict(rows) == {'GBR': 'UK', 'BRA': 'Brazil', 'CHN': 'China'}
+
+
+def test_failed_stage_rolls_back_only_that_stage(db_path, df_games):
+    """
+    GIVEN a session transaction with a games stage that succeeds and a country stage that raises an error
+    WHEN the error is handled and the transaction committed
+    THEN the games rows should be saved and the country rows rolled back
+    """
+    with LoaderSession(db_path) as session:
+        with session.transaction():
+            with session.stage("games"):
+                session.insert_data(df_games, "games")
+            with pytest.raises(ValueError):
+                with session.stage("country"):
+                    session.insert_data(get_country_df(df_games), "country")
+                    raise ValueError("country stage failed")
+
+    assert read_rows(db_path, "SELECT COUNT(*) FROM games") == [(3,)]
+    assert read_rows(db_path, "SELECT COUNT(*) FROM country") == [(0,)]
+    assert "country" not in session.timings
+
+
+def test_module_functions_share_the_session_transaction(db_path, df_games, df_codes):
+    """
+    GIVEN a LoaderSession with an open transaction
+    WHEN games and teams are inserted with the module level functions and then the transaction fails
+    THEN neither table should have any rows, as both used the session's transaction
+    """
+    with pytest.raises(RuntimeError):
+        with LoaderSession(db_path) as session:
+            with session.transaction():
+                insert_data_bulk(session, df_games, "games")
+                insert_team_data(session, df_codes)
+                assert read_rows(db_path, "SELECT COUNT(*) FROM team") == [(0,)]
+                raise RuntimeError("load failed")
+
+    assert read_rows(db_path, "SELECT COUNT(*) FROM games") == [(0,)]
+    assert read_rows(db_path, "SELECT COUNT(*) FROM team") == [(0,)]
+
+
+def test_host_and_association_ids_are_resolved(db_path, df_games, df_codes):
+    """
+    GIVEN the games rows, with two disabilities listed for 2012 and 2016
+    WHEN the full load is run
+    THEN each host should have the id of its country, and the association rows the ids of the matching games,
+        hosts and disabilities
+    """
+    with LoaderSession(db_path) as session:
+        session.load(df_games, df_codes)
+
+    hosts = read_rows(db_path, "SELECT h.place_name, c.country FROM host h JOIN country c ON h.country_id = c.id")
+    games_hosts = read_rows(db_path, """SELECT g.year, h.place_name FROM gameshost gh
+                                        JOIN games g ON gh.games_id = g.id JOIN host h ON gh.host_id = h.id""")
+    games_disabilities = read_rows(db_path, """SELECT g.year, d.description FROM gamesdisability gd
+                                               JOIN games g ON gd.games_id = g.id
+                                               JOIN disability d ON gd.disability_id = d.id""")
+    assert sorted(hosts) == [('London', 'UK'), ('Rio de Janeiro', 'Brazil'), ('Sochi', 'Russia')]
+    assert sorted(games_hosts) == [(2012, 'London'), (2014, 'Sochi'), (2016, 'Rio de Janeiro')]
+    assert sorted(games_disabilities) == [(2012, 'Amputee'), (2012, 'Spinal injury'), (2014, 'Amputee'),
+                                          (2016, 'Spinal injury'), (2016, 'Vision Impairment')]
+    # The joins would hide rows whose ids did not resolve, so the rows are counted too
+    assert read_rows(db_path, "SELECT COUNT(*) FROM gameshost") == [(3,)]
+    assert read_rows(db_path, "SELECT COUNT(*) FROM gamesdisability") == [(5,)]
@@ -3,9 +3,15 @@
 Note: Some test cases are trivial or contrived, focus on learning how to structure and write the tests rather
 than on what is being tested!
 """
+import sqlite3
+
+import pytest
 from sqlmodel import Session, select
 
-from activities.starter.playing_cards import CardModel, Deck, Rank, Suit, create_cards_db
+from activities.starter.card_simulation import run_simulation
+from activities.starter.db_engine import dispose_engines
+from activities.starter.playing_cards import (CardModel, CompactDeck, Deck, Rank, Suit, add_decks, create_cards_db,
+                                              create_cards_db_bulk)
 
 
 def test_suit_returns_suitstring():
@@ -48,6 +54,90 @@ def test_deal_hand_return_amount():
     assert len(hand) == hand_size
 
 
+def test_compact_deck_deal_hand_return_amount():
+    """ Test that the compact deck deals the number of cards asked for and removes them from the deck
+
+    GIVEN a shuffled compact deck
+    WHEN the deal_hand method is called
+    THEN it should return the amount of cards specified and leave the rest in the deck
+    """
+    deck = CompactDeck(seed=1)
+    deck.shuffle()
+    hand_size = 7
+
+    hand = deck.deal_hand(hand_size)
+
+    assert len(hand) == hand_size
+    assert len(deck) == 52 - hand_size
+
+
+def test_compact_deck_shuffle_is_reproducible():
+    """ Test that two compact decks with the same seed are shuffled into the same order
+
+    GIVEN two compact decks with the same seed
+    WHEN both are shuffled
+    THEN they should contain the same 52 cards in the same order
+    """
+    deck_1 = CompactDeck(seed=42)
+    deck_2 = CompactDeck(seed=42)
+
+    deck_1.shuffle()
+    deck_2.shuffle()
+
+    assert deck_1.cards.tolist() == deck_2.cards.tolist()
+    assert sorted(deck_1.cards.tolist()) == list(range(52))
+
+
+def test_compact_deck_hand_unchanged_by_reshuffle():
+    """ Test that a dealt hand is not changed by shuffling the deck again
+
+    GIVEN a hand dealt from a shuffled CompactDeck
+    WHEN the deck is reset and shuffled
+    THEN the hand should still have the same cards
+    """
+    deck = CompactDeck(seed=1)
+    deck.shuffle()
+    hands = deck.deal_hands(4, 5)
+    dealt = hands.tolist()
+
+    deck.reset()
+    deck.shuffle()
+
+    assert hands.tolist() == dealt
+
+
+def test_simulation_same_seed_same_counts():
+    """ Test that the simulation gives the same counts for the same seed whatever the number of processes
+
+    Not a unit test!
+
+    GIVEN a number of hands and a seed
+    WHEN the simulation is run in this process and in two worker processes
+    THEN the counts should be the same and include every hand
+    """
+    n_hands = 5000
+
+    stats_1 = run_simulation(n_hands, workers=1, seed=7)
+    stats_2 = run_simulation(n_hands, workers=2, seed=7)
+
+    assert stats_1 == stats_2
+    assert stats_1.hands == n_hands
+    assert stats_1.suit_counts.sum() == n_hands * 5
+
+
+def test_simulation_hand_larger_than_decks():
+    """ Test that a hand with more cards than the decks raises an error before any hands are dealt
+
+    GIVEN a hand size of 53 with one deck, and 105 with two decks
+    WHEN the simulation is run
+    THEN a ValueError should be raised
+    """
+    with pytest.raises(ValueError, match="between 1 and 52"):
+        run_simulation(10, workers=1, hand_size=53)
+    with pytest.raises(ValueError, match="between 1 and 104"):
+        run_simulation(10, workers=1, hand_size=105, decks=2)
+
+
 def test_deck_cards_count():
     """ Test that the deck cards count returns the correct number of cards
 
@@ -102,3 +192,57 @@ def test_select_returns_cards():
         assert len(cards) == 52
 
 
+def test_bulk_create_multiple_decks():
+    """ Test that the bulk loader adds complete decks that share the suit and rank rows
+
+    Not a unit test!
+
+    GIVEN a database in memory created with 3 decks
+    WHEN 2 more decks are added
+    THEN there should be 5 decks of 52 cards, numbered 1 to 5, and only 4 suits and 13 ranks
+    """
+    engine = create_cards_db_bulk(db_path=":memory:", decks=3)
+    added = add_decks(engine, decks=2)
+    with Session(engine) as session:
+        cards = session.exec(select(CardModel)).all()
+        assert added == [4, 5]
+        assert len(cards) == 5 * 52
+        assert {card.deck for card in cards} == {1, 2, 3, 4, 5}
+        assert len(session.exec(select(Suit)).all()) == 4
+        assert len(session.exec(select(Rank)).all()) == 13
+
+
+def test_bulk_create_updates_old_cards_database(tmp_path):
+    """ Test that a cards database from before deck was added to the primary key is updated, not broken
+
+    Not a unit test!
+
+    GIVEN a database file with a cardmodel table without a deck column, one card and only two of the suits
+    WHEN a deck is added with create_cards_db_bulk
+    THEN the old card should be deck 1, the new deck should be deck 2, and the missing suits added with new ids
+    """
+    db_path = tmp_path.joinpath("old_deck.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE suit (suit_id INTEGER PRIMARY KEY, suit VARCHAR NOT NULL);
+        CREATE TABLE rank (rank_id INTEGER PRIMARY KEY, rank VARCHAR NOT NULL);
+        CREATE TABLE cardmodel (rank_id INTEGER REFERENCES rank (rank_id), suit_id INTEGER REFERENCES suit (suit_id),
+                                PRIMARY KEY (rank_id, suit_id));
+        INSERT INTO suit VALUES (7, 'Hearts'), (9, 'Clubs');
+        INSERT INTO rank VALUES (1, 'Ace');
+        INSERT INTO cardmodel VALUES (1, 7);
+    """)
+    conn.close()
+
+    engine = create_cards_db_bulk(db_path=db_path)
+    with Session(engine) as session:
+        cards = session.exec(select(CardModel)).all()
+        decks = {(card.deck, card.suit.suit, card.rank.rank) for card in cards}
+        suit_ids = {suit.suit: suit.suit_id for suit in session.exec(select(Suit))}
+    dispose_engines()
+
+    assert len(cards) == 1 + 52
+    assert (1, 'Hearts', 'Ace') in decks
+    assert len({(suit, rank) for deck, suit, rank in decks if deck == 2}) == 52
+    assert suit_ids['Hearts'] == 7 and suit_ids['Clubs'] == 9
+    assert len(set(suit_ids.values())) == 4
@@ -0,0 +1,41 @@
+""" Tests for the practise date parsing and plotting functions """
+import pandas as pd
+
+from activities.solutions import practise
+
+
+def test_parse_date_column_uses_the_current_values():
+    """ Test that a date column changed after it was parsed is parsed again with the new values
+
+    GIVEN a DataFrame with a day first start column that has been parsed
+    WHEN a value in the column is changed and the column is parsed again
+    THEN the parsed column should have the new date
+    """
+    df = pd.DataFrame({'start': ["18/09/1960", "03/11/1964"], 'participants': [209, 375]})
+    practise.parse_date_column(df, "start")
+
+    df.loc[1, 'start'] = "04/11/1968"
+    dates = practise.parse_date_column(df, "start")
+
+    assert dates.iloc[1] == pd.Timestamp(1968, 11, 4)
+
+
+def test_parse_date_columns_parses_once_for_the_plots(tmp_path):
+    """ Test that the date columns are parsed at load time and the plots use them as they are
+
+    GIVEN a DataFrame with day first start and end columns and two rows on the same date
+    WHEN the date columns are parsed and the participants plotted
+    THEN the source DataFrame should be unchanged, the parsed columns datetimes, and the plot saved
+    """
+    df = pd.DataFrame({'start': ["18/09/1960", "18/09/1960", "03/11/1964"],
+                       'end': ["25/09/1960", "25/09/1960", "12/11/1964"],
+                       'participants': [100, 109, 375]})
+
+    df_parsed = practise.parse_date_columns(df)
+    practise.plot_timeseries(df_parsed, savepath=tmp_path.joinpath("plot.png"), show=False)
+
+    assert df.loc[0, 'start'] == "18/09/1960"
+    assert pd.api.types.is_datetime64_any_dtype(df_parsed['start'])
+    assert df_parsed.loc[2, 'end'] == pd.Timestamp(1964, 11, 12)
+    assert practise.parse_date_column(df_parsed, "start").equals(df_parsed['start'])
+    assert tmp_path.joinpath("plot.png").is_file()
@@ -0,0 +1,140 @@
+""" Tests for the practise_2 cleaning functions """
+import logging
+from importlib import resources
+
+import pandas as pd
+import pytest
+
+from activities import data
+from activities.solutions import practise_2
+
+
+@pytest.fixture
+def df_raw():
+    return pd.read_csv(resources.files(data).joinpath("paralympics_raw.csv"))
+
+
+def change_types_before(df):
+    """ change_types as it was before it was schema driven, without the prints """
+    for col in ['countries', 'events', 'participants_m', 'participants_f', 'participants']:
+        df[col] = df[col].astype('int64')
+    for col in ['start', 'end']:
+        df[col] = pd.to_datetime(df[col], dayfirst=True)
+    return df
+
+
+def test_change_types_matches_previous_version(df_raw):
+    """ Test that change_types gives the same values and dtypes as before, apart from the downcast integers
+
+    GIVEN the raw paralympics data with the useful columns and no missing values
+    WHEN the types are changed by change_types, with and without downcasting, and by the previous version
+    THEN without downcasting the DataFrames should be equal, and with it only the integer widths should differ
+    """
+    df = practise_2.remove_rows_with_missing_values(practise_2.select_useful_columns(df_raw))
+    expected = change_types_before(df.copy())
+
+    df_exact = practise_2.change_types(df, downcast=False)
+    df_downcast = practise_2.change_types(df)
+
+    pd.testing.assert_frame_equal(df_exact, expected)
+    pd.testing.assert_frame_equal(df_downcast, expected, check_dtype=False)
+    for col in practise_2.TYPE_SCHEMA:
+        assert df_downcast[col].dtype.kind == "i"
+        assert df_downcast[col].dtype.itemsize < 8
+
+
+def test_parse_dates_remembers_formats_only_in_the_given_dict():
+    """ Test that a detected date format is only reused by calls that share the same dict
+
+    GIVEN a day first 'start' column parsed with a date_formats dict
+    WHEN a year first 'start' column is parsed without the dict
+    THEN both should be parsed correctly and the dict should only have the day first format
+    """
+    date_formats = {}
+    day_first = pd.Series(["18/09/1960", "03/11/1964"], name="start")
+    year_first = pd.Series(["1960-09-18", "1964-11-03"], name="start")
+
+    parsed_day_first = practise_2.parse_dates(day_first, date_formats)
+    parsed_year_first = practise_2.parse_dates(year_first)
+
+    assert parsed_day_first.equals(parsed_year_first)
+    assert parsed_day_first.iloc[1] == pd.Timestamp(1964, 11, 3)
+    assert date_formats == {'start': '%d/%m/%Y'}
+
+
+def test_streaming_output_matches_in_memory_output(df_raw, tmp_path):
+    """ Test that cleaning the CSV in chunks writes the same file as cleaning it all at once
+
+    GIVEN the raw paralympics CSV and an output file left from an earlier run
+    WHEN it is cleaned in memory and saved, and cleaned in chunks of 7 rows
+    THEN the two output files should be the same
+    """
+    csv_file = resources.files(data).joinpath("paralympics_raw.csv")
+    expected_file = tmp_path.joinpath("expected.csv")
+    output_file = tmp_path.joinpath("output.csv")
+    output_file.write_text("left from an earlier run\n" * 500)
+    df = practise_2.new_columns(practise_2.deep_clean(df_raw))
+    df.set_index('type').to_csv(expected_file)
+
+    rows = practise_2.deep_clean_streaming(csv_file, output_file, chunksize=7)
+
+    assert rows == len(df)
+    assert output_file.read_text() == expected_file.read_text()
+
+
+def test_streaming_without_chunks_replaces_output(tmp_path, monkeypatch):
+    """ Test that the output file is replaced when there are no chunks to write
+
+    GIVEN a reader that returns no chunks and an output file left from an earlier run
+    WHEN the CSV is cleaned in chunks
+    THEN no rows should be written and the output file should be empty
+    """
+    monkeypatch.setattr(practise_2, "iter_useful_columns", lambda csv_file, chunksize: iter([]))
+    output_file = tmp_path.joinpath("output.csv")
+    output_file.write_text("left from an earlier run\n")
+
+    rows = practise_2.deep_clean_streaming(tmp_path.joinpath("raw.csv"), output_file)
+
+    assert rows == 0
+    assert output_file.read_text() == ""
+
+
+def test_run_stage_logs_metrics(df_raw, caplog):
+    """ Test that each stage logs one INFO line with its metrics
+
+    GIVEN the raw paralympics data with the useful columns
+    WHEN the rows with missing values are removed by run_stage with INFO logging on
+    THEN one INFO record should have the rows in and out and the missing values dropped
+    """
+    df = practise_2.select_useful_columns(df_raw)
+
+    with caplog.at_level(logging.INFO, logger=practise_2.__name__):
+        df_out = practise_2.run_stage("remove_rows_with_missing_values", practise_2.remove_rows_with_missing_values, df)
+
+    assert len(caplog.records) == 1
+    metrics = caplog.records[0].stage_metrics
+    assert (metrics['rows_in'], metrics['rows_out']) == (len(df), len(df_out))
+    assert metrics['nulls_dropped'] == practise_2.count_missing(df) > 0
+    assert "stage=remove_rows_with_missing_values" in caplog.text
+
+
+def test_pipeline_matches_stages_run_in_turn(df_raw):
+    """ Test that the pipeline gives the same DataFrame as calling the stages one after another, and deep_clean
+
+    GIVEN the raw paralympics data
+    WHEN it is cleaned by a CleaningPipeline that tracks memory, by deep_clean, and by calling each stage on a copy
+    THEN the three DataFrames should be equal, the raw data unchanged, and there should be a report for each stage
+    """
+    df_before = df_raw.copy()
+    expected = df_raw.copy()
+    for _, func in practise_2.DEEP_CLEAN_STAGES:
+        expected = func(expected)
+
+    pipeline = practise_2.CleaningPipeline(practise_2.DEEP_CLEAN_STAGES, track_memory=True)
+    df_pipeline = pipeline.run(df_raw)
+    df_deep_clean = practise_2.deep_clean(df_raw)
+
+    pd.testing.assert_frame_equal(df_pipeline, expected)
+    pd.testing.assert_frame_equal(df_deep_clean, expected)
+    pd.testing.assert_frame_equal(df_raw, df_before)
+    assert [report['stage'] for report in pipeline.report] == [name for name, _ in practise_2.DEEP_CLEAN_STAGES]
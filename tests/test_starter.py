@@ -1 +1,419 @@
-# Placeholder for unit tests
\ No newline at end of file
+""" Tests for the starter activities """
+import json
+import os
+import pickle
+import shutil
+import sqlite3
+import stat
+import subprocess
+import sys
+from importlib import resources
+
+import pandas as pd
+
+import pytest
+
+from activities import data
+from activities.starter.compare_queries import QUERY_N, WORKLOADS, compare_paralympics_queries
+from activities.starter.dataframe_reader import read_query, read_table
+from activities.starter.cq_docstring import get_column_names_g
+from activities.starter.import_benchmark import print_report as print_import_report
+from activities.starter.index_advisor import create_indexes, explain_query_plan, recommend_indexes
+from activities.starter.lazy_import import lazy_import
+from activities.starter.query_cache import QueryCache
+from activities.starter import query_log
+from activities.starter.query_log import QueryLog, connect
+from activities.starter.schema_cache import get_table_info
+from activities.starter.streaming_query import keyset_pages, stream_table
+from activities.starter.workbook_cache import read_workbook
+
+
+def test_stream_table_composite_key_returns_all_rows():
+    """ Test that streaming a table with a two column primary key returns every row once, in key order
+
+    GIVEN the playlist_track table in chinook.db, which has the primary key (PlaylistId, TrackId)
+    WHEN the table is streamed in pages of 1000 rows
+    THEN the rows should be the same as selecting the whole table ordered by the key
+    """
+    conn = sqlite3.connect(resources.files(data).joinpath("chinook.db"))
+    expected = conn.execute("SELECT * FROM playlist_track ORDER BY PlaylistId, TrackId").fetchall()
+
+    rows = list(stream_table(conn, "playlist_track", page_size=1000))
+    pages = list(keyset_pages(conn, "playlist_track", page_size=1000))
+    conn.close()
+
+    assert rows == expected
+    assert max(len(page) for page in pages) == 1000
+
+
+def test_read_table_uses_declared_types():
+    """ Test that the DataFrame columns have dtypes from the declared column types, however many chunks are read
+
+    GIVEN the tracks table in chinook.db, where Composer is NVARCHAR(220) and has nulls
+    WHEN the table is read in one chunk and in chunks of 500 rows
+    THEN the DataFrames should be the same, with nullable Int64 and string columns
+    """
+    conn = sqlite3.connect(resources.files(data).joinpath("chinook.db"))
+
+    df = read_table(conn, "tracks")
+    df_chunked = read_query(conn, "SELECT * FROM tracks", table_name="tracks", chunk_size=500)
+    conn.close()
+
+    assert df.equals(df_chunked)
+    assert df["TrackId"].dtype == "Int64"
+    assert df["Composer"].dtype == "string"
+    assert df["Composer"].isna().any()
+
+
+def test_read_table_keeps_bad_dates_and_quotes_names():
+    """ Test that a DATE column with a value that is not a date keeps the value, and that names are quoted
+
+    GIVEN a table named "order items" with columns named "when" and "group", and 'n/a' in the DATE column
+    WHEN the table is read, then read again after the 'n/a' row is deleted
+    THEN the first read should keep 'n/a' and the second should have a datetime column
+    """
+    conn = sqlite3.connect(":memory:")
+    conn.execute('CREATE TABLE "order items" (id INTEGER PRIMARY KEY, "when" DATE, "group" TEXT)')
+    conn.executemany('INSERT INTO "order items" VALUES (?, ?, ?)',
+                     [(1, "2020-01-02", "a"), (2, "n/a", None), (3, None, "c")])
+
+    df_bad = read_table(conn, "order items")
+    conn.execute('DELETE FROM "order items" WHERE id = 2')
+    df_good = read_table(conn, "order items")
+    conn.close()
+
+    assert df_bad["when"].tolist()[:2] == ["2020-01-02", "n/a"]
+    assert not pd.api.types.is_datetime64_any_dtype(df_bad["when"])
+    assert df_good["when"].dtype == "datetime64[ns]"
+    assert df_good["when"].isna().tolist() == [False, True]
+
+
+def test_query_cache_reruns_query_after_database_changes(tmp_path):
+    """ Test that a cached result is used until the database changes
+
+    GIVEN a database with 3 rows and a query that has been cached
+    WHEN the query is run again, then a row is added and the query is run once more
+    THEN the second run should be a cache hit and the third a miss that returns 4 rows
+    """
+    db_path = tmp_path.joinpath("cache_test.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE item (id INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT INTO item VALUES (?)", [(1,), (2,), (3,)])
+    conn.commit()
+    cache = QueryCache()
+
+    cache.query(db_path, "SELECT * FROM item")
+    cached_rows = cache.query(db_path, "SELECT *   FROM item")
+    conn.execute("INSERT INTO item VALUES (4)")
+    conn.commit()
+    conn.close()
+    new_rows = cache.query(db_path, "SELECT * FROM item")
+
+    assert len(cached_rows) == 3
+    assert len(new_rows) == 4
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_query_cache_does_not_cache_memory_databases_or_random_results(tmp_path, monkeypatch):
+    """ Test that queries on in-memory databases and queries that are not deterministic are run every time
+
+    GIVEN a database file and a cache
+    WHEN SELECT random() is run twice on the file, and a query is run on ':memory:' and a file::memory: URI
+    THEN nothing should be cached, each query should be counted as uncached, and no file should be created
+    """
+    monkeypatch.chdir(tmp_path)
+    db_path = tmp_path.joinpath("random_test.db")
+    sqlite3.connect(db_path).close()
+    cache = QueryCache()
+
+    cache.query(db_path, "SELECT random()")
+    cache.query(db_path, "SELECT random()")
+    cache.query(db_path, "SELECT datetime('now')")
+    cache.query(":memory:", "SELECT 1")
+    cache.query("file::memory:?cache=shared", "SELECT 1")
+
+    assert cache.uncached == 5
+    assert (cache.hits, cache.misses, len(cache._entries)) == (0, 0, 0)
+    assert not list(tmp_path.glob("file*"))
+
+
+def test_query_cache_keys_named_parameters_and_uri_databases(tmp_path):
+    """ Test that named parameter values are part of the key and a file: URI database is checked for changes
+
+    GIVEN a database file with 2 rows and a cache
+    WHEN a query is run with two values of a named parameter, and a count is run through a read-only file: URI
+        before and after a row is added
+    THEN each parameter value should return its own row, and the second count should include the new row
+    """
+    db_path = tmp_path.joinpath("named_test.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE t (a INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(1,), (2,)])
+    conn.commit()
+    cache = QueryCache()
+    uri = f"{db_path.as_uri()}?mode=ro"
+
+    first = cache.query(db_path, "SELECT a FROM t WHERE a = :a", {"a": 1})
+    second = cache.query(db_path, "SELECT a FROM t WHERE a = :a", {"a": 2})
+    count_before = cache.query(uri, "SELECT COUNT(*) FROM t")
+    conn.execute("INSERT INTO t VALUES (3)")
+    conn.commit()
+    conn.close()
+    count_after = cache.query(uri, "SELECT COUNT(*) FROM t")
+
+    assert (first, second) == ([(1,)], [(2,)])
+    assert (count_before, count_after) == ([(2,)], [(3,)])
+    assert cache.uncached == 0
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Directory permissions are only checked on POSIX")
+def test_query_cache_dir_is_private_and_limited(tmp_path):
+    """ Test that query results are only saved in a private directory, and old files are deleted over max_bytes
+
+    GIVEN a database file, a directory other users can write to, and a private directory
+    WHEN queries are cached with each directory, with max_bytes big enough for two results
+    THEN no files should be saved in the shared directory, and at most two in the private one
+    """
+    db_path = tmp_path.joinpath("disk_test.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE t (a INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    conn.commit()
+    conn.close()
+    shared_dir = tmp_path.joinpath("shared")
+    shared_dir.mkdir()
+    shared_dir.chmod(0o777)
+    result_size = len(pickle.dumps([(0,)], protocol=pickle.HIGHEST_PROTOCOL))
+
+    with pytest.warns(UserWarning, match="other users"):
+        shared_cache = QueryCache(cache_dir=shared_dir)
+    shared_cache.query(db_path, "SELECT a FROM t WHERE a = ?", (1,))
+    private_cache = QueryCache(max_bytes=2 * result_size, cache_dir=tmp_path.joinpath("private"))
+    for value in range(5):
+        private_cache.query(db_path, "SELECT a FROM t WHERE a = ?", (value,))
+
+    assert not list(shared_dir.iterdir())
+    assert stat.S_IMODE(tmp_path.joinpath("private").stat().st_mode) == 0o700
+    assert len(list(tmp_path.joinpath("private").glob("*.pkl"))) == 2
+
+
+def test_workbook_cache_is_private_and_ignores_bad_pickles(tmp_path):
+    """ Test that the workbook cache directory is only usable by the current user and a damaged cache file is re-read
+
+    GIVEN a workbook and an empty cache directory path
+    WHEN the workbook is read, the cached pickle file is overwritten with junk, and the workbook is read again
+    THEN the directory should have 0700 permissions and both reads should return the sheet
+    """
+    workbook = tmp_path.joinpath("small.xlsx")
+    df = pd.DataFrame({'year': [2012, 2016], 'type': ['summer', 'summer']})
+    df.to_excel(workbook, sheet_name="games", index=False)
+    cache_dir = tmp_path.joinpath("cache")
+
+    first = read_workbook(workbook, {"games": {}}, cache_dir=cache_dir)
+    cache_files = list(cache_dir.glob("*.pkl"))
+    for cache_file in cache_files:
+        cache_file.write_bytes(b"not a pickle")
+    second = read_workbook(workbook, {"games": {}}, cache_dir=cache_dir)
+
+    assert len(cache_files) == 1
+    assert stat.S_IMODE(cache_dir.stat().st_mode) == 0o700
+    assert first["games"].equals(second["games"])
+
+
+def test_column_names_of_views_quoted_names_and_missing_tables(tmp_path):
+    """ Test that column names are found for views and for names with quotes, and not for missing tables
+
+    GIVEN a database with a table named team's, a foreign key to it, and a view
+    WHEN the column names of the table, the view and a table that does not exist are looked up
+    THEN the table and view should have their columns and the missing table an empty list
+    """
+    db_path = tmp_path.joinpath("schema_test.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE \"team's\" (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.execute("CREATE TABLE player (id INTEGER PRIMARY KEY, team_id INTEGER REFERENCES \"team's\"(id))")
+    conn.execute("CREATE VIEW team_names AS SELECT name FROM \"team's\"")
+    conn.commit()
+    conn.close()
+
+    assert get_column_names_g(db_path, "team's") == ["id", "name"]
+    assert get_column_names_g(db_path, "team_names") == ["name"]
+    assert get_column_names_g(db_path, "no_such_table") == []
+    assert get_table_info(db_path, "player").foreign_keys == [(("team_id",), "team's", ("id",))]
+
+
+def test_query_log_records_statements_only_when_asked(monkeypatch):
+    """ Test that connect only records statements when given a QueryLog, and that the rows are counted
+
+    GIVEN a QueryLog
+    WHEN an INSERT of 3 rows and a SELECT are run on a connection with the log, and a SELECT on one without it
+    THEN the log should have the 2 statements with their row counts and the other connection should be plain sqlite3
+    """
+    monkeypatch.setattr(query_log, "LOG_ALL", False)
+    log = QueryLog()
+    conn = connect(":memory:", query_log=log)
+    conn.execute("CREATE TABLE item (id INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT INTO item VALUES (?)", [(1,), (2,), (3,)])
+    conn.execute("SELECT * FROM item WHERE id > ?", (1,)).fetchall()
+    conn.close()
+    plain = connect(":memory:")
+    plain.execute("SELECT 1").fetchall()
+    plain.close()
+
+    summary = {entry['sql']: (entry['count'], entry['rows']) for entry in log.summary()}
+    assert summary["INSERT INTO item VALUES (?)"] == (1, 3)
+    assert summary["SELECT * FROM item WHERE id > ?"] == (1, 2)
+    assert len(log.records) == 3
+    assert type(plain) is sqlite3.Connection
+
+
+def test_query_log_counts_vm_steps_of_fetched_rows():
+    """ Test that the VM steps taken while the rows of a SELECT are fetched are recorded
+
+    GIVEN a table of 200,000 rows on a connection with a QueryLog
+    WHEN a filtered full scan is run and its rows fetched
+    THEN the record should have the rows and at least one VM step per row scanned, in multiples of PROGRESS_STEPS
+    """
+    log = QueryLog()
+    conn = connect(":memory:", query_log=log)
+    conn.execute("CREATE TABLE t (a INTEGER)")
+    conn.execute("WITH RECURSIVE n(a) AS (SELECT 1 UNION ALL SELECT a + 1 FROM n WHERE a < 200000) "
+                 "INSERT INTO t SELECT a FROM n")
+    conn.execute("SELECT a FROM t WHERE a % 7 = 0").fetchall()
+    conn.close()
+
+    record = log.records[-1]
+    assert record.rows == 200000 // 7
+    assert record.vm_steps >= 200000
+
+
+def test_compare_paralympics_queries_reports_and_saves_each_query(tmp_path, capsys):
+    """ Test that every workload query is benchmarked, printed and saved
+
+    GIVEN the un-normalised and normalised paralympics databases
+    WHEN the queries are compared with 2 timed runs each and the results saved as JSON
+    THEN there should be a result, a report line and a JSON entry for each query, and the London 2012 rows should match
+    """
+    json_path = tmp_path.joinpath("benchmark.json")
+
+    results = compare_paralympics_queries(resources.files(data).joinpath("para-not-normalised.sqlite"),
+                                          resources.files(data).joinpath("para-normalised.db"),
+                                          repeat=2, warmup=0, json_path=json_path)
+
+    saved = json.loads(json_path.read_text())
+    report = capsys.readouterr().out.splitlines()
+    labels = [(stats.database, stats.label) for stats in results]
+    assert labels == [(entry['database'], entry['label']) for entry in saved]
+    assert len(results) == 4 and len(report) == 5
+    assert all(entry['repeat'] == 2 for entry in saved)
+    assert results[0].rows == results[2].rows == 1
+
+
+def test_compare_paralympics_queries_renamed_databases(tmp_path):
+    """ Test that the workload is chosen by argument position, not by the database file name
+
+    GIVEN copies of the un-normalised and normalised databases with other file names
+    WHEN the queries are compared
+    THEN each database should run its own workload and the London 2012 queries should return the same row count
+    """
+    db_un = tmp_path.joinpath("games_flat.sqlite")
+    db_n = tmp_path.joinpath("games.db")
+    shutil.copyfile(resources.files(data).joinpath("para-not-normalised.sqlite"), db_un)
+    shutil.copyfile(resources.files(data).joinpath("para-normalised.db"), db_n)
+
+    results = compare_paralympics_queries(db_un, db_n, repeat=1, warmup=0)
+
+    assert [stats.database for stats in results] == ["games_flat.sqlite"] * 2 + ["games.db"] * 2
+    assert [stats.query for stats in results] == [*WORKLOADS["un-normalised"].values(),
+                                                  *WORKLOADS["normalised"].values()]
+    assert results[0].rows == results[2].rows == 1
+
+
+def test_import_report_uses_shared_table(capsys):
+    """ Test that the import benchmark report has a heading and a line for each module
+
+    GIVEN the import times of one module
+    WHEN the report is printed
+    THEN the module line should have the times and the slowest imports
+    """
+    results = [{'module': "activities.starter.cq_docstring", 'repeat': 1, 'wall_ms': 40.04, 'import_ms': 2.51,
+                'slowest': [("activities.starter.schema_cache", 1.2), ("typing", 0.4)]}]
+
+    print_import_report(results)
+
+    heading, line = capsys.readouterr().out.splitlines()
+    assert heading.split()[:3] == ["module", "wall", "ms"]
+    assert line.split() == ["activities.starter.cq_docstring", "40.0", "2.5", "activities.starter.schema_cache", "1,",
+                            "typing", "0"]
+
+
+def test_index_advisor_indexes_are_created_and_used(tmp_path):
+    """ Test that the recommended indexes replace the scans and automatic indexes in the query plan
+
+    GIVEN a copy of para-normalised.db, which has no indexes on its foreign keys
+    WHEN the indexes recommended for the compare_queries workload are created
+    THEN the london_2012 query should search GamesHost and GamesDisability with the new covering indexes
+    """
+    db_path = tmp_path.joinpath("para-normalised.db")
+    shutil.copyfile(resources.files(data).joinpath("para-normalised.db"), db_path)
+    conn = sqlite3.connect(db_path)
+    plan_before = explain_query_plan(conn, QUERY_N)
+
+    recommendations = recommend_indexes(conn, WORKLOADS["normalised"])
+    create_indexes(conn, recommendations)
+    plan_after = explain_query_plan(conn, QUERY_N)
+    remaining = recommend_indexes(conn)
+    conn.close()
+
+    assert "SCAN gh" in plan_before
+    assert "ix_gameshost_games_id_host_id" in [recommendation.name for recommendation in recommendations]
+    assert "SEARCH gh USING COVERING INDEX ix_gameshost_games_id_host_id (games_id=?)" in plan_after
+    assert any(detail.startswith("SEARCH gd USING COVERING INDEX ix_gamesdisability_games_id") for detail in plan_after)
+    assert not any("AUTOMATIC" in detail or detail.startswith("SCAN gh") for detail in plan_after)
+    assert remaining == []
+
+
+def test_lazy_import_runs_module_on_first_attribute(tmp_path, monkeypatch):
+    """ Test that a lazily imported module and submodule are only run when an attribute is used
+
+    GIVEN a package with a submodule that records when its code is run
+    WHEN the submodule is imported with lazy_import, then one of its attributes is used
+    THEN its code should only run when the attribute is used, and 'import' should return the same module
+    """
+    package = tmp_path.joinpath("lazy_pkg")
+    package.mkdir()
+    package.joinpath("__init__.py").write_text("")
+    package.joinpath("heavy.py").write_text("from pathlib import Path\nPath(__file__).with_suffix('.ran').touch()\n"
+                                            "VALUE = 42\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for name in ("lazy_pkg", "lazy_pkg.heavy"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    heavy = lazy_import("lazy_pkg.heavy")
+    ran_before = package.joinpath("heavy.ran").exists()
+    value = heavy.VALUE
+    import lazy_pkg.heavy
+
+    assert not ran_before
+    assert value == 42
+    assert lazy_pkg.heavy is heavy
+    assert lazy_import("lazy_pkg.heavy") is heavy
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import("lazy_pkg.missing")
+
+
+@pytest.mark.parametrize("module_name, heavy_module", [
+    ("activities.starter.card_simulation", "numpy.random"),
+    ("activities.starter.cq_docstring", "matplotlib.figure"),
+    ("activities.starter.starter_db", "pandas.core.frame"),
+])
+def test_modules_do_not_load_heavy_dependencies_on_import(module_name, heavy_module):
+    """ Test that importing a module does not run its heavy dependencies
+
+    GIVEN a new Python process
+    WHEN a module that uses numpy, pandas or matplotlib is imported
+    THEN the dependency's code should not have been run, so its submodules are not imported
+    """
+    code = f"import sys, {module_name}; print({heavy_module!r} in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == "False"